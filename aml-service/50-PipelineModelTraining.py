@@ -35,7 +35,13 @@ def create_pipeline(pipeline_config):
     output_model_name = pipeline_config['parameter']['output_model_name']
     feature_list_names = pipeline_config['parameter']['feature_list_names']
     target = pipeline_config['parameter']['target_column']
-    model_hyps = str(pipeline_config['parameter']['model_hyperparameters'])
+    model_hyps = json.dumps(pipeline_config['parameter']['model_hyperparameters'])
+    hyperparameter_search = json.dumps(pipeline_config['parameter'].get('hyperparameter_search', {}))
+    cross_validation = json.dumps(pipeline_config['parameter'].get('cross_validation', {}))
+    incremental = json.dumps(pipeline_config['parameter'].get('incremental', {}))
+    dataset_cache = json.dumps(pipeline_config['parameter'].get('dataset_cache', {}))
+    categorical = json.dumps(pipeline_config['parameter'].get('categorical', {}))
+    parquet_layout = pipeline_config['parameter'].get('parquet_layout', {})
 
     # Get the target compute
     try:
@@ -72,31 +78,68 @@ def create_pipeline(pipeline_config):
     default_store = ws.get_default_datastore() 
     output_split_train = PipelineData("output_split_train", datastore=default_store).as_dataset()
     output_split_test = PipelineData("output_split_test", datastore=default_store).as_dataset()
+    hash_split = pipeline_config['parameter'].get('hash_split', {})
+    if hash_split.get('enabled'):
+        # the hash split streams the files of the file dataset instead of loading the tabular dataset
+        input_files = Dataset.get_by_name(ws, name=hash_split['file_dataset_name']).as_named_input('input_files').as_mount()
+        split_inputs = [input_files]
+        split_arguments = ['--hash-split', json.dumps(hash_split), '--input-path', input_files, '--target', target]
+    else:
+        split_inputs = [dataset.as_named_input('input_dataset')]
+        split_arguments = []
     test_train_splitting_step = PythonScriptStep(
         name="Split data to train and test data",
         script_name="train_test_split.py", 
         arguments=["--output_split_train", output_split_train,
-                   "--output_split_test", output_split_test],
-        inputs=[dataset.as_named_input('input_dataset')],
+                   "--output_split_test", output_split_test,
+                   "--parquet-layout", json.dumps(parquet_layout)] + split_arguments,
+        inputs=split_inputs,
         outputs=[output_split_train, output_split_test],
         compute_target=pipeline_cluster,
         runconfig=pipeline_run_config,
         source_directory=train_folder,
-        allow_reuse=False
+        # reused for an unchanged input dataset version, the step hands the same split
+        # datasets to the train step, which the dataset cache keys on
+        allow_reuse=pipeline_config['parameter'].get('dataset_cache', {}).get('enabled', False)
     )
 
     print("test_train_splitting_step created.")
 
     # model train step
     print("Model hypeparameters: ", model_hyps)
+    streaming = pipeline_config['parameter'].get('streaming', {})
+    if streaming.get('enabled'):
+        # train.py streams the parquet files of the mounted splits instead of loading them as tabular datasets
+        training_inputs = [output_split_train.as_mount(), output_split_test.as_mount()]
+        input_arguments = ['--input-train-path', training_inputs[0],
+                           '--input-test-path', training_inputs[1],
+                           '--chunk-rows', str(streaming.get('chunk_rows', 65536))]
+        # the streamed splits are read by column already, train.py must not load them
+        parquet_layout = dict(parquet_layout, projected_read=False)
+    elif parquet_layout.get('projected_read'):
+        # train.py reads the feature, target and id columns of the mounted splits (with the
+        # row group filters) instead of every column through the tabular datasets
+        training_inputs = [output_split_train.as_mount(), output_split_test.as_mount()]
+        input_arguments = ['--input-train-path', training_inputs[0],
+                           '--input-test-path', training_inputs[1]]
+    else:
+        training_inputs = [output_split_train.parse_parquet_files(),
+                           output_split_test.parse_parquet_files()]
+        input_arguments = []
     model_training_step = PythonScriptStep(
         name="Train and evaluate model",
         script_name="train.py",
-        inputs=[output_split_train.parse_parquet_files(),
-                output_split_test.parse_parquet_files()],
+        inputs=training_inputs,
         arguments=['--output-model-name', output_model_name,
                    '--feature-list-names', feature_list_names,
-                   '--target', target],
+                   '--target', target,
+                   '--model-hyperparameters', model_hyps,
+                   '--hyperparameter-search', hyperparameter_search,
+                   '--cross-validation', cross_validation,
+                   '--incremental', incremental,
+                   '--dataset-cache', dataset_cache,
+                   '--categorical', categorical,
+                   '--parquet-layout', json.dumps(parquet_layout)] + input_arguments,
         compute_target=pipeline_cluster,
         runconfig=pipeline_run_config,
         source_directory=train_folder,
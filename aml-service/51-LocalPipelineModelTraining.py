@@ -0,0 +1,235 @@
+# import all libraries required
+import contextlib, hashlib, json, os, runpy, sys, time, types
+import pandas as pd
+
+# Runs the two steps of the training pipeline (training/train_test_split.py,
+# then training/train.py) in this process on a local csv, with the arguments
+# create_pipeline() of 50-PipelineModelTraining.py gives them. No workspace,
+# compute cluster or PipelineData parquet round trip is involved:
+#   azureml.core   stand-ins for Run.get_context() (input_datasets, log,
+#                  log_table, complete) and Model.register
+#   handoff        the train/test DataFrames the split step ends with are the
+#                  run.input_datasets of the train step, as they are
+#                  (-handoff parquet writes and reads them like PipelineData
+#                  does, to time the round trip; with parquet_layout.projected_read
+#                  train.py reads them by column from the split folders)
+#   registry       train.py gets --registry-dir, models are registered in a
+#                  training/model_registry.py LocalModelRegistry folder
+# Every step runs in its own folder under -outfolder (so outputs/ stays per
+# step, as on the cluster); its metrics and the step timings are saved as json.
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+TRAIN_FOLDER = os.path.join(REPO_DIR, 'training')
+# the step scripts import their helper modules (dtype_plan, evaluation, ...) from their folder
+sys.path.insert(0, TRAIN_FOLDER)
+from model_registry import LocalModelRegistry
+
+def read_config(config_file):
+    # read config file
+    with open(config_file, encoding='utf-8-sig') as f:
+        return json.load(f)['pipeline']['configuration']
+
+class LocalDataset:
+    '''A named input of a step: to_pandas_dataframe() returns the frame itself, no copy.'''
+    def __init__(self, df, id=None):
+        self.df = df
+        self.id = id
+        self.version = None
+
+    def to_pandas_dataframe(self):
+        return self.df
+
+class LocalParquetDataset:
+    '''A split written by the split step, read back when the step asks for it.'''
+    def __init__(self, path, id=None):
+        self.path = path
+        self.id = id
+        self.version = None
+
+    def to_pandas_dataframe(self):
+        return pd.read_parquet(self.path)
+
+class LocalRun:
+    '''Run.get_context() of a step: inputs and logged metrics stay in memory.'''
+    current = None
+
+    def __init__(self, name, input_datasets, experiment_name):
+        self.name = name
+        self.input_datasets = input_datasets
+        self.experiment = types.SimpleNamespace(name=experiment_name, workspace=None)
+        self.metrics = {}
+        self.tables = {}
+        self.status = 'Running'
+
+    @classmethod
+    def get_context(cls):
+        return cls.current
+
+    def log(self, name, value, description=''):
+        self.metrics.setdefault(name, []).append(value)
+
+    def log_table(self, name, value, description=''):
+        self.tables[name] = value
+
+    def complete(self):
+        self.status = 'Completed'
+
+class LocalModel:
+    '''Model.register() writes to the executor's local registry.'''
+    registry = None
+
+    @classmethod
+    def register(cls, workspace, model_path, model_name, tags=None, properties=None, **kwargs):
+        version = cls.registry.register(model_path, model_name, properties=properties, tags=tags)
+        return types.SimpleNamespace(name=model_name, version=version)
+
+@contextlib.contextmanager
+def azureml_stand_in():
+    # the step scripts import Run (and Model) from azureml.core
+    core = types.ModuleType('azureml.core')
+    core.Run, core.Model = LocalRun, LocalModel
+    azureml = types.ModuleType('azureml')
+    azureml.core = core
+    saved = {name: sys.modules.get(name) for name in ('azureml', 'azureml.core')}
+    sys.modules.update({'azureml': azureml, 'azureml.core': core})
+    try:
+        yield
+    finally:
+        for name, module in saved.items():
+            if module is None:
+                sys.modules.pop(name, None)
+            else:
+                sys.modules[name] = module
+
+def train_arguments(parameter, registry_dir, split_dir=None):
+    # the arguments create_pipeline() gives train.py: the splits as run.input_datasets or,
+    # with streaming or projected_read, the folders of the parquet splits under split_dir
+    # (parquet handoff only), as 50-PipelineModelTraining.py mounts them
+    parquet_layout = parameter.get('parquet_layout', {})
+    streaming = parameter.get('streaming', {})
+    input_arguments = []
+    if split_dir is not None and (streaming.get('enabled') or parquet_layout.get('projected_read')):
+        input_arguments = ['--input-train-path', os.path.join(split_dir, 'output_split_train'),
+                           '--input-test-path', os.path.join(split_dir, 'output_split_test')]
+        if streaming.get('enabled'):
+            input_arguments += ['--chunk-rows', str(streaming.get('chunk_rows', 65536))]
+            # the streamed splits are read by column already, train.py must not load them
+            parquet_layout = dict(parquet_layout, projected_read=False)
+    elif streaming.get('enabled'):
+        print('streaming needs the parquet splits (-handoff parquet), the splits are handed over in memory')
+    return input_arguments + ['--output-model-name', parameter['output_model_name'],
+            '--feature-list-names', parameter['feature_list_names'],
+            '--target', parameter['target_column'],
+            '--model-hyperparameters', json.dumps(parameter['model_hyperparameters']),
+            '--hyperparameter-search', json.dumps(parameter.get('hyperparameter_search', {})),
+            '--cross-validation', json.dumps(parameter.get('cross_validation', {})),
+            '--incremental', json.dumps(parameter.get('incremental', {})),
+            '--dataset-cache', json.dumps(parameter.get('dataset_cache', {})),
+            '--categorical', json.dumps(parameter.get('categorical', {})),
+            '--parquet-layout', json.dumps(parquet_layout),
+            '--registry-dir', registry_dir]
+
+def split_ids(data_path, split_arguments):
+    # the split is deterministic, so like the outputs of a reused split step on the cluster
+    # the splits of an unchanged csv and split config keep their ids (the dataset cache key)
+    stat = os.stat(data_path)
+    digest = hashlib.sha256(json.dumps([os.path.abspath(data_path), stat.st_size, stat.st_mtime_ns,
+                                        split_arguments]).encode()).hexdigest()[:16]
+    return {name: '%s-%s' % (name, digest) for name in ('output_split_train', 'output_split_test')}
+
+def run_step(name, script, arguments, input_datasets, step_dir, experiment_name):
+    '''Run a step script as __main__ in step_dir; returns its globals, run and wall time.'''
+    run = LocalRun(name, input_datasets, experiment_name)
+    os.makedirs(step_dir, exist_ok=True)
+    argv, cwd = sys.argv, os.getcwd()
+    LocalRun.current = run
+    sys.argv = [script] + arguments
+    os.chdir(step_dir)
+    started = time.perf_counter()
+    try:
+        step_globals = runpy.run_path(script, run_name='__main__')
+    finally:
+        seconds = time.perf_counter() - started
+        sys.argv = argv
+        os.chdir(cwd)
+        LocalRun.current = None
+    with open(os.path.join(step_dir, 'metrics.json'), 'w') as f:
+        json.dump({'metrics': run.metrics, 'tables': run.tables, 'status': run.status}, f, indent=2, default=str)
+    return step_globals, run, seconds
+
+def run_pipeline(pipeline_config, data_path, outfolder, registry_dir, handoff='memory'):
+    parameter = pipeline_config['parameter']
+    experiment_name = pipeline_config['experiment_name']
+    run_dir = os.path.join(outfolder, time.strftime('%Y%m%d-%H%M%S'))
+    LocalModel.registry = LocalModelRegistry(registry_dir)
+    timings = []
+    with azureml_stand_in():
+        input_df = None
+        if not parameter.get('hash_split', {}).get('enabled'):
+            started = time.perf_counter()
+            input_df = pd.read_csv(data_path)
+            timings.append({'step': 'load %s' % os.path.basename(data_path), 'seconds': time.perf_counter() - started})
+
+        split_dir = os.path.join(run_dir, 'split')
+        split_arguments = ['--parquet-layout', json.dumps(parameter.get('parquet_layout', {}))]
+        hash_split = parameter.get('hash_split', {})
+        if hash_split.get('enabled'):
+            # the hash split streams the csv and writes the splits itself
+            handoff = 'parquet'
+            split_arguments += ['--hash-split', json.dumps(hash_split), '--input-path', data_path,
+                                '--target', parameter['target_column']]
+        ids = split_ids(data_path, split_arguments)
+        if handoff == 'parquet':
+            split_arguments += ['--output_split_train', os.path.join(split_dir, 'output_split_train'),
+                                '--output_split_test', os.path.join(split_dir, 'output_split_test')]
+        split_globals, _, seconds = run_step(
+            'Split data to train and test data', os.path.join(TRAIN_FOLDER, 'train_test_split.py'), split_arguments,
+            {'input_dataset': LocalDataset(input_df)} if input_df is not None else {}, split_dir, experiment_name)
+        timings.append({'step': 'train_test_split.py', 'seconds': seconds})
+
+        if handoff == 'parquet':
+            arguments = train_arguments(parameter, registry_dir, split_dir)
+            splits = {name: LocalParquetDataset(os.path.join(split_dir, name, 'processed.parquet'), ids[name])
+                      for name in ('output_split_train', 'output_split_test')}
+        else:
+            arguments = train_arguments(parameter, registry_dir)
+            # in-memory handoff: the split frames replace the PipelineData parquet files
+            splits = {'output_split_train': LocalDataset(split_globals['train_df'], ids['output_split_train']),
+                      'output_split_test': LocalDataset(split_globals['test_df'], ids['output_split_test'])}
+        _, train_run, seconds = run_step(
+            'Train and evaluate model', os.path.join(TRAIN_FOLDER, 'train.py'),
+            arguments, splits, os.path.join(run_dir, 'train'), experiment_name)
+        timings.append({'step': 'train.py', 'seconds': seconds})
+
+    with open(os.path.join(run_dir, 'timings.json'), 'w') as f:
+        json.dump(timings, f, indent=2)
+    model = LocalModel.registry.latest(parameter['output_model_name'])
+    return {'run_dir': run_dir, 'timings': timings, 'status': train_run.status,
+            'model': {'name': model['name'], 'version': model['version'], 'path': model['path'],
+                      'test_auc': model['properties'].get('evaluation.test.auc')}}
+
+def main():
+    args = sys.argv[1:]
+
+    if len(args) >= 4 and args[0] == '-config' and args[2] == '-pipeline':
+        pipeline_configs = [config for config in read_config(args[1]) if config['name'] == args[3]]
+        if not pipeline_configs:
+            sys.exit('Pipeline %s not found in %s' % (args[3], args[1]))
+        options = dict(zip(args[4::2], args[5::2]))
+        outfolder = os.path.abspath(options.get('-outfolder', 'local_pipeline'))
+        result = run_pipeline(pipeline_configs[0],
+                              os.path.abspath(options.get('-data', os.path.join(REPO_DIR, 'data', 'insurance.csv'))),
+                              outfolder,
+                              os.path.abspath(options.get('-registry-dir', os.path.join(outfolder, 'registry'))),
+                              options.get('-handoff', 'memory'))
+        print('%-28s %10s' % ('step', 'seconds'))
+        for timing in result['timings']:
+            print('%-28s %10.2f' % (timing['step'], timing['seconds']))
+        print('%-28s %10.2f' % ('total', sum(timing['seconds'] for timing in result['timings'])))
+        print(json.dumps(result['model'], indent=2))
+    else:
+        print('Usage: -config <config file name> -pipeline <pipeline name> [-data <csv file>] '
+              '[-outfolder <run folder>] [-registry-dir <local model registry>] [-handoff memory|parquet]')
+
+if __name__ == '__main__':
+    main()
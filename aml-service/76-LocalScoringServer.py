@@ -0,0 +1,135 @@
+﻿# import all libraries required
+import asyncio, importlib.util, json, os, sys
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+# Serves the entry script of the local_webservice config (tests/integration/score.py)
+# over HTTP with the same contract as the Azure ML scoring endpoint:
+#   GET  /       health check, answers "Healthy"
+#   POST /score  body goes to the entry script's respond() (run() under
+#                @rawhttp on Azure ML): JSON results are returned JSON encoded,
+#                binary predictions as is with their X-Model-Version, ... headers
+# It needs no Docker, image build or workspace, so the test scripts can point
+# at http://localhost:<port>/score with -uri.
+
+MAX_BODY_BYTES = 100 * 1024 * 1024
+STATUS_TEXT = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed',
+               413: 'Payload Too Large', 500: 'Internal Server Error'}
+
+TEXT_PLAIN = {'Content-Type': 'text/plain'}
+
+# entry script module of this process (process pool workers load their own)
+scoring_module = None
+
+def read_config(config_file):
+    # read config file
+    with open(config_file, encoding='utf-8-sig') as f:
+        return json.load(f)['local_webservice']['configuration']
+
+def load_entry_script(entry_script, model_dir):
+    # import the entry script by path and call its init(), like the Azure ML server does
+    global scoring_module
+    if model_dir:
+        os.environ['AZUREML_MODEL_DIR'] = model_dir
+    spec = importlib.util.spec_from_file_location('score', entry_script)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    module.init()
+    scoring_module = module
+    return module
+
+def run_entry_script(body, content_type):
+    # executed in the pool: thread pools share the module, process pools use their own.
+    # respond() takes the body as bytes: it decodes JSON itself and sniffs binary
+    # formats sent without a binary content type
+    return scoring_module.respond(body, content_type)
+
+class ScoringServer:
+    def __init__(self, entry_script, model_dir=None, workers=4, pool='thread'):
+        if pool == 'process':
+            self.executor = ProcessPoolExecutor(max_workers=workers, initializer=load_entry_script,
+                                                initargs=(entry_script, model_dir))
+        else:
+            load_entry_script(entry_script, model_dir)
+            self.executor = ThreadPoolExecutor(max_workers=workers)
+
+    async def score(self, body, content_type):
+        loop = asyncio.get_running_loop()
+        payload, headers = await loop.run_in_executor(self.executor, run_entry_script, body, content_type)
+        if isinstance(payload, str):
+            payload = payload.encode('utf-8')
+        return 200, headers, bytes(payload)
+
+    async def handle(self, reader, writer):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                method, path, version = request_line.decode('latin-1').split()
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b'\r\n', b'\n', b''):
+                        break
+                    name, _, value = line.decode('latin-1').partition(':')
+                    headers[name.strip().lower()] = value.strip()
+                length = int(headers.get('content-length', 0))
+                if length > MAX_BODY_BYTES:
+                    await self.respond(writer, 413, TEXT_PLAIN, b'payload too large', False)
+                    break
+                body = await reader.readexactly(length) if length else b''
+                keep_alive = headers.get('connection', '').lower() != 'close' and version == 'HTTP/1.1'
+
+                route = path.split('?')[0].rstrip('/')
+                if route == '' and method == 'GET':
+                    status, response_headers, payload = 200, TEXT_PLAIN, b'Healthy'
+                elif route == '/score' and method == 'POST':
+                    try:
+                        status, response_headers, payload = await self.score(body, headers.get('content-type'))
+                    except Exception as e:
+                        status, response_headers, payload = 500, TEXT_PLAIN, str(e).encode('utf-8')
+                elif route in ('', '/score'):
+                    status, response_headers, payload = 405, TEXT_PLAIN, b'method not allowed'
+                else:
+                    status, response_headers, payload = 404, TEXT_PLAIN, b'not found'
+                await self.respond(writer, status, response_headers, payload, keep_alive)
+                if not keep_alive:
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    async def respond(self, writer, status, headers, payload, keep_alive):
+        head = 'HTTP/1.1 %d %s\r\n' % (status, STATUS_TEXT.get(status, ''))
+        head += ''.join('%s: %s\r\n' % (name, value) for name, value in headers.items())
+        head += 'Content-Length: %d\r\nConnection: %s\r\n\r\n' % (len(payload), 'keep-alive' if keep_alive else 'close')
+        writer.write(head.encode('latin-1') + payload)
+        await writer.drain()
+
+    async def serve(self, host, port):
+        server = await asyncio.start_server(self.handle, host, port)
+        print('Scoring server listening on http://%s:%d/score' % (host, port))
+        async with server:
+            await server.serve_forever()
+
+def main():
+    args = sys.argv[1:]
+
+    if len(args) >= 4 and args[0] == '-config' and args[2] == '-model-dir':
+        # entry script and port come from the local_webservice config
+        local_config = read_config(args[1])
+        inference_config = local_config['inference_config']
+        entry_script = os.path.join(inference_config['source_directory'], inference_config['entry_script'])
+        port = local_config['deploy_configuration'].get('port', 6789)
+        options = dict(zip(args[4::2], args[5::2]))
+        server = ScoringServer(entry_script, model_dir=args[3],
+                               workers=int(options.get('-workers', 4)),
+                               pool=options.get('-pool', 'thread'))
+        asyncio.run(server.serve(options.get('-host', '127.0.0.1'), int(options.get('-port', port))))
+    else:
+        print('Usage: -config <config file name> -model-dir <model folder> '
+              '[-workers <pool size>] [-pool thread|process] [-host <host>] [-port <port>]')
+
+if __name__ == '__main__':
+    main()
@@ -1,10 +1,8 @@
 ﻿# import all libraries required
 import json, sys, math
+from load_test import ScoringUriService, read_load_test_config, load_test, save_load_test_report
 import pandas as pd
 from sklearn.metrics import r2_score, mean_absolute_error, mean_squared_error
-from azureml.core import Workspace, Model, Dataset
-from azureml.core.webservice import LocalWebservice
-from azureml.core.authentication import AzureCliAuthentication
 
 def read_config(config_file):
     # read config file
@@ -30,7 +28,11 @@ def inference_local_webservice(local_service):
     print('----------------output: \n', output)
     return output
 
-def test_local(local_config, model_config):
+def get_local_service(local_config, model_config):
+    # Azure ML SDK is only needed for a deployed service, not for -uri
+    from azureml.core import Workspace, Model, Dataset
+    from azureml.core.webservice import LocalWebservice
+    from azureml.core.authentication import AzureCliAuthentication
     # Authenticate using CLI
     cli_auth = AzureCliAuthentication()
     # Get workspace
@@ -43,12 +45,22 @@ def test_local(local_config, model_config):
 
     # Get Local service name
     local_name = local_config['name']
-    local_service = LocalWebservice(ws, local_name)    
+    return LocalWebservice(ws, local_name)
+
+def test_local(local_service):
     output = inference_local_webservice(local_service)
 
     # return test successful
     return output
 
+def load_test_local(local_service, load_config, out_folder):
+    # replay data rows against the scoring URI, report saved to <out_folder>/loadtest.json
+    report = load_test(local_service.scoring_uri, load_config)
+    save_load_test_report(report, out_folder)
+    for violation in report['violations']:
+        print('SLO missed:', violation)
+    return report['passed']
+
 def main():
     args = sys.argv[1:]
 
@@ -56,14 +68,26 @@ def main():
         # execute load config file and model registration
         local_config = read_config(args[1])
         model_config = read_model_config(args[1])
-        # test model on local
-        pass_test = test_local(local_config, model_config)
+        # -loadtest is a flag, every other option takes a value
+        load_testing = '-loadtest' in args[2:]
+        options = [arg for arg in args[2:] if arg != '-loadtest']
+        options = dict(zip(options[0::2], options[1::2]))
+        # test model on local, or on any scoring URI (e.g. 76-LocalScoringServer.py) with -uri
+        if '-uri' in options:
+            local_service = ScoringUriService(options['-uri'], local_config['name'])
+        else:
+            local_service = get_local_service(local_config, model_config)
+        if load_testing:
+            pass_test = load_test_local(local_service, read_load_test_config(args[1]),
+                                        options.get('-outfolder', 'aml_config'))
+        else:
+            pass_test = test_local(local_service)
         if pass_test:
             print('Local pass testing')
         else:
             sys.exit('Local failed testing')
     else:
-        print('Usage: -config <config file name> [-outfolder <Azure ML config folder>]')
+        print('Usage: -config <config file name> [-uri <scoring uri>] [-loadtest [-outfolder <Azure ML config folder>]]')
     
 if __name__ == '__main__':
     main()
\ No newline at end of file
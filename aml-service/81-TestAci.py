@@ -1,9 +1,8 @@
 ﻿# import all libraries required
 import json, sys, math
+from load_test import ScoringUriService, read_load_test_config, load_test, save_load_test_report
 import pandas as pd
 from sklearn.metrics import r2_score, mean_absolute_error, mean_squared_error
-from azureml.core import Workspace, Model, Dataset, Webservice
-from azureml.core.authentication import AzureCliAuthentication
 
 def read_config(config_file):
     # read config file
@@ -24,7 +23,10 @@ def inference_aci_webservice(aci_service):
     print('----------------output: \n', output)
     return output
 
-def test_aci(aci_config):
+def get_aci_service(aci_config):
+    # Azure ML SDK is only needed for a deployed service, not for -uri
+    from azureml.core import Workspace, Model, Dataset, Webservice
+    from azureml.core.authentication import AzureCliAuthentication
     # Authenticate using CLI
     cli_auth = AzureCliAuthentication()
     # Get workspace
@@ -32,26 +34,54 @@ def test_aci(aci_config):
 
     # Get ACI
     aci_name = aci_config['name']
-    aci_service = Webservice(ws, aci_name)  
+    return Webservice(ws, aci_name)
+
+def test_aci(aci_service):
     output = inference_aci_webservice(aci_service)
 
     # return test successful
     return output
 
+def load_test_aci(aci_service, load_config, out_folder):
+    # replay data rows against the scoring URI, report saved to <out_folder>/loadtest.json
+    if isinstance(aci_service, ScoringUriService):
+        key = aci_service.key
+    else:
+        # deployed ACI with key based authentication
+        key = aci_service.get_keys()[0] if getattr(aci_service, 'auth_enabled', False) else None
+    report = load_test(aci_service.scoring_uri, load_config, key=key)
+    save_load_test_report(report, out_folder)
+    for violation in report['violations']:
+        print('SLO missed:', violation)
+    return report['passed']
+
 def main():
     args = sys.argv[1:]
 
     if len(args) >= 2 and args[0] == '-config':
         # execute load config file and model registration
         aci_config = read_config(args[1])
-        # test model on ACI
-        pass_test = test_aci(aci_config)
+        # -loadtest is a flag, every other option takes a value
+        load_testing = '-loadtest' in args[2:]
+        options = [arg for arg in args[2:] if arg != '-loadtest']
+        options = dict(zip(options[0::2], options[1::2]))
+        # test model on ACI, or on any scoring URI (e.g. 76-LocalScoringServer.py) with -uri
+        if '-uri' in options:
+            aci_service = ScoringUriService(options['-uri'], aci_config['name'], options.get('-key'))
+        else:
+            aci_service = get_aci_service(aci_config)
+        if load_testing:
+            pass_test = load_test_aci(aci_service, read_load_test_config(args[1]),
+                                      options.get('-outfolder', 'aml_config'))
+        else:
+            pass_test = test_aci(aci_service)
         if pass_test:
             print('ACI pass testing')
         else:
             sys.exit('ACI failed testing')
     else:
-        print('Usage: -config <config file name> [-outfolder <Azure ML config folder>]')
+        print('Usage: -config <config file name> [-uri <scoring uri> [-key <key>]] '
+              '[-loadtest [-outfolder <Azure ML config folder>]]')
     
 if __name__ == '__main__':
     main()
\ No newline at end of file
@@ -0,0 +1,190 @@
+# Load test of a scoring URI, shared by 78-TestLocal.py and 81-TestAci.py (-loadtest),
+# and the ScoringUriService both use for -uri.
+# Rows of data/insurance.csv are replayed as {'data': [...]} requests at a fixed
+# concurrency (closed loop) or a target request rate (open loop) for every
+# configured batch size, and the result is checked against SLO thresholds.
+import csv, http.client, json, os, threading, time
+import urllib.parse, urllib.request
+
+class ScoringUriService:
+    """Stand-in for a deployed Webservice that posts to any scoring URI, e.g. 76-LocalScoringServer.py"""
+    def __init__(self, scoring_uri, name='scoring-uri', key=None):
+        self.scoring_uri = scoring_uri
+        self.name = name
+        self.key = key
+
+    def run(self, input_data):
+        # same contract as Webservice.run: JSON body in, decoded JSON response out
+        headers = {'Content-Type': 'application/json'}
+        if self.key:
+            headers['Authorization'] = 'Bearer ' + self.key
+        request = urllib.request.Request(self.scoring_uri, data=input_data.encode('utf-8'), headers=headers)
+        with urllib.request.urlopen(request) as response:
+            return json.loads(response.read().decode('utf-8'))
+
+def read_load_test_config(config_file):
+    # read load test config file
+    with open(config_file, encoding='utf-8-sig') as f:
+        return json.load(f)['load_test']['configuration']
+
+def load_rows(data_path, drop_columns):
+    # feature rows of the csv, in file column order without drop_columns
+    with open(data_path, newline='') as f:
+        reader = csv.reader(f)
+        header = next(reader)
+        keep = [i for i, name in enumerate(header) if name not in drop_columns]
+        return [[float(row[i]) for i in keep] for row in reader]
+
+def build_payloads(rows, batch_size, count=64):
+    # request bodies are built up front so client-side JSON encoding is not measured
+    payloads = []
+    for i in range(count):
+        start = (i * batch_size) % len(rows)
+        batch = [rows[(start + j) % len(rows)] for j in range(batch_size)]
+        payloads.append(json.dumps({'data': batch}).encode('utf-8'))
+    return payloads
+
+def is_valid_response(body, batch_size):
+    # Azure ML JSON-encodes the string returned by run(), so decode up to twice
+    try:
+        result = json.loads(body)
+        if isinstance(result, str):
+            result = json.loads(result)
+        return len(result['prediction_score']) == batch_size
+    except Exception:
+        return False
+
+def percentile(sorted_values, q):
+    if not sorted_values:
+        return None
+    return sorted_values[min(len(sorted_values) - 1, int(q * len(sorted_values)))]
+
+def run_load_test(scoring_uri, payloads, batch_size, concurrency=8, target_rps=None,
+                  duration_s=30, timeout_s=30, key=None):
+    """One load test run. With target_rps requests are sent on a fixed schedule and
+    latency is measured from the scheduled send time, so a slow server cannot hide
+    its queueing delay by slowing down the client (coordinated omission)."""
+    uri = urllib.parse.urlsplit(scoring_uri)
+    connection_class = http.client.HTTPSConnection if uri.scheme == 'https' else http.client.HTTPConnection
+    path = uri.path or '/'
+    if uri.query:
+        path += '?' + uri.query
+    headers = {'Content-Type': 'application/json'}
+    if key:
+        headers['Authorization'] = 'Bearer ' + key
+
+    lock = threading.Lock()
+    latencies = []
+    errors = [0]
+    sent = [0]
+    started = time.perf_counter()
+    deadline = started + duration_s
+
+    def next_request():
+        # index of the next request and the time it should be sent
+        with lock:
+            index = sent[0]
+            sent[0] += 1
+        if target_rps:
+            return index, started + index / float(target_rps)
+        return index, time.perf_counter()
+
+    def worker():
+        connection = connection_class(uri.hostname, uri.port, timeout=timeout_s)
+        while True:
+            index, scheduled = next_request()
+            if scheduled >= deadline:
+                break
+            delay = scheduled - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            ok = False
+            try:
+                connection.request('POST', path, body=payloads[index % len(payloads)], headers=headers)
+                response = connection.getresponse()
+                body = response.read()
+                ok = response.status == 200 and is_valid_response(body, batch_size)
+            except Exception:
+                connection.close()
+                connection = connection_class(uri.hostname, uri.port, timeout=timeout_s)
+            elapsed = time.perf_counter() - scheduled
+            with lock:
+                if ok:
+                    latencies.append(elapsed)
+                else:
+                    errors[0] += 1
+        connection.close()
+
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    wall_time = time.perf_counter() - started
+
+    latencies.sort()
+    requests = len(latencies) + errors[0]
+    ms = lambda value: value * 1000.0 if value is not None else None
+    return {
+        'batch_size': batch_size,
+        'concurrency': concurrency,
+        'target_rps': target_rps,
+        'duration_s': wall_time,
+        'requests': requests,
+        'errors': errors[0],
+        'error_rate': errors[0] / requests if requests else 0.0,
+        'throughput_rps': len(latencies) / wall_time,
+        'throughput_rows_per_s': len(latencies) * batch_size / wall_time,
+        'latency_ms': {
+            'mean': ms(sum(latencies) / len(latencies)) if latencies else None,
+            'p50': ms(percentile(latencies, 0.50)),
+            'p95': ms(percentile(latencies, 0.95)),
+            'p99': ms(percentile(latencies, 0.99)),
+            'max': ms(latencies[-1]) if latencies else None
+        }
+    }
+
+def check_slo(result, slo):
+    # list of SLO violations of one run, empty when it passed
+    violations = []
+    for name in ('p50', 'p95', 'p99'):
+        limit = slo.get(name + '_ms')
+        value = result['latency_ms'][name]
+        if limit is not None and (value is None or value > limit):
+            violations.append('batch %d: %s %.1f ms > %.1f ms' % (result['batch_size'], name, value or float('inf'), limit))
+    if slo.get('max_error_rate') is not None and result['error_rate'] > slo['max_error_rate']:
+        violations.append('batch %d: error rate %.4f > %.4f' % (result['batch_size'], result['error_rate'], slo['max_error_rate']))
+    if slo.get('min_throughput_rps') is not None and result['throughput_rps'] < slo['min_throughput_rps']:
+        violations.append('batch %d: throughput %.1f rps < %.1f rps' % (result['batch_size'], result['throughput_rps'], slo['min_throughput_rps']))
+    return violations
+
+def load_test(scoring_uri, load_config, key=None):
+    # sweep the configured batch sizes and collect results and SLO violations
+    rows = load_rows(load_config['data_path'], load_config.get('drop_columns', []))
+    slo = load_config.get('slo', {})
+    results, violations = [], []
+    for batch_size in load_config['batch_sizes']:
+        result = run_load_test(scoring_uri, build_payloads(rows, batch_size), batch_size,
+                               concurrency=load_config.get('concurrency', 8),
+                               target_rps=load_config.get('target_rps'),
+                               duration_s=load_config.get('duration_s', 30),
+                               timeout_s=load_config.get('timeout_s', 30),
+                               key=key)
+        print('batch %5d: %8.1f rps, p50 %8.1f ms, p95 %8.1f ms, p99 %8.1f ms, errors %.2f%%' % (
+            batch_size, result['throughput_rps'], result['latency_ms']['p50'] or 0,
+            result['latency_ms']['p95'] or 0, result['latency_ms']['p99'] or 0, result['error_rate'] * 100))
+        results.append(result)
+        violations.extend(check_slo(result, slo))
+    return {
+        'scoring_uri': scoring_uri,
+        'slo': slo,
+        'passed': not violations,
+        'violations': violations,
+        'results': results
+    }
+
+def save_load_test_report(report, folder):
+    # save json file
+    os.makedirs(folder, exist_ok=True)
+    with open(folder + '/loadtest.json', "w+") as outfile:
+        json.dump(report, outfile, indent=2)
@@ -0,0 +1,80 @@
+'''
+The _cat columns as plain numeric features against native categorical
+splits (training/categorical.py): model size, trees at early stopping,
+Booster predict latency and test AUC.
+
+    python benchmarks/bench_categorical.py [--rows 200000] [--batch-sizes 1,256,4096] [--cv-repeats 5]
+
+Synthetic rows draw every feature from its distribution in
+data/insurance.csv and the target from a teacher model trained on it (see
+bench_incremental.py), split 80/20 by id. The teacher uses numerical
+splits, so the AUC of data/insurance.csv itself, averaged over repeated
+stratified 5-fold splits, is reported as well.
+'''
+import argparse
+import time
+import numpy as np
+import lightgbm
+from sklearn.model_selection import StratifiedKFold
+from common import HYPER_PARAMS, TRAINING_DIR, add_path, load_insurance, time_call, train_booster
+from bench_incremental import synthetic_rows, is_test
+
+def train_early_stopping(params, X_train, y_train, X_test, y_test):
+    train_data = lightgbm.Dataset(X_train, label=y_train)
+    valid_data = lightgbm.Dataset(X_test, label=y_test, reference=train_data)
+    return lightgbm.train(params, train_data, num_boost_round=500, valid_sets=[valid_data],
+                          callbacks=[lightgbm.early_stopping(20, verbose=False)])
+
+def cv_auc(params, X, y, repeats):
+    from evaluation import roc_auc
+    aucs = []
+    for seed in range(repeats):
+        for train, test in StratifiedKFold(5, shuffle=True, random_state=seed).split(X, y):
+            model = train_early_stopping(params, X.iloc[train], y.iloc[train], X.iloc[test], y.iloc[test])
+            aucs.append(roc_auc(y.iloc[test], model.predict(X.iloc[test])))
+    return float(np.mean(aucs))
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, default=200000)
+    parser.add_argument('--batch-sizes', type=str, default='1,256,4096')
+    parser.add_argument('--cv-repeats', type=int, default=5)
+    args = parser.parse_args()
+
+    add_path(TRAINING_DIR)
+    from categorical import categorical_params
+    from evaluation import roc_auc
+
+    X, y = load_insurance()
+    teacher = train_booster(X, y, num_boost_round=100)
+    ids = np.arange(args.rows)
+    features, target = synthetic_rows(X, teacher, ids, seed=0)
+    test = is_test(ids)
+    X_test = np.ascontiguousarray(features[test].to_numpy(dtype=np.float64))
+    batch_sizes = [int(b) for b in args.batch_sizes.split(',')]
+    settings = [('numeric', dict(HYPER_PARAMS)),
+                ('categorical', dict(HYPER_PARAMS, **categorical_params(list(X.columns), {})))]
+
+    print('%-12s %8s %6s %8s %10s %9s %10s' % ('_cat as', 'train s', 'trees', 'leaves', 'model KB', 'test AUC',
+                                              'csv AUC'))
+    latency = []
+    for name, params in settings:
+        started = time.perf_counter()
+        model = train_early_stopping(params, features[~test], target[~test], features[test], target[test])
+        train_s = time.perf_counter() - started
+        # a registered model holds the trees up to the best iteration, as train.py saves it
+        model = lightgbm.Booster(model_str=model.model_to_string())
+        leaves = sum(tree['num_leaves'] for tree in model.dump_model()['tree_info'])
+        print('%-12s %8.2f %6d %8d %10.1f %9.4f %10.4f' % (
+            name, train_s, model.num_trees(), leaves, len(model.model_to_string()) / 1024.0,
+            roc_auc(target[test], model.predict(X_test)), cv_auc(params, X, y, args.cv_repeats)))
+        for batch_size in batch_sizes:
+            batch = X_test[:batch_size]
+            latency.append((name, batch_size, time_call(lambda: model.predict(batch, num_threads=1))))
+
+    print('%-12s %8s %14s' % ('_cat as', 'batch', 'booster (ms)'))
+    for name, batch_size, booster_s in latency:
+        print('%-12s %8d %14.3f' % (name, batch_size, booster_s * 1000.0))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,47 @@
+'''
+Default pandas dtypes (int64 / float64) against the compact plan of
+training/dtype_plan.py (int8 / float32 here) on a synthetic copy of
+data/insurance.csv: frame memory, training time (Dataset construction and
+--rounds rounds) and scoring time of a batch in the dtype score.py builds.
+
+    python benchmarks/bench_dtypes.py [--rows 2000000] [--rounds 50] [--batch 100000]
+
+Both models are trained on the same values (the float32 ones), so the
+timings compare dtypes, not data.
+'''
+import argparse
+import time
+import numpy as np
+import lightgbm
+from common import HYPER_PARAMS, TARGET_COLUMN, TRAINING_DIR, add_path, synthetic_insurance, time_call
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, default=2000000)
+    parser.add_argument('--rounds', type=int, default=50)
+    parser.add_argument('--batch', type=int, default=100000)
+    args = parser.parse_args()
+
+    add_path(TRAINING_DIR)
+    from dtype_plan import plan_dtypes, apply_dtypes, input_dtype
+    df = synthetic_insurance(args.rows).drop('id', axis=1)
+    y = df.pop(TARGET_COLUMN)
+    plan = plan_dtypes(df)
+    frames = {'compact': apply_dtypes(df, plan)}
+    frames['default'] = frames['compact'].astype({name: 'float64' if dtype.startswith('float') else 'int64'
+                                                  for name, dtype in plan.items()})
+    print('plan: %s' % ', '.join('%d x %s' % (list(plan.values()).count(d), d) for d in sorted(set(plan.values()))))
+    print('%-8s %12s %14s %12s %16s' % ('dtypes', 'frame MB', 'train (s)', 'input', 'predict (ms)'))
+    for name in ('default', 'compact'):
+        X = frames[name]
+        memory_mb = X.memory_usage(index=False).sum() / 2.0 ** 20
+        started = time.perf_counter()
+        booster = lightgbm.train(HYPER_PARAMS, lightgbm.Dataset(X, label=y), num_boost_round=args.rounds)
+        train_s = time.perf_counter() - started
+        dtype = input_dtype(X.dtypes)
+        batch = np.ascontiguousarray(X.iloc[:args.batch].to_numpy(dtype=dtype))
+        predict_s = time_call(lambda: booster.predict(batch, num_threads=1), repeat=5)
+        print('%-8s %12.1f %14.2f %12s %16.1f' % (name, memory_mb, train_s, dtype, predict_s * 1000.0))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,59 @@
+'''
+Evaluation of test-set scores: the classification_report path train.py used
+(threshold 0.5 with a list comprehension, report dict to DataFrame, plus
+roc_auc_score) against training/evaluation.py (one sort, every threshold,
+optimal threshold), and the cost of its bootstrap confidence intervals.
+
+    python benchmarks/bench_evaluation.py [--rows 100000,1000000,4000000] [--bootstrap 100]
+
+Scores are synthetic (4% positives) so the row counts can exceed the
+insurance data. Peak memory is the tracemalloc peak of the call.
+'''
+import argparse
+import time
+import tracemalloc
+import numpy as np
+import pandas as pd
+from sklearn.metrics import classification_report, roc_auc_score
+from common import TRAINING_DIR, add_path
+
+def report_metrics(y_true, y_score):
+    # get_metrics of train.py before training/evaluation.py, plus the AUC
+    y_pred = [1 if p >= 0.5 else 0 for p in y_score]
+    cls_rp = pd.DataFrame(classification_report(y_true, y_pred, output_dict=True)).transpose()
+    metrics = dict(cls_rp.loc['weighted avg'])
+    return metrics['precision'], metrics['recall'], metrics['f1-score'], roc_auc_score(y_true, y_score)
+
+def measure(fn):
+    tracemalloc.start()
+    started = time.perf_counter()
+    result = fn()
+    seconds = time.perf_counter() - started
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return result, seconds, peak / 2.0 ** 20
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=str, default='100000,1000000,4000000')
+    parser.add_argument('--bootstrap', type=int, default=100, help='bootstrap resamples of the last column')
+    args = parser.parse_args()
+
+    add_path(TRAINING_DIR)
+    from evaluation import evaluate
+    rng = np.random.default_rng(0)
+    print('%10s %-28s %10s %12s' % ('rows', 'method', 'seconds', 'peak (MB)'))
+    for rows in [int(r) for r in args.rows.split(',')]:
+        y_true = (rng.random(rows) < 0.04).astype(np.int64)
+        y_score = np.clip(rng.normal(0.3 + 0.2 * y_true, 0.15), 0.0, 1.0)
+        old, old_s, old_mb = measure(lambda: report_metrics(y_true, y_score))
+        new, new_s, new_mb = measure(lambda: evaluate(y_true, y_score, n_bootstrap=0))
+        _, boot_s, boot_mb = measure(lambda: evaluate(y_true, y_score, n_bootstrap=args.bootstrap))
+        at = new['at_threshold']
+        assert np.allclose(old, (at['weighted_precision'], at['weighted_recall'], at['weighted_f1'], new['auc']))
+        print('%10d %-28s %10.3f %12.1f' % (rows, 'classification_report', old_s, old_mb))
+        print('%10d %-28s %10.3f %12.1f' % (rows, 'evaluate', new_s, new_mb))
+        print('%10d %-28s %10.3f %12.1f' % (rows, 'evaluate + %d bootstrap' % args.bootstrap, boot_s, boot_mb))
+
+if __name__ == '__main__':
+    main()
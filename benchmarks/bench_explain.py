@@ -0,0 +1,51 @@
+'''
+Cost of "explain": true requests (top-k pred_contrib feature contributions in
+local_feature_importances) against plain predictions, per batch size.
+
+    python benchmarks/bench_explain.py [--rounds 500] [--batch-sizes 1,16,100,256,4096] [--top-k 5]
+
+predict is Booster.predict, contrib the pred_contrib call alone, explain the
+whole ServingModel.explain (contributions plus top-k selection and
+conversion to lists). The overhead column is explain time over predict time.
+Exits non-zero when the top-k selection disagrees with a full sort.
+'''
+import argparse
+import sys
+import numpy as np
+from common import SCORING_DIR, add_path, load_insurance, sample_rows, time_call, train_booster
+
+add_path(SCORING_DIR)
+import score
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rounds', type=int, default=500, help='boosting rounds of the benchmark model')
+    parser.add_argument('--batch-sizes', type=str, default='1,16,100,256,4096')
+    parser.add_argument('--top-k', type=int, default=score.EXPLAIN_TOP_K)
+    args = parser.parse_args()
+
+    X, y = load_insurance()
+    booster = train_booster(X, y, num_boost_round=args.rounds)
+    feature_names = np.array(booster.feature_name(), dtype=object)
+
+    check = sample_rows(X, 256)
+    contrib = booster.predict(check, pred_contrib=True)
+    explained = score.top_contributions(contrib, args.top_k, feature_names)
+    expected = np.sort(np.abs(contrib[:, :-1]), axis=1)[:, ::-1][:, :args.top_k]
+    selected = np.abs(np.array([[value for _, value in row['top_features']] for row in explained]))
+    if not np.array_equal(selected, expected):
+        sys.exit('top-k selection differs from a full sort')
+    print('top-%d selection matches a full sort on %d rows' % (args.top_k, len(check)))
+
+    print('%8s %14s %14s %14s %10s' % ('batch', 'predict (ms)', 'contrib (ms)', 'explain (ms)', 'overhead'))
+    for batch_size in [int(b) for b in args.batch_sizes.split(',')]:
+        batch = sample_rows(X, batch_size)
+        predict_time = time_call(lambda: booster.predict(batch))
+        contrib_time = time_call(lambda: booster.predict(batch, pred_contrib=True))
+        explain_time = time_call(lambda: score.top_contributions(
+            booster.predict(batch, pred_contrib=True), args.top_k, feature_names))
+        print('%8d %14.3f %14.3f %14.3f %9.1fx' % (batch_size, predict_time * 1000, contrib_time * 1000,
+                                                  explain_time * 1000, explain_time / predict_time))
+
+if __name__ == '__main__':
+    main()
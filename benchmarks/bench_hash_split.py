@@ -0,0 +1,99 @@
+'''
+The split step of training/train_test_split.py on a csv: loaded into pandas
+and split with scikit-learn's train_test_split (as the default mode does),
+against the streaming hash split of training/hash_split.py.
+
+    python benchmarks/bench_hash_split.py [--rows 250000,1000000,2000000] [--chunk-rows 65536] [--growth 0.1]
+
+Every cell runs in a fresh interpreter and reports its time and peak RSS
+(Linux /proc) above the RSS after imports; both write the two parquet
+splits. Stability is the share of the rows of the smallest csv that change
+sides when --growth times as many rows are appended to it, with and without
+stratify.
+'''
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import pandas as pd
+from common import TARGET_COLUMN, TRAINING_DIR, add_path, synthetic_insurance
+from bench_streaming import rss_mb, reset_peak_rss
+
+def sklearn_test_ids(df):
+    from sklearn.model_selection import train_test_split
+    return set(train_test_split(df, test_size=0.2, random_state=0)[1]['id'])
+
+def run_cell(path, method, chunk_rows, out):
+    '''Body of the per-cell interpreter started by main().'''
+    add_path(TRAINING_DIR)
+    from sklearn.model_selection import train_test_split
+    from dtype_plan import plan_dtypes, apply_dtypes
+    from hash_split import hash_split
+    baseline = rss_mb('VmRSS')
+    reset_peak_rss()
+    started = time.perf_counter()
+    if method == 'sklearn':
+        df = pd.read_csv(path)
+        df = apply_dtypes(df, plan_dtypes(df))
+        train_df, test_df = train_test_split(df, test_size=0.2, random_state=0)
+        for name, split in (('train', train_df), ('test', test_df)):
+            os.makedirs(os.path.join(out, name), exist_ok=True)
+            split.to_parquet(os.path.join(out, name, 'processed.parquet'))
+    else:
+        hash_split(path, os.path.join(out, 'train'), os.path.join(out, 'test'), TARGET_COLUMN,
+                   {'chunk_rows': chunk_rows}, log=lambda *args: None)
+    print(json.dumps({'seconds': time.perf_counter() - started, 'peak_mb': rss_mb('VmHWM') - baseline}))
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=str, default='250000,1000000,2000000')
+    parser.add_argument('--chunk-rows', type=int, default=65536)
+    parser.add_argument('--growth', type=float, default=0.1)
+    parser.add_argument('--cell', type=str, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.cell:
+        path, method, out = args.cell.split(',')
+        return run_cell(path, method, args.chunk_rows, out)
+
+    rows_list = [int(r) for r in args.rows.split(',')]
+    print('%10s %-8s %10s %12s %14s' % ('rows', 'split', 'csv MB', 'seconds', 'peak RSS (MB)'))
+    with tempfile.TemporaryDirectory() as tmp:
+        for rows in rows_list:
+            path = os.path.join(tmp, 'insurance_%d.csv' % rows)
+            synthetic_insurance(rows).to_csv(path, index=False)
+            size_mb = os.path.getsize(path) / 2.0 ** 20
+            for method in ('sklearn', 'hash'):
+                out = os.path.join(tmp, method)
+                command = [sys.executable, os.path.abspath(__file__), '--cell', '%s,%s,%s' % (path, method, out),
+                           '--chunk-rows', str(args.chunk_rows)]
+                output = subprocess.run(command, check=True, capture_output=True, text=True).stdout
+                result = json.loads(output.strip().splitlines()[-1])
+                print('%10d %-8s %10.1f %12.2f %14.1f' % (rows, method, size_mb, result['seconds'], result['peak_mb']))
+            os.remove(path)
+
+    add_path(TRAINING_DIR)
+    from hash_split import hash_split
+    rows = rows_list[0]
+    grown = synthetic_insurance(int(rows * (1 + args.growth)))
+    before, after = grown.iloc[:rows], grown
+    old_ids = set(before['id'])
+    moved = len(sklearn_test_ids(before) ^ (sklearn_test_ids(after) & old_ids))
+    print('sklearn: %.1f%% of %d rows change sides after %d%% growth' % (100.0 * moved / rows, rows, 100 * args.growth))
+    for stratify in (False, True):
+        with tempfile.TemporaryDirectory() as tmp:
+            tests = []
+            for name, df in (('before', before), ('after', after)):
+                path = os.path.join(tmp, name + '.csv')
+                df.to_csv(path, index=False)
+                hash_split(path, os.path.join(tmp, name, 'train'), os.path.join(tmp, name, 'test'), TARGET_COLUMN,
+                           {'chunk_rows': args.chunk_rows, 'stratify': stratify}, log=lambda *args: None)
+                tests.append(set(pd.read_parquet(os.path.join(tmp, name, 'test', 'processed.parquet'))['id']))
+            moved = len(tests[0] ^ (tests[1] & old_ids))
+        print('hash:    %.3f%% of %d rows change sides after %d%% growth (stratify %s)' % (
+            100.0 * moved / rows, rows, 100 * args.growth, str(stratify).lower()))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,88 @@
+'''
+Training time and test AUC of incremental training (training/incremental.py,
+continue boosting the previous version on the rows added since) against a
+full retrain, on synthetic data that grows by --growth rows per step.
+
+    python benchmarks/bench_incremental.py [--initial 200000] [--growth 20000] [--steps 5]
+
+Synthetic rows draw every feature from its distribution in
+data/insurance.csv and the target from a teacher model trained on it, so
+new rows follow the same relation and AUC stays meaningful. Rows are split
+80/20 by a hash of their id, as a growing dataset would be. Both modes use
+HYPER_PARAMS with early stopping on the test rows (the full retrain on all
+of them, the incremental run on the new ones); AUC is on all test rows.
+'''
+import argparse
+import time
+import numpy as np
+import pandas as pd
+import lightgbm
+from common import HYPER_PARAMS, TRAINING_DIR, add_path, load_insurance, train_booster
+
+def synthetic_rows(X, teacher, ids, seed):
+    rng = np.random.default_rng(seed)
+    columns = {name: rng.choice(X[name].to_numpy(), len(ids)) for name in X.columns}
+    features = pd.DataFrame(columns, columns=X.columns)
+    target = (rng.random(len(ids)) < teacher.predict(features)).astype(np.int64)
+    return features, target
+
+def is_test(ids):
+    # stable 80/20 split by id, so earlier rows never change sides as data grows
+    return (ids * 2654435761 % 2 ** 32) % 100 < 20
+
+def train_full(X_train, y_train, X_test, y_test):
+    train_data = lightgbm.Dataset(X_train, label=y_train)
+    valid_data = lightgbm.Dataset(X_test, label=y_test, reference=train_data)
+    return lightgbm.train(HYPER_PARAMS, train_data, num_boost_round=500, valid_sets=[valid_data],
+                          callbacks=[lightgbm.early_stopping(20, verbose=False)])
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--initial', type=int, default=200000)
+    parser.add_argument('--growth', type=int, default=20000)
+    parser.add_argument('--steps', type=int, default=5)
+    args = parser.parse_args()
+
+    add_path(TRAINING_DIR)
+    from evaluation import roc_auc
+    from incremental import plan, continue_training
+
+    X, y = load_insurance()
+    # a shallow teacher keeps the target noisy, like the real one
+    teacher = train_booster(X, y, num_boost_round=100)
+    total = args.initial + args.growth * args.steps
+    ids = np.arange(total)
+    features, target = synthetic_rows(X, teacher, ids, seed=0)
+    test = is_test(ids)
+    feature_columns = list(X.columns)
+
+    print('%5s %9s %8s %10s %9s %10s %9s %8s' % ('step', 'rows', 'new', 'full (s)', 'full AUC',
+                                               'incr (s)', 'incr AUC', 'speedup'))
+    model, parent = None, None
+    for step in range(args.steps + 1):
+        rows = args.initial + args.growth * step
+        train, holdout = ~test[:rows], test[:rows]
+        X_train, y_train = features[:rows][train], target[:rows][train]
+        X_test, y_test = features[:rows][holdout], target[:rows][holdout]
+        started = time.perf_counter()
+        full = train_full(X_train, y_train, X_test, y_test)
+        full_s = time.perf_counter() - started
+        full_auc = roc_auc(y_test, full.predict(X_test))
+        if model is None:
+            model, incr_s, incr_auc, new_rows = full, full_s, full_auc, rows
+        else:
+            decision = plan(parent, feature_columns, ids[:rows][train], ids[:rows][holdout], {})
+            assert decision['mode'] == 'incremental', decision['reason']
+            model, incr_s = continue_training(model, X_train[decision['new']], y_train[decision['new']],
+                                              X_test[decision['window']], y_test[decision['window']],
+                                              HYPER_PARAMS, {})
+            incr_auc, new_rows = roc_auc(y_test, model.predict(X_test)), decision['new_rows']
+            # model text round trip, as the next run would load it from the registry
+            model = lightgbm.Booster(model_str=model.model_to_string())
+        parent = {'version': step + 1, 'properties': {'data.max_id': rows - 1, 'data.features': feature_columns,
+                                                      'lineage.chain': 0}}
+        print('%5d %9d %8d %10.2f %9.4f %10.2f %9.4f %7.1fx' % (step, rows, new_rows, full_s, full_auc,
+                                                               incr_s, incr_auc, full_s / incr_s))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,116 @@
+'''
+Cold-start time and resident memory per scoring worker for the ways
+tests/integration/score.py can load the model:
+
+    pickle           joblib.load of insurance-model.pkl in every worker (the default)
+    pickle-preload   SCORE_PRELOAD=1: the pickle loaded once before the workers fork
+    native           SCORE_MODEL_FORMAT=native: lightgbm.Booster(model_file=insurance-model.txt)
+                     in every worker
+    native-preload   native, loaded once before the workers fork
+
+    python benchmarks/bench_model_load.py [--workers 4] [--rounds 500]
+
+Every mode runs in a fresh interpreter that imports numpy and lightgbm and
+then forks the workers, so interpreter and library pages are shared the
+same way in every mode and the numbers isolate the model itself. RSS counts
+every resident page of a worker, PSS splits shared pages between the
+processes that map them.
+'''
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from common import SCORING_DIR, add_path, load_insurance, train_booster
+
+MODES = ('pickle', 'pickle-preload', 'native', 'native-preload')
+
+def memory_kb():
+    '''(rss, pss) of this process in kB.'''
+    values = {}
+    with open('/proc/self/smaps_rollup') as f:
+        for line in f:
+            key, _, rest = line.partition(':')
+            if key in ('Rss', 'Pss'):
+                values[key] = int(rest.split()[0])
+    return values['Rss'], values['Pss']
+
+def worker(score, started, results, barrier):
+    if score is None:
+        import score
+    score.init()
+    loaded = time.perf_counter()
+    # stay alive until every worker has loaded, so shared pages are counted as shared
+    barrier.wait()
+    rss, pss = memory_kb()
+    results.put({'cold_start_ms': (loaded - started) * 1000.0, 'rss_mb': rss / 1024.0, 'pss_mb': pss / 1024.0})
+    barrier.wait()
+
+def run_mode(mode, workers):
+    '''Body of the per-mode interpreter started by main().'''
+    import multiprocessing
+    import numpy
+    import lightgbm
+    add_path(SCORING_DIR)
+    ctx = multiprocessing.get_context('fork')
+    results = ctx.Queue()
+    barrier = ctx.Barrier(workers)
+    score = None
+    started = time.perf_counter()
+    if mode.endswith('-preload'):
+        import score
+    processes = [ctx.Process(target=worker, args=(score, time.perf_counter() if score is None else started,
+                                                  results, barrier))
+                 for _ in range(workers)]
+    for process in processes:
+        process.start()
+    stats = [results.get() for _ in processes]
+    for process in processes:
+        process.join()
+    print(json.dumps(stats))
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--rounds', type=int, default=500, help='boosting rounds of the benchmark model')
+    parser.add_argument('--repeat', type=int, default=5, help='runs per mode, the median run is reported')
+    parser.add_argument('--mode', type=str, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.mode:
+        return run_mode(args.mode, args.workers)
+
+    import joblib
+    X, y = load_insurance()
+    booster = train_booster(X, y, num_boost_round=args.rounds)
+    with tempfile.TemporaryDirectory() as tmp:
+        pickle_dir = os.path.join(tmp, 'pickle', '1')
+        native_dir = os.path.join(tmp, 'native', '1')
+        for path in (pickle_dir, native_dir):
+            os.makedirs(path)
+        joblib.dump(booster, os.path.join(pickle_dir, 'insurance-model.pkl'))
+        booster.save_model(os.path.join(native_dir, 'insurance-model.txt'))
+        print('model: %.1f kB pickle, %.1f kB native text' % (
+            os.path.getsize(os.path.join(pickle_dir, 'insurance-model.pkl')) / 1024.0,
+            os.path.getsize(os.path.join(native_dir, 'insurance-model.txt')) / 1024.0))
+
+        print('%16s %18s %12s %12s' % ('mode', 'cold start (ms)', 'RSS (MB)', 'PSS (MB)'))
+        for mode in MODES:
+            env = dict(os.environ, AZUREML_MODEL_DIR=pickle_dir if mode.startswith('pickle') else native_dir,
+                       SCORE_LATENCY_STATS='0')
+            if not mode.startswith('pickle'):
+                env['SCORE_MODEL_FORMAT'] = 'native'
+            if mode.endswith('-preload'):
+                env['SCORE_PRELOAD'] = '1'
+            command = [sys.executable, os.path.abspath(__file__), '--mode', mode, '--workers', str(args.workers)]
+            runs = []
+            for _ in range(args.repeat):
+                output = subprocess.run(command, env=env, check=True, capture_output=True, text=True).stdout
+                stats = json.loads(output.strip().splitlines()[-1])
+                runs.append({key: sum(s[key] for s in stats) / len(stats) for key in stats[0]})
+            median = lambda key: sorted(run[key] for run in runs)[len(runs) // 2]
+            print('%16s %18.1f %12.1f %12.1f' % (mode, median('cold_start_ms'), median('rss_mb'), median('pss_mb')))
+
+if __name__ == '__main__':
+    main()
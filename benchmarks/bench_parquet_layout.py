@@ -0,0 +1,102 @@
+'''
+The train split as the split step wrote it (DataFrame.to_parquet of the
+shuffled scikit-learn split) and read it back (every column, as
+to_pandas_dataframe() of the tabular dataset does), against the layout of
+training/parquet_layout.py (sorted by id, zstd row groups of
+--row-group-rows rows) read by column, optionally with a row group filter.
+
+    python benchmarks/bench_parquet_layout.py [--rows 2000000] [--row-group-rows 131072] [--window 0.25]
+
+Every read runs in a fresh interpreter and reports the bytes it read
+(rchar of /proc/self/io), its time and its peak RSS (Linux /proc) above the
+RSS after imports. Reads:
+    all columns     every column of the file (the current train.py)
+    features        the feature_list_names of config/dev/config.json, target and id
+    no ps_calc      the same without the ps_calc_* features
+    last window     features, target and id of the --window share of rows with the highest ids
+'''
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from common import REPO_DIR, TARGET_COLUMN, TRAINING_DIR, add_path, synthetic_insurance
+from bench_streaming import rss_mb, reset_peak_rss
+
+READS = ('all columns', 'features', 'no ps_calc', 'last window')
+
+def bytes_read():
+    with open('/proc/self/io') as f:
+        for line in f:
+            if line.startswith('rchar:'):
+                return int(line.split()[1])
+
+def feature_columns():
+    with open(os.path.join(REPO_DIR, 'config', 'dev', 'config.json'), encoding='utf-8-sig') as f:
+        parameter = json.load(f)['pipeline']['configuration'][0]['parameter']
+    return parameter['feature_list_names'].split(', ')
+
+def run_cell(path, read, min_id):
+    '''Body of the per-cell interpreter started by main().'''
+    add_path(TRAINING_DIR)
+    import pandas as pd
+    from parquet_layout import read_frame
+    features = feature_columns()
+    baseline, started_bytes = rss_mb('VmRSS'), bytes_read()
+    reset_peak_rss()
+    started = time.perf_counter()
+    if read == 'all columns':
+        df = pd.read_parquet(path).drop('id', axis=1)
+    else:
+        if read == 'no ps_calc':
+            features = [name for name in features if not name.startswith('ps_calc_')]
+        filters = [['id', '>=', min_id]] if read == 'last window' else None
+        df = read_frame(path, features + [TARGET_COLUMN, 'id'], filters)
+    print(json.dumps({'seconds': time.perf_counter() - started, 'peak_mb': rss_mb('VmHWM') - baseline,
+                      'read_mb': (bytes_read() - started_bytes) / 2.0 ** 20, 'rows': len(df)}))
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, default=2000000)
+    parser.add_argument('--row-group-rows', type=int, default=131072)
+    parser.add_argument('--window', type=float, default=0.25)
+    parser.add_argument('--cell', type=str, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.cell:
+        path, read, min_id = args.cell.split(',')
+        return run_cell(path, read, int(min_id))
+
+    add_path(TRAINING_DIR)
+    from sklearn.model_selection import train_test_split
+    from dtype_plan import plan_dtypes, apply_dtypes
+    from parquet_layout import OUTPUT_NAME, write_frame
+    df = synthetic_insurance(args.rows)
+    df = apply_dtypes(df, plan_dtypes(df))
+    train_df = train_test_split(df, test_size=0.2, random_state=0)[0]
+    del df
+    min_id = int(args.rows * (1 - args.window))
+
+    print('%-10s %-12s %8s %10s %10s %10s %14s' % ('layout', 'read', 'file MB', 'rows', 'read MB', 'seconds',
+                                                   'peak RSS (MB)'))
+    with tempfile.TemporaryDirectory() as tmp:
+        layouts = (('current', lambda path: train_df.to_parquet(os.path.join(path, OUTPUT_NAME))),
+                   ('optimized', lambda path: write_frame(train_df, path, {'row_group_rows': args.row_group_rows})))
+        for layout, write in layouts:
+            folder = os.path.join(tmp, layout)
+            os.makedirs(folder)
+            write(folder)
+            path = os.path.join(folder, OUTPUT_NAME)
+            size_mb = os.path.getsize(path) / 2.0 ** 20
+            reads = READS if layout == 'optimized' else ('all columns', 'last window')
+            for read in reads:
+                command = [sys.executable, os.path.abspath(__file__), '--cell', '%s,%s,%d' % (path, read, min_id)]
+                output = subprocess.run(command, check=True, capture_output=True, text=True).stdout
+                result = json.loads(output.strip().splitlines()[-1])
+                print('%-10s %-12s %8.1f %10d %10.1f %10.2f %14.1f' % (layout, read, size_mb, result['rows'],
+                                                                      result['read_mb'], result['seconds'],
+                                                                      result['peak_mb']))
+
+if __name__ == '__main__':
+    main()
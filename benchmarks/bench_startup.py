@@ -0,0 +1,77 @@
+'''
+Cold-start profile of tests/integration/score.py: import time per top-level
+package (python -X importtime), init() duration and the first two requests.
+
+    python benchmarks/bench_startup.py [--rounds 500] [--top 10]
+
+Runs in fresh interpreters with SCORE_SLIM_IMPORTS=0 (lightgbm imports its
+optional pandas / scikit-learn integrations) and SCORE_SLIM_IMPORTS=1 (the
+default). Import time per package is the own time of its modules, so
+lightgbm's row does not include the pandas or scikit-learn it imports.
+'''
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+from common import SCORING_DIR, load_insurance, train_booster
+
+PROFILE = '''
+import json, sys, time
+sys.path.insert(0, %r)
+t0 = time.perf_counter()
+import score
+t1 = time.perf_counter()
+score.init()
+t2 = time.perf_counter()
+request = json.dumps({'data': [[0] * score.serving.booster.num_feature()]})
+score.run(request)
+t3 = time.perf_counter()
+score.run(request)
+t4 = time.perf_counter()
+print(json.dumps({'import score': (t1 - t0) * 1000.0, 'init()': (t2 - t1) * 1000.0,
+                  'first request': (t3 - t2) * 1000.0, 'second request': (t4 - t3) * 1000.0,
+                  'warm-up predict': score.startup['warm_up_ms']}))
+'''
+
+def import_times(stderr):
+    '''Import time in ms per package (own time of all its modules) from -X importtime output.'''
+    times = {}
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        self_us, _, name = line[len('import time:'):].split('|')
+        package = name.strip().split('.')[0]
+        times[package] = times.get(package, 0.0) + int(self_us) / 1000.0
+    return times
+
+def profile(model_dir, slim):
+    env = dict(os.environ, AZUREML_MODEL_DIR=model_dir, SCORE_SLIM_IMPORTS='1' if slim else '0')
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', PROFILE % SCORING_DIR],
+                            env=env, check=True, capture_output=True, text=True)
+    return json.loads(result.stdout.strip().splitlines()[-1]), import_times(result.stderr)
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rounds', type=int, default=500, help='boosting rounds of the benchmark model')
+    parser.add_argument('--top', type=int, default=10, help='packages listed per run')
+    args = parser.parse_args()
+
+    X, y = load_insurance()
+    booster = train_booster(X, y, num_boost_round=args.rounds)
+    with tempfile.TemporaryDirectory() as tmp:
+        model_dir = os.path.join(tmp, '1')
+        os.makedirs(model_dir)
+        booster.save_model(os.path.join(model_dir, 'insurance-model.txt'))
+        for slim in (False, True):
+            stages, packages = profile(model_dir, slim)
+            print('SCORE_SLIM_IMPORTS=%d' % slim)
+            for stage, ms in stages.items():
+                print('  %-20s %10.1f ms' % (stage, ms))
+            print('  slowest imports:')
+            for package, ms in sorted(packages.items(), key=lambda item: -item[1])[:args.top]:
+                print('    %-18s %10.1f ms' % (package, ms))
+
+if __name__ == '__main__':
+    main()
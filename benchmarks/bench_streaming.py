@@ -0,0 +1,81 @@
+'''
+Peak memory of building the training Dataset from a parquet split: loaded
+into pandas as train.py does with to_pandas_dataframe() (then drop('id')
+and the feature selection), against training/streaming.py reading
+--chunk-rows rows at a time into a lightgbm.Sequence.
+
+    python benchmarks/bench_streaming.py [--rows 250000,1000000,2000000] [--chunk-rows 65536] [--rounds 10]
+
+Every cell runs in a fresh interpreter and reports its peak RSS (Linux
+/proc) above the RSS after imports, with the time to construct the Dataset
+and train --rounds rounds. The binned Dataset LightGBM keeps (one byte per value here)
+grows with the rows in both paths; the streaming path adds one chunk.
+'''
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from common import HYPER_PARAMS, TARGET_COLUMN, TRAINING_DIR, add_path, synthetic_insurance
+
+def rss_mb(field):
+    with open('/proc/self/status') as f:
+        for line in f:
+            if line.startswith(field + ':'):
+                return int(line.split()[1]) / 1024.0
+
+def reset_peak_rss():
+    # Linux: writing 5 to clear_refs resets the peak (VmHWM) to the current RSS
+    with open('/proc/self/clear_refs', 'w') as f:
+        f.write('5')
+
+def run_cell(path, method, chunk_rows, rounds):
+    '''Body of the per-cell interpreter started by main().'''
+    add_path(TRAINING_DIR)
+    import pandas as pd
+    import pyarrow.parquet as pq
+    import lightgbm
+    from streaming import ParquetSource
+    feature_columns = [name for name in pq.ParquetFile(path).schema_arrow.names if name not in ('id', TARGET_COLUMN)]
+    baseline = rss_mb('VmRSS')
+    reset_peak_rss()
+    started = time.perf_counter()
+    if method == 'pandas':
+        df = pd.read_parquet(path).drop('id', axis=1)
+        X, y = df[feature_columns], df[TARGET_COLUMN]
+    else:
+        source = ParquetSource(path, chunk_rows)
+        X, y = source.sequence(feature_columns), source.column(TARGET_COLUMN)
+    train_data = lightgbm.Dataset(X, label=y, params=HYPER_PARAMS)
+    lightgbm.train(HYPER_PARAMS, train_data, num_boost_round=rounds)
+    print(json.dumps({'seconds': time.perf_counter() - started, 'peak_mb': rss_mb('VmHWM') - baseline}))
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=str, default='250000,1000000,2000000')
+    parser.add_argument('--chunk-rows', type=int, default=65536)
+    parser.add_argument('--rounds', type=int, default=10)
+    parser.add_argument('--cell', type=str, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.cell:
+        path, method = args.cell.split(',')
+        return run_cell(path, method, args.chunk_rows, args.rounds)
+
+    print('%10s %-10s %12s %12s %14s' % ('rows', 'input', 'parquet MB', 'seconds', 'peak RSS (MB)'))
+    with tempfile.TemporaryDirectory() as tmp:
+        for rows in [int(r) for r in args.rows.split(',')]:
+            path = os.path.join(tmp, 'train_%d.parquet' % rows)
+            synthetic_insurance(rows).to_parquet(path, row_group_size=args.chunk_rows)
+            size_mb = os.path.getsize(path) / 2.0 ** 20
+            for method in ('pandas', 'streaming'):
+                command = [sys.executable, os.path.abspath(__file__), '--cell', '%s,%s' % (path, method),
+                           '--chunk-rows', str(args.chunk_rows), '--rounds', str(args.rounds)]
+                output = subprocess.run(command, check=True, capture_output=True, text=True).stdout
+                result = json.loads(output.strip().splitlines()[-1])
+                print('%10d %-10s %12.1f %12.2f %14.1f' % (rows, method, size_mb, result['seconds'], result['peak_mb']))
+            os.remove(path)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,95 @@
+'''
+Throughput and latency of tests/integration/score.py for a matrix of
+workers x LightGBM threads per worker x batch size.
+
+    python benchmarks/bench_threads.py [--workers 1,2,4] [--threads 1,2,4] [--batch-sizes 1,256,20000] [--seconds 3]
+
+Every cell forks the given number of scoring workers (SCORE_NUM_THREADS
+threads each, batches over SCORE_CHUNK_ROWS rows are chunked across them),
+all scoring the same batch in a loop for --seconds. Reported are total rows
+per second and the median / p99 latency of one predict. Cells with
+workers x threads above the CPUs of this box show the cost of
+oversubscription; score.py's default is CPUs // WORKER_COUNT threads.
+'''
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import numpy as np
+from common import SCORING_DIR, add_path, load_insurance, sample_rows, train_booster
+
+def worker(seconds, batch, results, barrier):
+    import score
+    score.init()
+    score.serving.predict(batch)
+    barrier.wait()
+    timings = []
+    started = time.perf_counter()
+    while time.perf_counter() - started < seconds:
+        t0 = time.perf_counter()
+        score.serving.predict(batch)
+        timings.append(time.perf_counter() - t0)
+    results.put(timings)
+
+def run_cell(workers, seconds, batch_size):
+    '''Body of the per-cell interpreter started by main().'''
+    import multiprocessing
+    add_path(SCORING_DIR)
+    X, _ = load_insurance()
+    batch = sample_rows(X, batch_size)
+    ctx = multiprocessing.get_context('fork')
+    results = ctx.Queue()
+    barrier = ctx.Barrier(workers)
+    processes = [ctx.Process(target=worker, args=(seconds, batch, results, barrier)) for _ in range(workers)]
+    for process in processes:
+        process.start()
+    timings = [results.get() for _ in processes]
+    for process in processes:
+        process.join()
+    print(json.dumps(timings))
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--workers', type=str, default='1,2,4')
+    parser.add_argument('--threads', type=str, default='1,2,4')
+    parser.add_argument('--batch-sizes', type=str, default='1,256,20000')
+    parser.add_argument('--seconds', type=float, default=3.0)
+    parser.add_argument('--rounds', type=int, default=500, help='boosting rounds of the benchmark model')
+    parser.add_argument('--cell', type=str, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.cell:
+        workers, batch_size = [int(v) for v in args.cell.split(',')]
+        return run_cell(workers, args.seconds, batch_size)
+
+    add_path(SCORING_DIR)
+    import score
+    print('CPUs: %d (affinity %d, cgroup quota %s)' % (score.detect_cpu_count(), len(os.sched_getaffinity(0)),
+                                                        score.cgroup_cpu_quota()))
+    X, y = load_insurance()
+    booster = train_booster(X, y, num_boost_round=args.rounds)
+    with tempfile.TemporaryDirectory() as tmp:
+        model_dir = os.path.join(tmp, '1')
+        os.makedirs(model_dir)
+        booster.save_model(os.path.join(model_dir, 'insurance-model.txt'))
+        print('%8s %8s %8s %14s %12s %12s' % ('workers', 'threads', 'batch', 'rows/s', 'p50 (ms)', 'p99 (ms)'))
+        for workers in [int(w) for w in args.workers.split(',')]:
+            for threads in [int(t) for t in args.threads.split(',')]:
+                for batch_size in [int(b) for b in args.batch_sizes.split(',')]:
+                    env = dict(os.environ, AZUREML_MODEL_DIR=model_dir, SCORE_NUM_THREADS=str(threads),
+                               WORKER_COUNT=str(workers), SCORE_LATENCY_STATS='0')
+                    command = [sys.executable, os.path.abspath(__file__), '--cell', '%d,%d' % (workers, batch_size),
+                               '--seconds', str(args.seconds)]
+                    output = subprocess.run(command, env=env, check=True, capture_output=True, text=True).stdout
+                    timings = json.loads(output.strip().splitlines()[-1])
+                    rows = sum(len(t) for t in timings) * batch_size
+                    latencies = np.concatenate([np.array(t) for t in timings]) * 1000.0
+                    elapsed = max(sum(t) for t in timings)
+                    print('%8d %8d %8d %14.0f %12.3f %12.3f' % (workers, threads, batch_size, rows / elapsed,
+                                                                np.percentile(latencies, 50),
+                                                                np.percentile(latencies, 99)))
+
+if __name__ == '__main__':
+    main()
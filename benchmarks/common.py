@@ -0,0 +1,67 @@
+'''
+Shared helpers for the benchmark scripts in this folder. They run on a
+developer box with no Azure workspace: data comes from data/insurance.csv
+and models are trained in-process.
+'''
+import os
+import sys
+import time
+import numpy as np
+import pandas as pd
+import lightgbm
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DATA_PATH = os.path.join(REPO_DIR, 'data', 'insurance.csv')
+SCORING_DIR = os.path.join(REPO_DIR, 'tests', 'integration')
+TRAINING_DIR = os.path.join(REPO_DIR, 'training')
+TARGET_COLUMN = 'target'
+
+# mirrors hyper_params in training/train.py
+HYPER_PARAMS = {
+    "learning_rate": 0.02,
+    "boosting_type": "gbdt",
+    "objective": "binary",
+    "metric": "auc",
+    "sub_feature": 0.7,
+    "num_leaves": 60,
+    "min_data": 100,
+    "min_hessian": 1,
+    "verbose": -1
+}
+
+def load_insurance():
+    '''Feature frame and target of data/insurance.csv, in training column order.'''
+    df = pd.read_csv(DATA_PATH)
+    return df.drop(['id', TARGET_COLUMN], axis=1), df[TARGET_COLUMN]
+
+def synthetic_insurance(rows, seed=0):
+    '''A larger copy of data/insurance.csv made by resampling its rows.'''
+    df = pd.read_csv(DATA_PATH)
+    rng = np.random.default_rng(seed)
+    out = df.iloc[rng.integers(0, len(df), rows)].reset_index(drop=True)
+    out['id'] = np.arange(rows)
+    return out
+
+def train_booster(X, y, num_boost_round=500, params=None):
+    '''Train without early stopping so the booster has a realistic number of trees.'''
+    return lightgbm.train(dict(params or HYPER_PARAMS), lightgbm.Dataset(X, label=y),
+                          num_boost_round=num_boost_round)
+
+def sample_rows(X, rows, seed=0):
+    rng = np.random.default_rng(seed)
+    return np.ascontiguousarray(np.asarray(X, dtype=np.float64)[rng.integers(0, len(X), rows)])
+
+def time_call(fn, repeat=20, min_time=0.2):
+    '''Median wall time of fn() in seconds, repeating at least repeat times and min_time seconds.'''
+    fn()
+    timings = []
+    started = time.perf_counter()
+    while len(timings) < repeat or time.perf_counter() - started < min_time:
+        t0 = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - t0)
+    return float(np.median(timings))
+
+def add_path(path):
+    if path not in sys.path:
+        sys.path.insert(0, path)
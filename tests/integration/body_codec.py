@@ -0,0 +1,119 @@
+'''
+Binary request and response bodies of score.py: raw tensors, .npy files and
+Arrow IPC streams/files, recognised by content type or magic bytes.
+'''
+import io
+import struct
+import numpy as np
+
+# Content types accepted by run(). Anything that is not a binary format falls
+# back to the original JSON {'data': [...]} contract.
+CONTENT_TYPE_JSON = 'application/json'
+CONTENT_TYPE_RAW = 'application/x-k2-tensor'
+CONTENT_TYPE_NPY = 'application/x-npy'
+CONTENT_TYPE_ARROW = 'application/vnd.apache.arrow.stream'
+CONTENT_TYPE_ARROW_FILE = 'application/vnd.apache.arrow.file'
+BINARY_CONTENT_TYPES = (CONTENT_TYPE_RAW, CONTENT_TYPE_NPY, CONTENT_TYPE_ARROW, CONTENT_TYPE_ARROW_FILE)
+
+# Raw tensor layout: 16 byte little-endian header (magic, rows, columns,
+# itemsize) followed by rows * columns float32 (itemsize 4) or float64
+# (itemsize 8) values in row-major order.
+RAW_MAGIC = b'K2TN'
+RAW_HEADER = struct.Struct('<4sIIB3x')
+RAW_DTYPES = {4: np.dtype('<f4'), 8: np.dtype('<f8')}
+NPY_MAGIC = b'\x93NUMPY'
+ARROW_FILE_MAGIC = b'ARROW1'
+ARROW_STREAM_MAGIC = b'\xff\xff\xff\xff'
+
+def negotiate_content_type(data, content_type=None):
+    '''
+    Resolve the request format from an explicit binary content type
+    (parameters such as "; charset=utf-8" are ignored) or, for byte payloads
+    under any other content type (application/octet-stream, the default of
+    most HTTP clients, or none), from the magic bytes at the start of the
+    body. Strings are always JSON.
+    '''
+    if content_type:
+        content_type = content_type.split(';')[0].strip().lower()
+        if content_type in BINARY_CONTENT_TYPES:
+            return content_type
+    if isinstance(data, (bytes, bytearray, memoryview)):
+        head = bytes(data[:8])
+        if head.startswith(RAW_MAGIC):
+            return CONTENT_TYPE_RAW
+        if head.startswith(NPY_MAGIC):
+            return CONTENT_TYPE_NPY
+        if head.startswith(ARROW_FILE_MAGIC):
+            return CONTENT_TYPE_ARROW_FILE
+        if head.startswith(ARROW_STREAM_MAGIC):
+            return CONTENT_TYPE_ARROW
+    return CONTENT_TYPE_JSON
+
+def decode_raw(data):
+    '''Wrap a raw tensor body as a (rows, columns) array without copying.'''
+    magic, rows, columns, itemsize = RAW_HEADER.unpack_from(data)
+    if magic != RAW_MAGIC or itemsize not in RAW_DTYPES:
+        raise ValueError('invalid raw tensor header')
+    return np.frombuffer(data, dtype=RAW_DTYPES[itemsize], count=rows * columns,
+                         offset=RAW_HEADER.size).reshape(rows, columns)
+
+def decode_npy(data):
+    '''Wrap an .npy body as an array without copying.'''
+    header = io.BytesIO(bytes(data[:4096]))
+    version = np.lib.format.read_magic(header)
+    if version == (1, 0):
+        shape, fortran_order, dtype = np.lib.format.read_array_header_1_0(header)
+    else:
+        shape, fortran_order, dtype = np.lib.format.read_array_header_2_0(header)
+    array = np.frombuffer(data, dtype=dtype, count=int(np.prod(shape)), offset=header.tell())
+    if fortran_order:
+        return array.reshape(shape[::-1]).T
+    return array.reshape(shape)
+
+def decode_arrow(data, content_type):
+    '''
+    Convert an Arrow IPC body to a (rows, columns) array. A single
+    FixedSizeList column (one list per row) is wrapped without copying, a
+    table with one column per feature is gathered into one row-major array.
+    '''
+    import pyarrow as pa
+    buffer = pa.py_buffer(data)
+    if content_type == CONTENT_TYPE_ARROW_FILE:
+        table = pa.ipc.open_file(buffer).read_all()
+    else:
+        table = pa.ipc.open_stream(buffer).read_all()
+    if table.num_columns == 1 and pa.types.is_fixed_size_list(table.column(0).type):
+        column = table.column(0).combine_chunks()
+        values = column.flatten().to_numpy(zero_copy_only=False)
+        return values.reshape(len(column), column.type.list_size)
+    np_data = np.empty((table.num_rows, table.num_columns), dtype=np.float64)
+    for i, column in enumerate(table.columns):
+        np_data[:, i] = column.to_numpy()
+    return np_data
+
+def decode_binary(data, content_type):
+    if content_type == CONTENT_TYPE_RAW:
+        return decode_raw(data)
+    if content_type == CONTENT_TYPE_NPY:
+        return decode_npy(data)
+    return decode_arrow(data, content_type)
+
+def encode_binary(score, content_type):
+    '''Encode prediction scores as a (rows, 1) float64 tensor in the request format.'''
+    score = np.ascontiguousarray(score, dtype='<f8')
+    if content_type == CONTENT_TYPE_RAW:
+        return RAW_HEADER.pack(RAW_MAGIC, len(score), 1, score.itemsize) + score.tobytes()
+    if content_type == CONTENT_TYPE_NPY:
+        out = io.BytesIO()
+        np.save(out, score.reshape(-1, 1))
+        return out.getvalue()
+    import pyarrow as pa
+    table = pa.table({'prediction_score': score})
+    out = pa.BufferOutputStream()
+    if content_type == CONTENT_TYPE_ARROW_FILE:
+        writer = pa.ipc.new_file(out, table.schema)
+    else:
+        writer = pa.ipc.new_stream(out, table.schema)
+    writer.write_table(table)
+    writer.close()
+    return out.getvalue().to_pybytes()
@@ -0,0 +1,172 @@
+'''
+Input schema of the scoring service, written by training/train.py as
+schema.json next to the model and compiled once per loaded model.
+
+Every feature has a kind (bin, cat, int or float), the min/max seen in
+training and whether NaN (JSON null) is accepted:
+    {"features": [{"name": "ps_ind_01", "kind": "int", "min": 0, "max": 7, "allow_nan": false}, ...]}
+validate() converts a request to a float matrix and checks it for the whole
+batch in one vectorized pass; only rows that fail are looked at one by one
+to describe what is wrong with them. Shape, dtype, NaN policy and the
+bounds of the kind (bin: 0 or 1, cat: an integer code >= -1, as LightGBM
+reads any other code as an unseen category) reject a row. The training
+range of int and float features only produces a warning, unless
+reject_range is set: LightGBM scores values outside it like the nearest
+value it saw.
+'''
+import json
+import numpy as np
+
+SCHEMA_NAME = 'schema.json'
+
+KIND_BIN = 'bin'
+KIND_CAT = 'cat'
+KIND_INT = 'int'
+KIND_FLOAT = 'float'
+
+# int and float features may exceed the training range by this fraction of
+# it before a value is reported (or rejected with reject_range)
+DEFAULT_RANGE_MARGIN = 0.5
+# bounds of a kind whatever the training split held; -1 is the missing code
+KIND_BOUNDS = {KIND_BIN: (0.0, 1.0), KIND_CAT: (-1.0, np.inf)}
+
+class InputSchema:
+    '''Compiled schema: one array entry per feature, so checks broadcast over the batch.'''
+    def __init__(self, names, lower, upper, allow_nan, integral, range_lower=None, range_upper=None,
+                 reject_range=False):
+        self.names = names
+        self.lower = lower
+        self.upper = upper
+        self.allow_nan = allow_nan
+        self.integral = integral
+        self.num_feature = len(names)
+        self.range_lower = np.full(self.num_feature, -np.inf) if range_lower is None else range_lower
+        self.range_upper = np.full(self.num_feature, np.inf) if range_upper is None else range_upper
+        if reject_range:
+            self.lower = np.maximum(self.lower, self.range_lower)
+            self.upper = np.minimum(self.upper, self.range_upper)
+        self.check_range = not reject_range and bool(np.isfinite(self.range_lower).any() or
+                                                     np.isfinite(self.range_upper).any())
+
+    @classmethod
+    def from_dict(cls, schema, range_margin=DEFAULT_RANGE_MARGIN, reject_range=False):
+        features = schema['features']
+        lower = np.full(len(features), -np.inf)
+        upper = np.full(len(features), np.inf)
+        range_lower = np.full(len(features), -np.inf)
+        range_upper = np.full(len(features), np.inf)
+        for i, feature in enumerate(features):
+            if feature['kind'] in KIND_BOUNDS:
+                # models saved before the kind bounds have the training min/max here
+                lower[i], upper[i] = KIND_BOUNDS[feature['kind']]
+            elif feature['min'] is not None:
+                margin = range_margin * (feature['max'] - feature['min'])
+                range_lower[i] = feature['min'] - margin
+                range_upper[i] = feature['max'] + margin
+        return cls(names=[feature['name'] for feature in features],
+                   lower=lower, upper=upper,
+                   allow_nan=np.array([feature['allow_nan'] for feature in features]),
+                   integral=np.array([feature['kind'] != KIND_FLOAT for feature in features]),
+                   range_lower=range_lower, range_upper=range_upper, reject_range=reject_range)
+
+    @classmethod
+    def from_file(cls, path, range_margin=DEFAULT_RANGE_MARGIN, reject_range=False):
+        with open(path) as f:
+            return cls.from_dict(json.load(f), range_margin, reject_range)
+
+    @classmethod
+    def from_booster(cls, booster):
+        '''Fallback for models without schema.json: only shape and dtype are checked.'''
+        num_feature = booster.num_feature()
+        return cls(names=booster.feature_name(),
+                   lower=np.full(num_feature, -np.inf), upper=np.full(num_feature, np.inf),
+                   allow_nan=np.ones(num_feature, dtype=bool), integral=np.zeros(num_feature, dtype=bool))
+
+    def validate(self, data):
+        '''
+        (X, valid, errors, warnings) for a list of rows or a 2-D array: X
+        holds every row as floats (rows that could not be converted are NaN),
+        valid is the boolean mask of rows that passed and errors lists the
+        others as {'row': i, 'errors': [{'feature': name, 'value': v, 'reason': text}, ...]}.
+        warnings lists the valid rows with values outside the training range
+        the same way, as {'row': i, 'warnings': [...]}; they are scored.
+        '''
+        X, errors = self.convert(data)
+        valid = np.ones(len(X), dtype=bool)
+        if errors:
+            valid[[error['row'] for error in errors]] = False
+        is_nan = np.isnan(X)
+        bad = is_nan & ~self.allow_nan
+        bad |= np.isinf(X)
+        # NaN compares False, so it only fails the NaN policy
+        bad |= X < self.lower
+        bad |= X > self.upper
+        if self.integral.any():
+            bad |= self.integral & (X != np.round(X)) & ~is_nan
+        bad[~valid] = False
+        bad_rows = np.flatnonzero(bad.any(axis=1))
+        if len(bad_rows):
+            valid[bad_rows] = False
+            errors.extend(self.describe(X, bad, row) for row in bad_rows)
+            errors.sort(key=lambda error: error['row'])
+        warnings = []
+        if self.check_range:
+            outside = (X < self.range_lower) | (X > self.range_upper)
+            outside[~valid] = False
+            warnings = [{'row': int(row), 'warnings': self.describe(X, outside, row)['errors']}
+                        for row in np.flatnonzero(outside.any(axis=1))]
+        return X, valid, errors, warnings
+
+    def convert(self, data):
+        '''Float matrix of the request; rows are converted one by one only when the batch does not convert as a whole.'''
+        errors = []
+        try:
+            X = np.asarray(data)
+            if X.dtype.kind in 'biuf' and X.ndim == 2 and X.shape[1] == self.num_feature:
+                # float32 binary bodies stay float32 and are not copied
+                return (X if X.dtype.kind == 'f' else X.astype(np.float64)), errors
+        except ValueError:
+            # ragged rows
+            pass
+        if isinstance(data, np.ndarray) and data.ndim != 2:
+            raise ValueError('expected a 2-D array of rows, got %d dimensions' % data.ndim)
+        X = np.full((len(data), self.num_feature), np.nan)
+        for i, row in enumerate(data):
+            if not isinstance(row, (list, tuple, np.ndarray)) or len(row) != self.num_feature:
+                size = len(row) if isinstance(row, (list, tuple, np.ndarray)) else 1
+                errors.append({'row': i, 'errors': [{'feature': None, 'value': None,
+                                                     'reason': 'expected %d values, got %d' % (self.num_feature, size)}]})
+                continue
+            row_errors = []
+            for j, value in enumerate(row):
+                if value is None:
+                    continue
+                if isinstance(value, (int, float, np.number)):
+                    X[i, j] = value
+                else:
+                    row_errors.append({'feature': self.names[j], 'value': str(value), 'reason': 'not a number'})
+            if row_errors:
+                errors.append({'row': i, 'errors': row_errors})
+        return X, errors
+
+    def describe(self, X, bad, row):
+        row_errors = []
+        for j in np.flatnonzero(bad[row]):
+            value = X[row, j]
+            if np.isnan(value):
+                reason = 'missing value not allowed'
+            elif np.isinf(value):
+                reason = 'infinite value'
+            elif value < self.lower[j]:
+                reason = 'below minimum %g' % self.lower[j]
+            elif value > self.upper[j]:
+                reason = 'above maximum %g' % self.upper[j]
+            elif value < self.range_lower[j]:
+                reason = 'below training range %g' % self.range_lower[j]
+            elif value > self.range_upper[j]:
+                reason = 'above training range %g' % self.range_upper[j]
+            else:
+                reason = 'not an integer'
+            row_errors.append({'feature': self.names[j], 'value': float(value) if np.isfinite(value) else None,
+                               'reason': reason})
+        return {'row': int(row), 'errors': row_errors}
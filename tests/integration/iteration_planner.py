@@ -0,0 +1,68 @@
+'''
+num_iteration per request under a latency budget (SCORE_LATENCY_BUDGET_MS
+or the request's latency_budget_ms), from the AUC-versus-iteration table
+train.py saves as iterations.json and a per-tree, per-row cost model.
+'''
+import time
+import numpy as np
+
+class IterationPlanner:
+    '''Chooses num_iteration for a latency budget from the model's AUC-versus-iteration table.'''
+    def __init__(self, table, num_iterations):
+        self.num_iterations = num_iterations
+        if table:
+            rows = [row for row in table['iterations'] if row['num_iteration'] <= num_iterations]
+            self.cutoffs = [row['num_iteration'] for row in rows]
+            self.auc = [row['auc'] for row in rows]
+        else:
+            # no table: evenly spaced cut-offs, more trees assumed to be better
+            self.cutoffs = sorted(set(max(1, round(num_iterations * (i + 1) / 10)) for i in range(10)))
+            self.auc = list(self.cutoffs)
+        # predict time ~ overhead_s + tree_row_s * rows * trees
+        self.overhead_s = 0.0
+        self.tree_row_s = None
+        self.truncated = 0
+
+    def calibrate(self, predict, num_feature):
+        '''Fit the cost model to timed predicts of every tree on 1 and 256 synthetic rows.'''
+        timings = []
+        for rows in (1, 256):
+            X = np.zeros((rows, num_feature))
+            predict(X)
+            best = float('inf')
+            for _ in range(3):
+                t0 = time.perf_counter()
+                predict(X)
+                best = min(best, time.perf_counter() - t0)
+            timings.append(best)
+        self.tree_row_s = max(timings[1] - timings[0], 1e-9) / (255 * self.num_iterations)
+        self.overhead_s = max(timings[0] - self.tree_row_s * self.num_iterations, 0.0)
+
+    def observe(self, seconds, rows, num_iteration):
+        '''Refine the per tree and row cost with the time of a model predict of rows rows (moving average).'''
+        if rows:
+            estimate = max(seconds - self.overhead_s, 0.0) / (rows * num_iteration)
+            self.tree_row_s += 0.1 * (estimate - self.tree_row_s)
+
+    def choose(self, rows, budget_s):
+        '''num_iteration for rows within budget_s: None when every tree fits, else the best fitting cut-off.'''
+        if self.tree_row_s is None:
+            return None
+        cost = lambda trees: self.overhead_s + self.tree_row_s * rows * trees
+        if not self.cutoffs or cost(self.num_iterations) <= budget_s:
+            return None
+        fitting = [(auc, cutoff) for auc, cutoff in zip(self.auc, self.cutoffs) if cost(cutoff) <= budget_s]
+        # nothing fits: fewest trees, the closest we can get to the budget
+        choice = max(fitting)[1] if fitting else self.cutoffs[0]
+        if choice >= self.num_iterations:
+            return None
+        self.truncated += 1
+        return choice
+
+    def metrics(self):
+        return {
+            'num_iterations': self.num_iterations,
+            'overhead_ms': self.overhead_s * 1000.0,
+            'tree_row_us': self.tree_row_s * 1e6 if self.tree_row_s is not None else None,
+            'truncated': self.truncated
+        }
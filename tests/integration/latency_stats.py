@@ -0,0 +1,111 @@
+'''
+Per-stage latency histograms of score.py's run(), on unless
+SCORE_LATENCY_STATS=0, with an optional periodic dump to a JSON file.
+'''
+import json
+import os
+import threading
+import time
+from bisect import bisect_left
+
+# stages of a request, in the order StageLatency.record() takes their ends
+LATENCY_STAGES = ('decode', 'convert', 'predict', 'encode')
+
+# latency histogram bucket upper bounds in seconds
+LATENCY_BUCKETS = [1e-6 * 2 ** (i / 4.0) for i in range(108)]
+
+class LatencyHistogram:
+    '''
+    Fixed log-spaced histogram of durations in seconds, 4 buckets per
+    doubling from 1 us to ~100 s, so percentiles are within ~19%.
+    record() takes no lock: a concurrent increment may rarely be lost, which
+    keeps recording well under a microsecond.
+    '''
+    def __init__(self):
+        self.counts = [0] * (len(LATENCY_BUCKETS) + 1)
+        self.total = 0.0
+
+    def record(self, seconds):
+        self.counts[bisect_left(LATENCY_BUCKETS, seconds)] += 1
+        self.total += seconds
+
+    def percentile(self, counts, count, q):
+        rank = q * count
+        seen = 0
+        for i, c in enumerate(counts):
+            seen += c
+            if seen >= rank:
+                return LATENCY_BUCKETS[min(i, len(LATENCY_BUCKETS) - 1)]
+        return LATENCY_BUCKETS[-1]
+
+    def summary(self):
+        counts = list(self.counts)
+        count = sum(counts)
+        if not count:
+            return {'count': 0}
+        return {
+            'count': count,
+            'mean_ms': self.total / count * 1000.0,
+            'p50_ms': self.percentile(counts, count, 0.50) * 1000.0,
+            'p90_ms': self.percentile(counts, count, 0.90) * 1000.0,
+            'p99_ms': self.percentile(counts, count, 0.99) * 1000.0
+        }
+
+class StageLatency:
+    '''
+    One LatencyHistogram per stage of run(), plus the periodic JSON dump of
+    what snapshot() returns (score.py's diagnostics). The dump runs on its own
+    thread, so no request pays for the file I/O.
+    '''
+    def __init__(self, dump_path=None, dump_interval_s=60, snapshot=None):
+        self.stages = {stage: LatencyHistogram() for stage in LATENCY_STAGES}
+        self.histograms = [self.stages[stage] for stage in LATENCY_STAGES]
+        # only explain requests are counted here, so plain requests do not dilute it
+        self.explain = LatencyHistogram()
+        self.dump_path = dump_path
+        self.dump_interval_s = dump_interval_s
+        self.snapshot = snapshot or self.summary
+        self.dump_errors = 0
+        if dump_path:
+            self.thread = threading.Thread(target=self.loop, name='score-latency-dump', daemon=True)
+            self.thread.start()
+
+    def record(self, t_start, t_decoded, t_converted, t_predicted, t_end, explain_s=0.0):
+        # LatencyHistogram.record inlined, this runs on every request
+        decode, convert, predict, encode = self.histograms
+        if explain_s:
+            self.explain.record(explain_s)
+            t_predicted += explain_s
+        seconds = t_decoded - t_start
+        decode.counts[bisect_left(LATENCY_BUCKETS, seconds)] += 1
+        decode.total += seconds
+        seconds = t_converted - t_decoded
+        convert.counts[bisect_left(LATENCY_BUCKETS, seconds)] += 1
+        convert.total += seconds
+        seconds = t_predicted - t_converted
+        predict.counts[bisect_left(LATENCY_BUCKETS, seconds)] += 1
+        predict.total += seconds
+        seconds = t_end - t_predicted
+        encode.counts[bisect_left(LATENCY_BUCKETS, seconds)] += 1
+        encode.total += seconds
+
+    def summary(self):
+        summary = {stage: histogram.summary() for stage, histogram in self.stages.items()}
+        summary['explain'] = self.explain.summary()
+        return summary
+
+    def dump(self):
+        tmp_path = self.dump_path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(self.snapshot(), f)
+        os.replace(tmp_path, self.dump_path)
+
+    def loop(self):
+        while True:
+            time.sleep(max(self.dump_interval_s, 1.0))
+            try:
+                self.dump()
+            except Exception as e:
+                # a full disk or a removed folder must not stop the service
+                self.dump_errors += 1
+                print('Latency dump failed: %s' % e)
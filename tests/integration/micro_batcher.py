@@ -0,0 +1,124 @@
+'''
+Micro-batching for score.py (SCORE_BATCHING=1): the rows of concurrent
+run() calls are scored with one predict call of the model they were sent to.
+'''
+import queue
+import threading
+import time
+import numpy as np
+
+class BatchRequest:
+    def __init__(self, np_data, serving):
+        self.np_data = np_data
+        self.serving = serving
+        self.enqueued = time.perf_counter()
+        self.done = threading.Event()
+        self.score = None
+        self.error = None
+
+class MicroBatcher:
+    '''
+    Gathers the rows of concurrent run() calls into one array, scores them
+    with a single predict call and hands every caller back its own slice.
+
+    A batch is closed when it holds max_batch_size rows, when max_wait_ms
+    has passed since its first request was queued, or as soon as every
+    caller currently waiting is already in it, so a lone request never
+    waits for company that is not coming. Requests for different model
+    versions are never mixed in one batch.
+    '''
+    def __init__(self, max_batch_size=256, max_wait_ms=2):
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self.requests = queue.Queue()
+        self.pending = None
+        self.lock = threading.Lock()
+        self.waiting = 0
+        self.batches = 0
+        self.batched_requests = 0
+        self.batched_rows = 0
+        self.queue_delay_total = 0.0
+        self.queue_delay_max = 0.0
+        self.worker = threading.Thread(target=self.loop, name='score-batcher', daemon=True)
+        self.worker.start()
+
+    def submit(self, np_data, serving):
+        request = BatchRequest(np_data, serving)
+        with self.lock:
+            self.waiting += 1
+        self.requests.put(request)
+        request.done.wait()
+        if request.error is not None:
+            raise request.error
+        return request.score
+
+    def collect(self):
+        if self.pending is not None:
+            batch, self.pending = [self.pending], None
+        else:
+            batch = [self.requests.get()]
+        rows = len(batch[0].np_data)
+        deadline = batch[0].enqueued + self.max_wait
+        while rows < self.max_batch_size and len(batch) < self.waiting:
+            timeout = deadline - time.perf_counter()
+            if timeout <= 0:
+                break
+            try:
+                request = self.requests.get(timeout=timeout)
+            except queue.Empty:
+                break
+            if request.serving is not batch[0].serving:
+                # first request for another model version starts the next batch
+                self.pending = request
+                break
+            batch.append(request)
+            rows += len(request.np_data)
+        return batch, rows
+
+    def loop(self):
+        while True:
+            batch, rows = self.collect()
+            started = time.perf_counter()
+            serving = batch[0].serving
+            try:
+                if len(batch) == 1:
+                    batch[0].score = serving.predict(batch[0].np_data)
+                else:
+                    score = serving.predict(np.concatenate([r.np_data for r in batch]))
+                    offset = 0
+                    for request in batch:
+                        request.score = score[offset:offset + len(request.np_data)]
+                        offset += len(request.np_data)
+            except Exception:
+                # one malformed request must not fail its neighbours
+                for request in batch:
+                    try:
+                        request.score = serving.predict(request.np_data)
+                    except Exception as e:
+                        request.error = e
+            delays = [started - r.enqueued for r in batch]
+            with self.lock:
+                self.waiting -= len(batch)
+                self.batches += 1
+                self.batched_requests += len(batch)
+                self.batched_rows += rows
+                self.queue_delay_total += sum(delays)
+                self.queue_delay_max = max(self.queue_delay_max, max(delays))
+            for request in batch:
+                request.done.set()
+
+    def metrics(self):
+        with self.lock:
+            batches = max(self.batches, 1)
+            requests = max(self.batched_requests, 1)
+            return {
+                'batches': self.batches,
+                'requests': self.batched_requests,
+                'rows': self.batched_rows,
+                'max_batch_size': self.max_batch_size,
+                'max_wait_ms': self.max_wait * 1000.0,
+                'mean_batch_fill_ratio': self.batched_rows / (batches * self.max_batch_size),
+                'mean_requests_per_batch': self.batched_requests / batches,
+                'mean_queue_delay_ms': self.queue_delay_total / requests * 1000.0,
+                'max_queue_delay_ms': self.queue_delay_max * 1000.0
+            }
@@ -0,0 +1,65 @@
+'''
+Hot reload of score.py's model (SCORE_RELOAD_INTERVAL_S > 0): a background
+thread polls for a new model version, or the model file replaced in place,
+and hands it to score.py to load, warm up and swap in.
+'''
+import os
+import threading
+import time
+
+def model_signature(model_path):
+    '''What identifies a loaded model file: its path, modification time and size.'''
+    stat = os.stat(model_path)
+    return (model_path, stat.st_mtime_ns, stat.st_size)
+
+class ModelWatcher:
+    '''
+    Background thread that polls for a new model and hot-swaps it in.
+    current() returns the serving model (with model_dir, model_path, version
+    and signature), reload(model_dir) loads, warms up and swaps in the model
+    of model_dir and returns it.
+    '''
+    def __init__(self, interval_s, current, reload, pointer=None):
+        self.interval_s = interval_s
+        self.current = current
+        self.reload = reload
+        self.pointer = pointer
+        self.reloads = 0
+        self.errors = 0
+        self.thread = threading.Thread(target=self.loop, name='score-model-watcher', daemon=True)
+        self.thread.start()
+
+    def target_dir(self, current):
+        '''Model folder that should be serving: the pointer file's content, or the newest version folder.'''
+        if self.pointer:
+            with open(self.pointer) as f:
+                return f.read().strip() or current.model_dir
+        # ./azureml-models/$MODEL_NAME/$VERSION: pick the highest numeric $VERSION
+        parent = os.path.dirname(os.path.normpath(current.model_dir))
+        versions = [name for name in os.listdir(parent)
+                    if name.isdigit() and os.path.isdir(os.path.join(parent, name))]
+        if not versions or not current.version.isdigit():
+            return current.model_dir
+        return os.path.join(parent, max(versions, key=int))
+
+    def check(self):
+        current = self.current()
+        model_dir = self.target_dir(current)
+        if os.path.normpath(model_dir) == os.path.normpath(current.model_dir):
+            # same folder: reload only when the model file was replaced in place
+            if model_signature(current.model_path) == current.signature:
+                return False
+        new_serving = self.reload(model_dir)
+        self.reloads += 1
+        print('Model %s loaded from %s' % (new_serving.version, model_dir))
+        return True
+
+    def loop(self):
+        while True:
+            time.sleep(self.interval_s)
+            try:
+                self.check()
+            except Exception as e:
+                # keep serving the current model, try again next interval
+                self.errors += 1
+                print('Model reload failed: %s' % e)
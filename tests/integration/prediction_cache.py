@@ -0,0 +1,85 @@
+'''
+Prediction cache of score.py (SCORE_CACHE_MAX_ENTRIES > 0): the scores of
+rows already seen, per loaded model.
+'''
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+import numpy as np
+
+class PredictionCache:
+    '''
+    Bounded LRU cache of row scores. A key is the blake2b digest of the
+    loaded model's cache_key and the row's float64 bytes, so a reloaded
+    model never hits entries of the one before, even from a folder of the
+    same name or a file replaced in place. Entries expire after ttl_s
+    seconds (0 = never) and the oldest entries are evicted beyond
+    max_entries or max_mb.
+    '''
+    # approximate bytes held per entry: 16 byte digest, float score, tuple and dict slot
+    ENTRY_BYTES = 200
+
+    def __init__(self, max_entries, ttl_s=0, max_mb=64):
+        self.max_entries = min(max_entries, int(max_mb * 1024 * 1024 / self.ENTRY_BYTES))
+        self.ttl_s = ttl_s
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def keys(self, np_data, model_key):
+        prefix = str(model_key).encode('utf-8') + b'\0'
+        rows = np.ascontiguousarray(np_data, dtype=np.float64)
+        return [hashlib.blake2b(prefix + row.tobytes(), digest_size=16).digest() for row in rows]
+
+    def lookup(self, keys, score):
+        '''Fill score with cached values, return the boolean mask of misses.'''
+        miss = np.ones(len(keys), dtype=bool)
+        now = time.monotonic()
+        with self.lock:
+            for i, key in enumerate(keys):
+                entry = self.entries.get(key)
+                if entry is None:
+                    continue
+                if self.ttl_s and entry[1] < now:
+                    del self.entries[key]
+                    self.expirations += 1
+                    continue
+                self.entries.move_to_end(key)
+                score[i] = entry[0]
+                miss[i] = False
+            misses = int(miss.sum())
+            self.misses += misses
+            self.hits += len(keys) - misses
+        return miss
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+    def store(self, keys, score):
+        expires = time.monotonic() + self.ttl_s
+        with self.lock:
+            for key, value in zip(keys, score.tolist()):
+                self.entries[key] = (value, expires)
+                self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+
+    def metrics(self):
+        with self.lock:
+            lookups = max(self.hits + self.misses, 1)
+            return {
+                'entries': len(self.entries),
+                'max_entries': self.max_entries,
+                'approx_mb': len(self.entries) * self.ENTRY_BYTES / (1024 * 1024),
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_ratio': self.hits / lookups,
+                'evictions': self.evictions,
+                'expirations': self.expirations
+            }
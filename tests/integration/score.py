@@ -1,46 +1,588 @@
-﻿import joblib
+﻿import itertools
 import json
 import numpy as np
 import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 
+# helper modules (input_schema, ...) live next to this entry script
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+from body_codec import CONTENT_TYPE_JSON, negotiate_content_type, decode_binary, encode_binary
+from iteration_planner import IterationPlanner
+from latency_stats import StageLatency
+from micro_batcher import MicroBatcher
+from model_watcher import ModelWatcher, model_signature
+from prediction_cache import PredictionCache
+
+# The Azure ML inference server passes run() the request body as text and
+# JSON-encodes what it returns, unless run() is decorated with @rawhttp: then
+# run() gets the AMLRequest (raw body bytes and headers) and returns an
+# AMLResponse, which is how binary bodies get in and out of the deployed
+# service. Elsewhere (76-LocalScoringServer.py, benchmarks) run() is called
+# with the body and content type directly.
+try:
+    from azureml.contrib.services.aml_request import rawhttp
+except ImportError:
+    def rawhttp(run):
+        return run
+
 DATE_FORMAT = '%Y-%m-%dT%H:%M:%S.%f'
 MODEL_ALGORITHM = 'light gradient boosting'
 MODEL_NAME = 'insurance-model.pkl'
+NATIVE_MODEL_NAME = 'insurance-model.txt'
+ITERATIONS_NAME = 'iterations.json'
+# dtypes.json (training/dtype_plan.py): the dtype of the array the model was
+# trained on. float32 when the compact column dtypes all fit it; requests are
+# converted to it so every value is rounded as it was in training.
+DTYPES_NAME = 'dtypes.json'
+
+# SCORE_PRELOAD=1 loads the model when this module is imported, so a server
+# that imports the entry script before forking its workers (gunicorn
+# --preload) shares the model pages copy-on-write instead of loading it once
+# per worker.
+PRELOAD = os.getenv('SCORE_PRELOAD', '0') == '1'
+
+# Binary responses carry as headers what a JSON response reports next to the
+# scores: X-Model-Version, X-Num-Iteration, X-Error-Rows / X-Warning-Rows (rows
+# with errors / warnings) and X-Errors / X-Warnings, the JSON 'errors' and
+# 'warnings' lists of the first HEADER_MAX_ROWS of those rows.
+HEADER_MAX_ROWS = 20
+
+# The model folder holds the pickle and LightGBM's native text file (both
+# written by train.py). The pickle loads faster and neither is shared between
+# workers (see bench_model_load.py), so it is the default; SCORE_MODEL_FORMAT=native
+# loads the text file instead.
+MODEL_FORMAT = os.getenv('SCORE_MODEL_FORMAT', 'pickle')
+
+# Micro-batching of concurrent requests is opt-in (SCORE_BATCHING=1).
+BATCHING_ENABLED = os.getenv('SCORE_BATCHING', '0') == '1'
+BATCH_MAX_SIZE = int(os.getenv('SCORE_BATCH_MAX_SIZE', '256'))
+BATCH_MAX_WAIT_MS = float(os.getenv('SCORE_BATCH_MAX_WAIT_MS', '2'))
+
+# Prediction cache keyed on row bytes + loaded model, off unless SCORE_CACHE_MAX_ENTRIES > 0.
+CACHE_MAX_ENTRIES = int(os.getenv('SCORE_CACHE_MAX_ENTRIES', '0'))
+CACHE_TTL_S = float(os.getenv('SCORE_CACHE_TTL_S', '0'))
+CACHE_MAX_MB = float(os.getenv('SCORE_CACHE_MAX_MB', '64'))
+
+# Per-stage latency histograms, on unless SCORE_LATENCY_STATS=0. A request
+# {"diagnostics": true} returns them; SCORE_LATENCY_DUMP_PATH also has a
+# background thread write them to a JSON file every
+# SCORE_LATENCY_DUMP_INTERVAL_S seconds (at least 1).
+LATENCY_STATS_ENABLED = os.getenv('SCORE_LATENCY_STATS', '1') == '1'
+LATENCY_DUMP_PATH = os.getenv('SCORE_LATENCY_DUMP_PATH')
+LATENCY_DUMP_INTERVAL_S = float(os.getenv('SCORE_LATENCY_DUMP_INTERVAL_S', '60'))
+
+# Hot reload: every SCORE_RELOAD_INTERVAL_S seconds (0 = off) look for a new
+# model, either the directory named in the SCORE_MODEL_POINTER file or the
+# highest numbered version next to AZUREML_MODEL_DIR, load and warm it on a
+# background thread and swap it in. In-flight requests finish on the model
+# they started with.
+RELOAD_INTERVAL_S = float(os.getenv('SCORE_RELOAD_INTERVAL_S', '0'))
+MODEL_POINTER = os.getenv('SCORE_MODEL_POINTER')
+
+# {"data": [...], "explain": true, "top_k": 5} fills local_feature_importances
+# with the top_k largest per-row feature contributions (pred_contrib, in raw
+# score units: log-odds for the binary model). Only the first
+# SCORE_EXPLAIN_MAX_ROWS rows of a request are explained (None for the rest)
+# and at most SCORE_EXPLAIN_CONCURRENCY explanations run at once, so
+# explanation traffic cannot occupy every worker thread.
+EXPLAIN_TOP_K = int(os.getenv('SCORE_EXPLAIN_TOP_K', '5'))
+EXPLAIN_MAX_ROWS = int(os.getenv('SCORE_EXPLAIN_MAX_ROWS', '100'))
+EXPLAIN_CONCURRENCY = int(os.getenv('SCORE_EXPLAIN_CONCURRENCY', '1'))
+explain_slots = threading.BoundedSemaphore(EXPLAIN_CONCURRENCY)
+
+# Only numpy is imported with this module. lightgbm is imported when the model
+# is loaded, joblib only for a pickled model and pyarrow only for an Arrow
+# body. lightgbm.compat imports pandas, scikit-learn, dask, datatable,
+# matplotlib and graphviz when they are installed (most of lightgbm's ~1 s
+# import time); predicting from NumPy arrays needs none of them, so with
+# SCORE_SLIM_IMPORTS=1 they are hidden while lightgbm is imported.
+SLIM_IMPORTS = os.getenv('SCORE_SLIM_IMPORTS', '1') == '1'
+LIGHTGBM_OPTIONAL_MODULES = ('pandas', 'sklearn', 'dask', 'datatable', 'matplotlib', 'graphviz')
+
+# Input validation against the schema.json train.py saves with the model
+# (input_schema.py), compiled when the model is loaded. Rows that fail get a
+# None score (NaN in binary responses) and an entry in the response's
+# 'errors'; the other rows are still scored. Without schema.json only the
+# shape and dtype are checked. Int and float values outside the training
+# range, widened by SCORE_SCHEMA_RANGE_MARGIN of its span, are scored and
+# listed in 'warnings'; SCORE_SCHEMA_RANGE_REJECT=1 rejects them instead.
+# inference-schema's decorators are not used: they convert every request
+# through its sample types in Python and reject the whole request on the
+# first mismatch, without per-row errors or binary bodies.
+SCHEMA_VALIDATION = os.getenv('SCORE_SCHEMA_VALIDATION', '1') == '1'
+SCHEMA_RANGE_MARGIN = float(os.getenv('SCORE_SCHEMA_RANGE_MARGIN', '0.5'))
+SCHEMA_RANGE_REJECT = os.getenv('SCORE_SCHEMA_RANGE_REJECT', '0') == '1'
+
+# Latency budget per request: the request's 'latency_budget_ms', else
+# SCORE_LATENCY_BUDGET_MS (0 = no budget). When evaluating every tree is not
+# expected to fit in what is left of the budget after decoding, the cut-off
+# with the best AUC in the model's iterations.json (written by train.py)
+# that fits is passed as num_iteration; the response reports it.
+LATENCY_BUDGET_MS = float(os.getenv('SCORE_LATENCY_BUDGET_MS', '0'))
+
+# Threads per worker: SCORE_NUM_THREADS, else the CPUs this container may use
+# (affinity mask capped by the cgroup CPU quota, i.e. cpu_cores of the ACI
+# deploy_configuration) split between the WORKER_COUNT workers of the Azure
+# ML inference server, so workers do not oversubscribe the cores. Requests
+# over SCORE_CHUNK_ROWS rows are scored in chunks of that size on a pool of
+# that many threads (one LightGBM thread per chunk).
+NUM_THREADS = int(os.getenv('SCORE_NUM_THREADS', '0'))
+WORKER_COUNT = int(os.getenv('WORKER_COUNT', '1'))
+CHUNK_ROWS = int(os.getenv('SCORE_CHUNK_ROWS', '8192'))
+
+# serving is the ServingModel new requests use; model and model_version
+# mirror it for callers that only need the booster.
+serving = None
+model = None
+model_version = None
+batcher = None
+cache = None
+latency = None
+watcher = None
+# LightGBM threads per predict call and the chunk pool, both set by init()
+num_threads = 0
+chunk_pool = None
+# init() and warm-up durations in ms
+startup = {}
+
+def diagnostics():
+    '''Everything the service knows about its own performance, as one JSON-serializable dict.'''
+    return {
+        'model_version': serving.version if serving is not None else None,
+        'latency': latency.summary() if latency is not None else None,
+        'latency_budget': serving.planner.metrics() if serving is not None else None,
+        'num_threads': num_threads,
+        'startup': startup,
+        'batching': batching_metrics(),
+        'cache': cache_metrics()
+    }
+
+def find_model_file(model_dir, file_name):
+    '''Path of file_name in model_dir, also when the model was registered as a folder.'''
+    path = os.path.join(model_dir, file_name)
+    if os.path.exists(path):
+        return path
+    for root, dirs, files in os.walk(model_dir):
+        if file_name in files:
+            return os.path.join(root, file_name)
+    return None
+
+def load_model(model_dir):
+    '''Load the booster from MODEL_FORMAT's file, or from the other one when the model folder lacks it.'''
+    names = (NATIVE_MODEL_NAME, MODEL_NAME) if MODEL_FORMAT == 'native' else (MODEL_NAME, NATIVE_MODEL_NAME)
+    for name in names:
+        model_path = find_model_file(model_dir, name)
+        if model_path is None:
+            continue
+        lightgbm = import_lightgbm()
+        if name == NATIVE_MODEL_NAME:
+            return lightgbm.Booster(model_file=model_path), model_path
+        # Deserialize the model file back into a sklearn model.
+        import joblib
+        return joblib.load(model_path), model_path
+    raise FileNotFoundError('no %s or %s in %s' % (MODEL_NAME, NATIVE_MODEL_NAME, model_dir))
+
+def import_lightgbm():
+    '''Import lightgbm, without its optional pandas / scikit-learn / ... integrations when SLIM_IMPORTS.'''
+    if 'lightgbm' in sys.modules or not SLIM_IMPORTS:
+        import lightgbm
+        return lightgbm
+    hidden = [name for name in LIGHTGBM_OPTIONAL_MODULES if name not in sys.modules]
+    # a None entry makes "import name" raise ImportError, which lightgbm.compat handles
+    for name in hidden:
+        sys.modules[name] = None
+    try:
+        import lightgbm
+    finally:
+        for name in hidden:
+            if name in sys.modules and sys.modules[name] is None:
+                del sys.modules[name]
+    return lightgbm
+
+def load_schema(model_dir, booster):
+    '''Compile the model's schema.json, or fall back to shape and dtype checks from the booster.'''
+    import input_schema
+    schema_path = find_model_file(model_dir, input_schema.SCHEMA_NAME)
+    if schema_path is None:
+        return input_schema.InputSchema.from_booster(booster)
+    return input_schema.InputSchema.from_file(schema_path, SCHEMA_RANGE_MARGIN, SCHEMA_RANGE_REJECT)
+
+def load_input_dtype(model_dir):
+    '''Dtype of the model's input arrays from dtypes.json, float64 for models trained before it.'''
+    dtypes_path = find_model_file(model_dir, DTYPES_NAME)
+    if dtypes_path is None:
+        return np.dtype(np.float64)
+    with open(dtypes_path) as f:
+        return np.dtype(json.load(f)['input_dtype'])
+
+# numbers every ServingModel a process loads, for prediction cache keys
+load_counter = itertools.count(1)
+
+class ServingModel:
+    '''One loaded model version: the booster, its input checks, iteration planner and the version name.'''
+    def __init__(self, model_dir):
+        self.model_dir = model_dir
+        self.booster, self.model_path = load_model(model_dir)
+        self.version = os.path.basename(os.path.normpath(model_dir))
+        # the version names a folder, not what was loaded from it
+        self.cache_key = '%s#%d' % (self.version, next(load_counter))
+        self.signature = model_signature(self.model_path)
+        self.feature_names = np.array(self.booster.feature_name(), dtype=object)
+        self.schema = load_schema(model_dir, self.booster) if SCHEMA_VALIDATION else None
+        self.input_dtype = load_input_dtype(model_dir)
+        # Booster.predict uses best_iteration when set (> 0), else every tree
+        num_iterations = self.booster.best_iteration
+        if num_iterations <= 0:
+            num_iterations = self.booster.current_iteration()
+        self.planner = IterationPlanner(load_iteration_table(model_dir), num_iterations)
+
+    def predict(self, np_data, num_iteration=None):
+        '''Score rows with the configured engine, using the first num_iteration trees when given.'''
+        t0 = time.perf_counter()
+        if len(np_data) <= CHUNK_ROWS:
+            score = self.predict_rows(np_data, num_iteration, num_threads)
+        else:
+            chunks = [np_data[i:i + CHUNK_ROWS] for i in range(0, len(np_data), CHUNK_ROWS)]
+            if chunk_pool is None:
+                score = np.concatenate([self.predict_rows(chunk, num_iteration, num_threads) for chunk in chunks])
+            else:
+                score = np.concatenate(list(chunk_pool.map(lambda chunk: self.predict_rows(chunk, num_iteration, 1),
+                                                           chunks)))
+        # only the model's own time and rows refine the cost model: cache
+        # lookups, batcher queueing and rejected rows never get here
+        if self.planner.tree_row_s is not None:
+            self.planner.observe(time.perf_counter() - t0, len(np_data), num_iteration or self.planner.num_iterations)
+        return score
+
+    def predict_rows(self, np_data, num_iteration, threads):
+        if threads:
+            return self.booster.predict(np_data, num_iteration=num_iteration, num_threads=threads)
+        return self.booster.predict(np_data, num_iteration=num_iteration)
+
+    def explain(self, np_data, top_k, num_iteration=None):
+        '''Top-k feature contributions of every row, largest absolute contribution first.'''
+        with explain_slots:
+            if num_threads:
+                contrib = self.booster.predict(np_data, pred_contrib=True, num_iteration=num_iteration,
+                                               num_threads=num_threads)
+            else:
+                contrib = self.booster.predict(np_data, pred_contrib=True, num_iteration=num_iteration)
+        return top_contributions(contrib, top_k, self.feature_names)
+
+    def warm_up(self):
+        '''Run one synthetic predict so the first real request does not pay one-time costs.'''
+        self.predict(np.zeros((1, self.booster.num_feature())))
+        if LATENCY_BUDGET_MS > 0:
+            self.planner.calibrate(self.predict, self.booster.num_feature())
+
+def cgroup_cpu_quota():
+    '''CPU limit of the container (cgroup v2 cpu.max or v1 CFS quota), None when unlimited.'''
+    try:
+        with open('/sys/fs/cgroup/cpu.max') as f:
+            quota, period = f.read().split()
+        return None if quota == 'max' else int(quota) / int(period)
+    except (OSError, ValueError):
+        pass
+    try:
+        with open('/sys/fs/cgroup/cpu/cpu.cfs_quota_us') as f:
+            quota = int(f.read())
+        with open('/sys/fs/cgroup/cpu/cpu.cfs_period_us') as f:
+            period = int(f.read())
+        return None if quota <= 0 else quota / period
+    except (OSError, ValueError):
+        return None
+
+def detect_cpu_count():
+    '''CPUs this process may run on: the affinity mask, capped by the cgroup quota.'''
+    try:
+        cpus = len(os.sched_getaffinity(0))
+    except AttributeError:
+        cpus = os.cpu_count() or 1
+    quota = cgroup_cpu_quota()
+    if quota is not None:
+        cpus = min(cpus, max(1, int(quota)))
+    return cpus
+
+def threads_per_worker():
+    if NUM_THREADS > 0:
+        return NUM_THREADS
+    return max(1, detect_cpu_count() // max(1, WORKER_COUNT))
+
+def load_iteration_table(model_dir):
+    '''AUC at each iteration cut-off, measured by train.py, or None for older models.'''
+    table_path = find_model_file(model_dir, ITERATIONS_NAME)
+    if table_path is None:
+        return None
+    with open(table_path) as f:
+        return json.load(f)
+
+def top_contributions(contrib, top_k, feature_names):
+    '''
+    Reduce a pred_contrib matrix (one column per feature plus the bias
+    column) to [{'bias': b, 'top_features': [[name, contribution], ...]}]
+    per row. argpartition keeps the selection O(features) per row and only
+    the k selected values are sorted.
+    '''
+    values = contrib[:, :-1]
+    k = max(1, min(top_k, values.shape[1]))
+    top = np.argpartition(-np.abs(values), k - 1, axis=1)[:, :k]
+    top_values = np.take_along_axis(values, top, axis=1)
+    order = np.argsort(-np.abs(top_values), axis=1, kind='stable')
+    top = np.take_along_axis(top, order, axis=1)
+    top_values = np.take_along_axis(top_values, order, axis=1)
+    names = feature_names[top].tolist()
+    return [{'bias': bias, 'top_features': [list(pair) for pair in zip(row_names, row_values)]}
+            for bias, row_names, row_values in zip(contrib[:, -1].tolist(), names, top_values.tolist())]
+
+def swap(new_serving):
+    '''
+    Make new_serving the model for new requests. run() reads only serving,
+    once per request, so replacing that reference is what switches it over;
+    model and model_version are updated right after it. The old model's
+    cached scores are dropped.
+    '''
+    global serving, model, model_version
+    serving = new_serving
+    model = new_serving.booster
+    model_version = new_serving.version
+    if cache is not None:
+        cache.clear()
+
+def load(model_dir):
+    swap(ServingModel(model_dir))
+
+def reload(model_dir):
+    '''Load and warm up the model of model_dir before swapping it in, for the ModelWatcher.'''
+    new_serving = ServingModel(model_dir)
+    new_serving.warm_up()
+    swap(new_serving)
+    return new_serving
 
 def init():
-    global model
+    global batcher, cache, latency, watcher, num_threads, chunk_pool
     # AZUREML_MODEL_DIR is an environment variable created during deployment.
     # It is the path to the model folder (./azureml-models/$MODEL_NAME/$VERSION)
     # For multiple models, it points to the folder containing all deployed models (./azureml-models)
-    model_path = os.path.join(os.getenv('AZUREML_MODEL_DIR'), MODEL_NAME)
-    # Deserialize the model file back into a sklearn model.
-    model = joblib.load(model_path)
+    t_init = time.perf_counter()
+    if serving is None:
+        load(os.getenv('AZUREML_MODEL_DIR'))
+    # threads do not survive a fork, so these are always created per worker
+    num_threads = threads_per_worker()
+    if num_threads > 1 and chunk_pool is None:
+        chunk_pool = ThreadPoolExecutor(max_workers=num_threads, thread_name_prefix='score-chunk')
+    # the first predict of a process pays one-time costs (OpenMP threads,
+    # lazy allocations); pay them here instead of in the first request
+    t_warm_up = time.perf_counter()
+    serving.warm_up()
+    startup['warm_up_ms'] = (time.perf_counter() - t_warm_up) * 1000.0
+    if BATCHING_ENABLED and batcher is None:
+        batcher = MicroBatcher(BATCH_MAX_SIZE, BATCH_MAX_WAIT_MS)
+    if CACHE_MAX_ENTRIES > 0 and cache is None:
+        cache = PredictionCache(CACHE_MAX_ENTRIES, CACHE_TTL_S, CACHE_MAX_MB)
+    if LATENCY_STATS_ENABLED and latency is None:
+        latency = StageLatency(LATENCY_DUMP_PATH, LATENCY_DUMP_INTERVAL_S, diagnostics)
+    if RELOAD_INTERVAL_S > 0 and watcher is None:
+        watcher = ModelWatcher(RELOAD_INTERVAL_S, lambda: serving, reload, MODEL_POINTER)
+    startup['init_ms'] = (time.perf_counter() - t_init) * 1000.0
+
+def predict_uncached(np_data, serving, num_iteration=None):
+    '''Score rows, going through the micro-batcher for small requests when it is enabled.'''
+    if batcher is not None and num_iteration is None and len(np_data) < batcher.max_batch_size:
+        return batcher.submit(np_data, serving)
+    return serving.predict(np_data, num_iteration)
+
+def predict(np_data, serving, num_iteration=None):
+    '''Score rows with serving, sending only the prediction cache misses to the model.'''
+    if cache is None:
+        return predict_uncached(np_data, serving, num_iteration)
+    model_key = serving.cache_key if num_iteration is None else '%s@%d' % (serving.cache_key, num_iteration)
+    keys = cache.keys(np_data, model_key)
+    score = np.empty(len(keys), dtype=np.float64)
+    miss = cache.lookup(keys, score)
+    if miss.any():
+        miss_score = predict_uncached(np_data[miss], serving, num_iteration)
+        score[miss] = miss_score
+        cache.store([key for key, m in zip(keys, miss) if m], miss_score)
+    return score
+
+def validate(data, serving):
+    '''(np_data, valid row mask or None when every row is valid, row errors, row warnings) of a request.'''
+    if serving.schema is None:
+        return np.asarray(data, dtype=serving.input_dtype), None, [], []
+    np_data, valid, errors, warnings = serving.schema.validate(data)
+    # checked at full precision, scored in the training dtype
+    return np_data.astype(serving.input_dtype, copy=False), (valid if errors else None), errors, warnings
+
+def predict_valid(np_data, valid, serving, num_iteration=None):
+    '''Predictions of the valid rows, NaN for the rows that failed validation.'''
+    if valid is None:
+        return predict(np_data, serving, num_iteration)
+    score = np.full(len(np_data), np.nan)
+    if valid.any():
+        score[valid] = predict(np_data[valid], serving, num_iteration)
+    return score
+
+def plan_iterations(serving, rows, budget_ms, t_start):
+    '''num_iteration that fits what is left of budget_ms (None: every tree, or no budget).'''
+    if not budget_ms or budget_ms <= 0:
+        return None
+    if serving.planner.tree_row_s is None:
+        serving.planner.calibrate(serving.predict, serving.booster.num_feature())
+    return serving.planner.choose(rows, budget_ms / 1000.0 - (time.perf_counter() - t_start))
 
-def run(data):
+def cache_metrics():
+    '''Hit, miss and eviction counters of the prediction cache, None when caching is off.'''
+    return cache.metrics() if cache is not None else None
+
+def batching_metrics():
+    '''Batch-fill ratio and queue delay of the micro-batcher, None when batching is off.'''
+    return batcher.metrics() if batcher is not None else None
+
+def run_http(request):
+    '''
+    Serve an AMLRequest under @rawhttp with the contract of the plain
+    endpoint: a JSON body gets the string run() returns JSON-encoded (as the
+    inference server encodes it), a binary body gets bytes in its format.
+    '''
+    from azureml.contrib.services.aml_response import AMLResponse
+    if request.method != 'POST':
+        return AMLResponse('POST a JSON or binary body to score', 405)
+    payload, headers = respond(request.get_data(cache=False), request.headers.get('Content-Type'))
+    return AMLResponse(payload, 200, headers)
+
+def respond(body, content_type=None):
+    '''
+    (payload, headers) of the HTTP response to a request body, for run_http
+    and 76-LocalScoringServer.py: a binary body gets its predictions with the
+    headers of handle_binary(), anything else the JSON-encoded result of handle().
+    '''
+    t_start = time.perf_counter()
+    current = serving
+    content_type = negotiate_content_type(body, content_type)
+    if content_type == CONTENT_TYPE_JSON:
+        # a JSON body is decoded by handle(), so a body that is not UTF-8 gets its error message
+        result = handle(body, content_type)
+    else:
+        try:
+            return handle_binary(body, content_type, current, t_start)
+        except Exception as e:
+            result = str(e)
+    return json.dumps(result), {'Content-Type': CONTENT_TYPE_JSON}
+
+@rawhttp
+def run(data, content_type=None):
+    '''
+    Entry point of the inference server. data is the AMLRequest when the
+    server honours @rawhttp (see run_http), otherwise the request body, with
+    content_type when the caller knows it; see handle() for the contract.
+    '''
+    if hasattr(data, 'get_data') and hasattr(data, 'headers'):
+        return run_http(data)
+    return handle(data, content_type)
+
+def handle(data, content_type=None):
     '''
     data: is a input json that requests to API endpoint.
           data include: "data" list of float that request to API.
           for example:
             {'data': [[0,1,8,1,0,0,1,0,0,0,0,0,0,0,12,1,0,0,0.5,0.3,0.610327781,7,1,-1,0,-1,1,1,1,2,1,65,1,0.316227766,0.669556409,0.352136337,3.464101615,0.1,0.8,0.6,1,1,6,3,6,2,9,1,1,1,12,0,1,1,0,0,1],[4,2,5,1,0,0,0,0,1,0,0,0,0,0,5,1,0,0,0.9,0.5,0.771362431,4,1,-1,0,0,11,1,1,0,1,103,1,0.316227766,0.60632002,0.358329457,2.828427125,0.4,0.5,0.4,3,3,8,4,10,2,7,2,0,3,10,0,0,1,1,0,1]]}
+          data can also be a binary body (bytes) in one of body_codec.BINARY_CONTENT_TYPES:
+          a raw tensor, an .npy file or an Arrow IPC stream/file. The format
+          is taken from content_type or sniffed from the magic bytes, and
+          the response is bytes encoded in the same format (respond() also
+          returns the headers of handle_binary()).
+          {'diagnostics': true} returns latency, batching and cache metrics.
+          Rows failing the input schema are not scored: their score is None
+          and 'errors' lists what is wrong with them. Values outside the
+          training range are scored and listed in 'warnings'.
+          'explain': true (optionally with 'top_k') fills local_feature_importances
+          with the top_k feature contributions of each of the first
+          EXPLAIN_MAX_ROWS rows, see EXPLAIN_TOP_K.
+          'latency_budget_ms' evaluates fewer trees when all of them would
+          not fit in the budget; 'num_iteration' reports how many were used.
     '''
     try:
+        t_start = time.perf_counter()
+        # the whole request is served by the model current at its start
+        current = serving
+        content_type = negotiate_content_type(data, content_type)
+        if content_type != CONTENT_TYPE_JSON:
+            return handle_binary(data, content_type, current, t_start)[0]
+
         start_time = datetime.strftime(datetime.now(), DATE_FORMAT)
         test = json.loads(data)
+        if test.get('diagnostics'):
+            return json.dumps(diagnostics())
+        t_decoded = time.perf_counter()
         input_data = test['data']
-        np_data = np.array(input_data)
-        score = model.predict(np_data).tolist()
+        np_data, valid, errors, warnings = validate(input_data, current)
+        t_converted = time.perf_counter()
+        budget_ms = test.get('latency_budget_ms', LATENCY_BUDGET_MS)
+        num_iteration = plan_iterations(current, len(np_data), budget_ms, t_start)
+        score = predict_valid(np_data, valid, current, num_iteration)
+        t_predicted = time.perf_counter()
+        importances, explain_s = None, 0.0
+        if test.get('explain'):
+            importances = current.explain(np_data[:EXPLAIN_MAX_ROWS], int(test.get('top_k', EXPLAIN_TOP_K)),
+                                          num_iteration)
+            importances += [None] * (len(np_data) - len(importances))
+            explain_s = time.perf_counter() - t_predicted
+        score = score.tolist()
+        for error in errors:
+            score[error['row']] = None
+            if importances is not None:
+                importances[error['row']] = None
         end_time = datetime.strftime(datetime.now(), DATE_FORMAT)
         # You can return any JSON-serializable object.
         result = {
                 'model_algorithm': MODEL_ALGORITHM,
-                'local_feature_importances': None,
+                'model_version': current.version,
+                'local_feature_importances': importances,
                 'prediction_score': score,
+                'num_iteration': num_iteration or current.planner.num_iterations,
+                'errors': errors,
+                'warnings': warnings,
                 'start_time': start_time,
                 'end_time': end_time
             }
-        return json.dumps(result)
+        response = json.dumps(result)
+        if latency is not None:
+            latency.record(t_start, t_decoded, t_converted, t_predicted, time.perf_counter(), explain_s)
+        return response
 
     except Exception as e:
         error = str(e)
-        return error
\ No newline at end of file
+        return error
+
+def handle_binary(data, content_type, current, t_start):
+    '''
+    Score a binary body with current: (the predictions encoded in content_type,
+    response headers with the model version, num_iteration, errors and warnings).
+    '''
+    np_data, valid, errors, warnings = validate(decode_binary(data, content_type), current)
+    t_decoded = t_converted = time.perf_counter()
+    num_iteration = plan_iterations(current, len(np_data), LATENCY_BUDGET_MS, t_start)
+    score = predict_valid(np_data, valid, current, num_iteration)
+    t_predicted = time.perf_counter()
+    response = encode_binary(score, content_type)
+    headers = {
+        'Content-Type': content_type,
+        'X-Model-Version': current.version,
+        'X-Num-Iteration': str(num_iteration or current.planner.num_iterations),
+        'X-Error-Rows': str(len(errors)),
+        'X-Warning-Rows': str(len(warnings))
+    }
+    if errors:
+        headers['X-Errors'] = json.dumps(errors[:HEADER_MAX_ROWS])
+    if warnings:
+        headers['X-Warnings'] = json.dumps(warnings[:HEADER_MAX_ROWS])
+    if latency is not None:
+        latency.record(t_start, t_decoded, t_converted, t_predicted, time.perf_counter())
+    return response, headers
+
+if PRELOAD and os.getenv('AZUREML_MODEL_DIR'):
+    load(os.getenv('AZUREML_MODEL_DIR'))
@@ -0,0 +1,94 @@
+'''
+Binary request and response bodies of score.py (tests/integration/body_codec.py):
+every format decodes to the array it was made from, and the format is found
+from the content type or, failing that, the body's magic bytes.
+
+    python -m pytest tests/unit
+'''
+import io
+import os
+import sys
+import numpy as np
+import pyarrow as pa
+import pytest
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.append(os.path.join(REPO_DIR, 'tests', 'integration'))
+import body_codec
+from body_codec import (BINARY_CONTENT_TYPES, CONTENT_TYPE_ARROW, CONTENT_TYPE_ARROW_FILE, CONTENT_TYPE_JSON,
+                        CONTENT_TYPE_NPY, CONTENT_TYPE_RAW, RAW_HEADER, RAW_MAGIC)
+
+ROWS = np.random.default_rng(0).random((5, 3))
+
+def raw_body(rows, dtype='<f8'):
+    rows = np.ascontiguousarray(rows, dtype=dtype)
+    return RAW_HEADER.pack(RAW_MAGIC, rows.shape[0], rows.shape[1], rows.itemsize) + rows.tobytes()
+
+def npy_body(rows):
+    out = io.BytesIO()
+    np.save(out, rows)
+    return out.getvalue()
+
+def arrow_body(table, content_type):
+    out = pa.BufferOutputStream()
+    if content_type == CONTENT_TYPE_ARROW_FILE:
+        writer = pa.ipc.new_file(out, table.schema)
+    else:
+        writer = pa.ipc.new_stream(out, table.schema)
+    writer.write_table(table)
+    writer.close()
+    return out.getvalue().to_pybytes()
+
+def feature_table(rows):
+    return pa.table({'f%d' % i: rows[:, i] for i in range(rows.shape[1])})
+
+def list_table(rows):
+    values = pa.array(rows.ravel())
+    return pa.table({'rows': pa.FixedSizeListArray.from_arrays(values, rows.shape[1])})
+
+BODIES = {
+    'raw float64': (CONTENT_TYPE_RAW, lambda: raw_body(ROWS)),
+    'raw float32': (CONTENT_TYPE_RAW, lambda: raw_body(ROWS, '<f4')),
+    'npy': (CONTENT_TYPE_NPY, lambda: npy_body(ROWS)),
+    'npy fortran order': (CONTENT_TYPE_NPY, lambda: npy_body(np.asfortranarray(ROWS))),
+    'arrow stream': (CONTENT_TYPE_ARROW, lambda: arrow_body(feature_table(ROWS), CONTENT_TYPE_ARROW)),
+    'arrow file': (CONTENT_TYPE_ARROW_FILE, lambda: arrow_body(feature_table(ROWS), CONTENT_TYPE_ARROW_FILE)),
+    'arrow fixed size list': (CONTENT_TYPE_ARROW, lambda: arrow_body(list_table(ROWS), CONTENT_TYPE_ARROW))
+}
+
+@pytest.mark.parametrize('name', sorted(BODIES))
+@pytest.mark.parametrize('header', [True, False])
+def test_decode(name, header):
+    content_type, make_body = BODIES[name]
+    body = make_body()
+    negotiated = body_codec.negotiate_content_type(body, content_type if header else None)
+    assert negotiated == content_type
+    tolerance = 1e-7 if name == 'raw float32' else 0
+    np.testing.assert_allclose(body_codec.decode_binary(body, negotiated), ROWS, rtol=tolerance)
+
+@pytest.mark.parametrize('content_type', BINARY_CONTENT_TYPES)
+def test_encode_round_trip(content_type):
+    score = np.array([0.1, 0.5, np.nan])
+    encoded = body_codec.encode_binary(score, content_type)
+    assert body_codec.negotiate_content_type(encoded) == content_type
+    decoded = body_codec.decode_binary(encoded, content_type)
+    np.testing.assert_array_equal(decoded.reshape(-1), score)
+
+@pytest.mark.parametrize('content_type', ['application/octet-stream', 'text/plain', CONTENT_TYPE_JSON])
+def test_other_content_types_fall_back_to_the_magic_bytes(content_type):
+    assert body_codec.negotiate_content_type(raw_body(ROWS), content_type) == CONTENT_TYPE_RAW
+    assert body_codec.negotiate_content_type(npy_body(ROWS), content_type + '; charset=utf-8') == CONTENT_TYPE_NPY
+    assert body_codec.negotiate_content_type(b'{"data": [[0]]}', content_type) == CONTENT_TYPE_JSON
+
+def test_strings_are_json():
+    assert body_codec.negotiate_content_type('K2TN') == CONTENT_TYPE_JSON
+    assert body_codec.negotiate_content_type('{"data": [[0]]}', 'application/octet-stream') == CONTENT_TYPE_JSON
+
+def test_invalid_raw_header():
+    with pytest.raises(ValueError):
+        body_codec.decode_raw(RAW_HEADER.pack(b'XXXX', 1, 1, 8) + bytes(8))
+
+def test_undecodable_body_gets_an_error_message():
+    import score
+    result = score.run(b'\xff\xfe\x00not a tensor', 'application/octet-stream')
+    assert isinstance(result, str)
@@ -0,0 +1,61 @@
+'''
+Cross-validation of training/cross_validation.py: the fold models averaged
+into one Booster predict the mean raw score of the folds, and every row gets
+exactly one out-of-fold prediction.
+
+    python -m pytest tests/unit
+'''
+import os
+import sys
+import numpy as np
+import pandas as pd
+import pytest
+import lightgbm
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.append(os.path.join(REPO_DIR, 'training'))
+from cross_validation import average_models, cross_validate
+
+PARAMS = {"objective": "binary", "num_leaves": 15, "min_data": 20, "seed": 0, "verbose": -1}
+
+@pytest.fixture(scope='module')
+def insurance():
+    df = pd.read_csv(os.path.join(REPO_DIR, 'data', 'insurance.csv'))
+    return df.drop(['id', 'target'], axis=1).to_numpy(dtype=np.float64), df['target'].to_numpy()
+
+def fold_models(X, y, rounds, categorical=False):
+    params = dict(PARAMS)
+    if categorical:
+        params['categorical_column'] = [1, 3]
+    rng = np.random.default_rng(0)
+    models = []
+    for num_boost_round in rounds:
+        rows = rng.random(len(y)) < 0.8
+        models.append(lightgbm.train(params, lightgbm.Dataset(X[rows], label=y[rows]),
+                                     num_boost_round=num_boost_round))
+    return models
+
+@pytest.mark.parametrize('categorical', [False, True])
+def test_average_predicts_the_mean_raw_score(insurance, categorical):
+    X, y = insurance
+    models = fold_models(X, y, [12, 8, 10], categorical)
+    merged = average_models([model.model_to_string() for model in models])
+    assert merged.num_trees() == 30
+    expected = np.mean([model.predict(X, raw_score=True) for model in models], axis=0)
+    np.testing.assert_allclose(merged.predict(X, raw_score=True), expected, rtol=1e-9, atol=1e-12)
+
+def test_first_trees_average_the_first_iterations(insurance):
+    X, y = insurance
+    models = fold_models(X, y, [10, 10, 10])
+    merged = average_models([model.model_to_string() for model in models])
+    expected = np.mean([model.predict(X, raw_score=True, num_iteration=4) for model in models], axis=0)
+    np.testing.assert_allclose(merged.predict(X, raw_score=True, num_iteration=12), expected, rtol=1e-9, atol=1e-12)
+
+def test_cross_validate(insurance):
+    X, y = insurance
+    config = {'n_folds': 3, 'max_workers': 2, 'num_boost_round': 20, 'early_stopping_rounds': 5, 'ensemble': True}
+    result = cross_validate(X, y, PARAMS, config, log=lambda *args: None)
+    assert not np.isnan(result['oof_prediction']).any()
+    assert sorted(fold['fold'] for fold in result['folds']) == [0, 1, 2]
+    assert sum(fold['rows'] for fold in result['folds']) == len(y)
+    assert result['model'].num_trees() == sum(fold['best_iteration'] for fold in result['folds'])
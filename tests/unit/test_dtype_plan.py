@@ -0,0 +1,70 @@
+'''
+Compact dtype planning of training/dtype_plan.py: the narrowest dtype that
+holds a column, widened instead of truncated when new data no longer fits.
+
+    python -m pytest tests/unit
+'''
+import os
+import sys
+import numpy as np
+import pandas as pd
+import pytest
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.append(os.path.join(REPO_DIR, 'training'))
+from dtype_plan import DtypeStats, apply_dtypes, column_dtype, input_dtype, plan_dtypes
+
+def frame():
+    return pd.DataFrame({'id': [1, 2, 3, 4],
+                         'ps_ind_06_bin': [0, 1, 1, 0],
+                         'ps_car_01_cat': [-1, 3, 11, 7],
+                         'ps_car_11': [0, 300, 2, 3],
+                         'ps_car_12': [0.1, 0.3162, 0.4, np.nan],
+                         'ps_reg_03': [1e39, 0.5, 0.6, 0.7],
+                         'target': [0, 1, 0, 0]})
+
+def test_plan():
+    assert plan_dtypes(frame(), exclude=('id', 'target')) == {
+        'ps_ind_06_bin': 'int8', 'ps_car_01_cat': 'int8', 'ps_car_11': 'int16',
+        'ps_car_12': 'float32', 'ps_reg_03': 'float64'}
+
+@pytest.mark.parametrize('values, dtype', [
+    ([0, 1, np.nan], 'float32'),
+    ([0, 2 ** 24 + 1, np.nan], 'float64'),
+    ([0, 2 ** 40], 'int64'),
+    ([np.nan, np.nan], 'float32')
+])
+def test_column_dtype(values, dtype):
+    assert column_dtype('ps_ind_01', np.array(values, dtype=np.float64)) == dtype
+
+def test_a_bin_column_that_is_not_integral_stays_float64():
+    assert column_dtype('ps_ind_06_bin', [0, 0.5, 1]) == 'float64'
+
+def test_chunked_stats_plan_like_the_whole_frame():
+    df = frame()
+    stats = DtypeStats(exclude=('id', 'target'))
+    for start in range(0, len(df), 2):
+        stats.update(df.iloc[start:start + 2])
+    assert stats.plan() == plan_dtypes(df, exclude=('id', 'target'))
+
+def test_apply_keeps_the_values():
+    df = frame()
+    compact = apply_dtypes(df, plan_dtypes(df, exclude=('id', 'target')))
+    assert compact['ps_car_01_cat'].dtype == np.int8 and compact['ps_car_12'].dtype == np.float32
+    assert compact['ps_car_01_cat'].tolist() == df['ps_car_01_cat'].tolist()
+
+@pytest.mark.parametrize('new_values, dtype', [
+    ([-1, 3, 200, 7], 'int16'),
+    ([-1, 3, np.nan, 7], 'float32')
+])
+def test_values_that_no_longer_fit_are_widened(new_values, dtype):
+    plan = plan_dtypes(frame(), exclude=('id', 'target'))
+    new = frame().assign(ps_car_01_cat=new_values)
+    widened = apply_dtypes(new, plan)
+    assert widened['ps_car_01_cat'].dtype == dtype
+    np.testing.assert_array_equal(widened['ps_car_01_cat'].to_numpy(dtype=np.float64),
+                                  np.array(new_values, dtype=np.float64))
+
+def test_input_dtype():
+    assert input_dtype(['int8', 'int16', 'float32']) == 'float32'
+    assert input_dtype(['int8', 'float64']) == 'float64'
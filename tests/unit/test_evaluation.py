@@ -0,0 +1,64 @@
+'''
+The single-sort threshold sweep of training/evaluation.py against
+scikit-learn: AUC, the metrics at a threshold, the F1-optimal threshold,
+with and without tied scores.
+
+    python -m pytest tests/unit
+'''
+import os
+import sys
+import warnings
+import numpy as np
+import pytest
+from sklearn.metrics import precision_recall_curve, precision_recall_fscore_support, roc_auc_score
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.append(os.path.join(REPO_DIR, 'training'))
+from evaluation import evaluate, roc_auc
+
+def scores(rows=2000, decimals=None, seed=0):
+    rng = np.random.default_rng(seed)
+    y_true = (rng.random(rows) < 0.1).astype(np.int64)
+    y_score = np.clip(0.3 * y_true + rng.random(rows) * 0.7, 0, 1)
+    if decimals is not None:
+        # many rows share a score
+        y_score = np.round(y_score, decimals)
+    return y_true, y_score
+
+def sklearn_metrics(y_true, y_pred):
+    with warnings.catch_warnings():
+        # zero division warnings, sklearn returns 0 as evaluate() does
+        warnings.simplefilter('ignore')
+        precision, recall, f1, _ = precision_recall_fscore_support(y_true, y_pred, average='binary')
+        weighted = precision_recall_fscore_support(y_true, y_pred, average='weighted')[:3]
+    return {'precision': precision, 'recall': recall, 'f1': f1, 'weighted_precision': weighted[0],
+            'weighted_recall': weighted[1], 'weighted_f1': weighted[2]}
+
+@pytest.mark.parametrize('decimals', [None, 2, 1])
+def test_matches_sklearn(decimals):
+    y_true, y_score = scores(decimals=decimals)
+    result = evaluate(y_true, y_score, threshold=0.5, n_bootstrap=0)
+    assert result['auc'] == pytest.approx(roc_auc_score(y_true, y_score), abs=1e-12)
+    assert roc_auc(y_true, y_score) == pytest.approx(result['auc'], abs=1e-12)
+    for name, threshold in (('at_threshold', 0.5), ('at_optimal', result['optimal_threshold'])):
+        expected = sklearn_metrics(y_true, (y_score >= threshold).astype(np.int64))
+        for metric, value in expected.items():
+            assert result[name][metric] == pytest.approx(value, abs=1e-12), (name, metric)
+    precision, recall, _ = precision_recall_curve(y_true, y_score)
+    with np.errstate(invalid='ignore'):
+        best_f1 = np.nanmax(2 * precision * recall / (precision + recall))
+    assert result['at_optimal']['f1'] == pytest.approx(best_f1, abs=1e-12)
+
+def test_threshold_above_every_score():
+    y_true, y_score = scores()
+    result = evaluate(y_true, y_score, threshold=2.0, n_bootstrap=0)
+    assert result['at_threshold']['precision'] == 0 and result['at_threshold']['recall'] == 0
+
+def test_bootstrap_intervals():
+    y_true, y_score = scores()
+    result = evaluate(y_true, y_score, n_bootstrap=100, seed=1)
+    low, high = result['ci']['auc']
+    assert low < result['auc'] < high
+    low, high = result['ci']['at_optimal.f1']
+    assert low <= result['at_optimal']['f1'] <= high
+    assert evaluate(y_true, y_score, n_bootstrap=100, seed=1)['ci'] == result['ci']
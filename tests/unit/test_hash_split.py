@@ -0,0 +1,60 @@
+'''
+The streaming hash split (training/hash_split.py): a row's side depends on
+its id only, so it survives reordering and appended data.
+
+    python -m pytest tests/unit
+'''
+import os
+import sys
+import numpy as np
+import pandas as pd
+import pytest
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.append(os.path.join(REPO_DIR, 'training'))
+from hash_split import hash_fraction, hash_split
+
+def frame(rows, seed=0):
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({'id': np.arange(rows), 'target': (rng.random(rows) < 0.04).astype(np.int64),
+                         'ps_ind_01': rng.integers(0, 8, rows), 'ps_reg_01': rng.random(rows)})
+
+def split_ids(df, folder, config=None):
+    os.makedirs(folder, exist_ok=True)
+    path = os.path.join(folder, 'input.csv')
+    df.to_csv(path, index=False)
+    summary = hash_split(path, os.path.join(folder, 'train'), os.path.join(folder, 'test'), 'target', config,
+                         log=lambda *args: None)
+    test = set(pd.read_parquet(os.path.join(folder, 'test', 'processed.parquet'))['id'])
+    train = set(pd.read_parquet(os.path.join(folder, 'train', 'processed.parquet'))['id'])
+    return train, test, summary
+
+def test_hash_fraction_depends_on_id_and_salt_only():
+    ids = np.arange(10000)
+    fraction = hash_fraction(ids)
+    assert ((fraction >= 0) & (fraction < 1)).all()
+    assert np.array_equal(hash_fraction(ids[::-1]), fraction[::-1])
+    assert np.array_equal(hash_fraction(ids.astype(str)), hash_fraction(ids.astype(str)))
+    assert not np.array_equal(hash_fraction(ids, salt=1), fraction)
+    assert abs((fraction < 0.2).mean() - 0.2) < 0.02
+
+def test_split_is_complete_and_near_test_size(tmp_path):
+    df = frame(20000)
+    train, test, summary = split_ids(df, str(tmp_path))
+    assert not train & test and train | test == set(df['id'])
+    assert summary['test_rows'] == len(test)
+    assert abs(len(test) / len(df) - 0.2) < 0.02
+
+def test_rows_keep_their_side_when_data_is_appended(tmp_path):
+    grown = frame(22000)
+    before = grown.iloc[:20000]
+    _, test_before, _ = split_ids(before, str(tmp_path / 'before'))
+    _, test_after, _ = split_ids(grown.sample(frac=1, random_state=0), str(tmp_path / 'after'))
+    assert test_after & set(before['id']) == test_before
+
+@pytest.mark.parametrize('stratify', [False, True])
+def test_every_class_gets_its_share(tmp_path, stratify):
+    summary = split_ids(frame(20000), str(tmp_path), {'stratify': stratify})[2]
+    for counts in summary['classes'].values():
+        share = counts['test_rows'] / counts['rows']
+        assert abs(share - 0.2) < (0.01 if stratify else 0.06)
@@ -0,0 +1,77 @@
+'''
+Per-row input validation of score.py (tests/integration/input_schema.py):
+rows that break a feature's kind or NaN policy are rejected with the reason,
+values outside the training range are only reported, and the other rows pass.
+
+    python -m pytest tests/unit
+'''
+import os
+import sys
+import numpy as np
+import pytest
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.append(os.path.join(REPO_DIR, 'tests', 'integration'))
+from input_schema import InputSchema
+
+SCHEMA = {'features': [
+    {'name': 'ps_ind_06_bin', 'kind': 'bin', 'min': 0, 'max': 1, 'allow_nan': False},
+    {'name': 'ps_ind_02_cat', 'kind': 'cat', 'min': -1, 'max': 4, 'allow_nan': False},
+    {'name': 'ps_ind_01', 'kind': 'int', 'min': 0, 'max': 10, 'allow_nan': False},
+    {'name': 'ps_reg_03', 'kind': 'float', 'min': 0.0, 'max': 1.0, 'allow_nan': True}
+]}
+VALID_ROW = [1, 2, 5, 0.5]
+
+def validate(rows, reject_range=False):
+    return InputSchema.from_dict(SCHEMA, range_margin=0.5, reject_range=reject_range).validate(rows)
+
+def reasons(report):
+    return [(entry['feature'], entry['reason']) for entry in report]
+
+def test_valid_rows_pass():
+    # unseen category codes and NaN where allowed are fine
+    X, valid, errors, warnings = validate([VALID_ROW, [0, 250, 0, None], [1, -1, 10, 1.0]])
+    assert valid.all() and errors == [] and warnings == []
+    assert X.shape == (3, 4) and np.isnan(X[1, 3])
+
+@pytest.mark.parametrize('column, value, reason', [
+    (0, 3, 'above maximum 1'),
+    (0, 0.5, 'not an integer'),
+    (1, -2, 'below minimum -1'),
+    (1, 2.5, 'not an integer'),
+    (2, 1.5, 'not an integer'),
+    (2, None, 'missing value not allowed'),
+    (3, float('inf'), 'infinite value'),
+    (3, 'high', 'not a number')
+])
+def test_invalid_value_rejects_only_its_row(column, value, reason):
+    row = list(VALID_ROW)
+    row[column] = value
+    X, valid, errors, warnings = validate([VALID_ROW, row, VALID_ROW])
+    assert valid.tolist() == [True, False, True]
+    assert [error['row'] for error in errors] == [1]
+    assert reasons(errors[0]['errors']) == [(SCHEMA['features'][column]['name'], reason)]
+
+def test_wrong_row_length():
+    X, valid, errors, warnings = validate([VALID_ROW, VALID_ROW[:3]])
+    assert valid.tolist() == [True, False]
+    assert errors[0]['errors'][0]['reason'] == 'expected 4 values, got 3'
+
+def test_out_of_range_values_are_warnings():
+    # int range 0..10 widened by half its span: -5..15
+    rows = [VALID_ROW, [1, 2, 16, 0.5], [1, 2, 5, -0.6]]
+    X, valid, errors, warnings = validate(rows)
+    assert valid.all() and errors == []
+    assert [warning['row'] for warning in warnings] == [1, 2]
+    assert reasons(warnings[0]['warnings']) == [('ps_ind_01', 'above training range 15')]
+    assert reasons(warnings[1]['warnings']) == [('ps_reg_03', 'below training range -0.5')]
+
+def test_reject_range_turns_warnings_into_errors():
+    X, valid, errors, warnings = validate([VALID_ROW, [1, 2, 16, 0.5]], reject_range=True)
+    assert valid.tolist() == [True, False] and warnings == []
+    assert reasons(errors[0]['errors']) == [('ps_ind_01', 'above maximum 15')]
+
+def test_float32_arrays_are_not_copied():
+    rows = np.array([VALID_ROW, VALID_ROW], dtype=np.float32)
+    X, valid, errors, warnings = validate(rows)
+    assert X is rows and valid.all()
@@ -0,0 +1,73 @@
+'''
+The prediction cache of score.py (tests/integration/prediction_cache.py):
+hits per row and model, LRU eviction by entries and memory, TTL expiry.
+
+    python -m pytest tests/unit
+'''
+import os
+import sys
+import numpy as np
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.append(os.path.join(REPO_DIR, 'tests', 'integration'))
+import prediction_cache
+from prediction_cache import PredictionCache
+
+ROWS = np.arange(12, dtype=np.float64).reshape(4, 3)
+
+def lookup(cache, keys):
+    score = np.full(len(keys), np.nan)
+    return cache.lookup(keys, score), score
+
+def test_hits_return_the_stored_scores():
+    cache = PredictionCache(100)
+    keys = cache.keys(ROWS, 'model#1')
+    miss, _ = lookup(cache, keys)
+    assert miss.all()
+    cache.store(keys, np.array([0.1, 0.2, 0.3, 0.4]))
+    miss, score = lookup(cache, keys[::-1])
+    assert not miss.any()
+    assert score.tolist() == [0.4, 0.3, 0.2, 0.1]
+    assert cache.metrics()['hits'] == 4 and cache.metrics()['misses'] == 4
+
+def test_keys_depend_on_row_values_and_model():
+    cache = PredictionCache(100)
+    keys = cache.keys(ROWS, 'model#1')
+    assert len(set(keys)) == len(ROWS)
+    # the same values in another dtype are the same row
+    assert cache.keys(ROWS.astype(np.float32), 'model#1') == keys
+    assert not set(cache.keys(ROWS, 'model#2')) & set(keys)
+
+def test_least_recently_used_entries_are_evicted():
+    cache = PredictionCache(3)
+    keys = cache.keys(ROWS, 'model#1')
+    cache.store(keys[:3], np.array([0.1, 0.2, 0.3]))
+    # touch the first row, so the second is now the oldest
+    lookup(cache, keys[:1])
+    cache.store(keys[3:], np.array([0.4]))
+    miss, _ = lookup(cache, keys)
+    assert miss.tolist() == [False, True, False, False]
+    assert cache.metrics()['evictions'] == 1 and cache.metrics()['entries'] == 3
+
+def test_max_mb_bounds_the_entries():
+    cache = PredictionCache(10 ** 9, max_mb=1)
+    assert cache.max_entries == 1024 * 1024 // PredictionCache.ENTRY_BYTES
+
+def test_entries_expire_after_ttl(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(prediction_cache.time, 'monotonic', lambda: now[0])
+    cache = PredictionCache(100, ttl_s=10)
+    keys = cache.keys(ROWS, 'model#1')
+    cache.store(keys, np.zeros(len(keys)))
+    now[0] += 9
+    assert not lookup(cache, keys)[0].any()
+    now[0] += 2
+    assert lookup(cache, keys)[0].all()
+    assert cache.metrics()['expirations'] == len(keys) and cache.metrics()['entries'] == 0
+
+def test_clear_drops_every_entry():
+    cache = PredictionCache(100)
+    keys = cache.keys(ROWS, 'model#1')
+    cache.store(keys, np.zeros(len(keys)))
+    cache.clear()
+    assert lookup(cache, keys)[0].all()
@@ -0,0 +1,35 @@
+# Native categorical handling of the insurance _cat columns for train.py
+CATEGORICAL_SUFFIX = '_cat'
+
+# LightGBM's defaults for categorical splits, overridden by the pipeline config
+DEFAULT_CATEGORICAL = {
+    "max_cat_to_onehot": 4,
+    "max_cat_threshold": 32,
+    "cat_smooth": 10,
+    "cat_l2": 10,
+    "min_data_per_group": 100
+}
+
+def categorical_columns(feature_columns, config=None):
+    '''The columns declared categorical: config['columns'] or every _cat feature.'''
+    columns = (config or {}).get('columns')
+    if columns:
+        return [name for name in feature_columns if name in columns]
+    return [name for name in feature_columns if name.endswith(CATEGORICAL_SUFFIX)]
+
+def categorical_params(feature_columns, config):
+    """
+    LightGBM parameters declaring the categorical columns by index. They go
+    into the training parameters rather than the Dataset constructor, so
+    every Dataset built from them (cross-validation folds, search trials,
+    incremental continuation, the dataset cache key) bins the columns the
+    same way, and the splits they produce are stored in the model file that
+    score.py loads. The _cat codes are used as they are: LightGBM treats a
+    negative code as missing, so -1 needs no mapping (nor a float column).
+    """
+    config = dict(DEFAULT_CATEGORICAL, **config)
+    columns = categorical_columns(feature_columns, config)
+    params = {name: config[name] for name in DEFAULT_CATEGORICAL}
+    # the 'categorical_feature' alias is reserved for the Dataset argument
+    params['categorical_column'] = [feature_columns.index(name) for name in columns]
+    return params
@@ -0,0 +1,124 @@
+# Stratified k-fold cross-validation for train.py: folds train in parallel worker processes
+import multiprocessing
+import os
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import lightgbm
+from sklearn.model_selection import StratifiedKFold
+from evaluation import evaluate
+
+DEFAULT_CROSS_VALIDATION = {
+    "n_folds": 5,
+    "max_workers": None,
+    "num_boost_round": 500,
+    "early_stopping_rounds": 20,
+    "ensemble": False,
+    "seed": 0
+}
+
+# feature matrix and labels of a pool worker, set once by init_worker
+worker_data = {}
+
+def init_worker(X, y, num_threads):
+    # with the fork start method X is the parent's array, shared copy-on-write and
+    # never written to; only the rows of a fold are copied, when LightGBM bins them
+    worker_data['X'] = X
+    worker_data['y'] = y
+    worker_data['num_threads'] = num_threads
+
+def train_fold(params, fold, train_index, valid_index, num_boost_round, early_stopping_rounds):
+    started = time.perf_counter()
+    X, y = worker_data['X'], worker_data['y']
+    params = dict(params, num_threads=worker_data['num_threads'], verbose=-1)
+    train_data = lightgbm.Dataset(X[train_index], label=y[train_index], params=params)
+    valid_data = lightgbm.Dataset(X[valid_index], label=y[valid_index], reference=train_data)
+    model = lightgbm.train(
+        params,
+        train_data,
+        num_boost_round=num_boost_round,
+        valid_sets=[valid_data],
+        callbacks=[lightgbm.early_stopping(early_stopping_rounds, verbose=False)])
+    prediction = model.predict(X[valid_index], num_iteration=model.best_iteration)
+    return {'fold': fold, 'best_iteration': model.best_iteration, 'prediction': prediction,
+            'model': model.model_to_string(num_iteration=model.best_iteration),
+            'seconds': time.perf_counter() - started}
+
+def average_models(model_strings):
+    """
+    One Booster that predicts the mean raw score of the given models: every
+    leaf value is divided by their count and the trees are interleaved
+    (iteration 1 of every model, then iteration 2, ...), so evaluating only
+    the first trees of it still averages over all folds.
+    """
+    header = model_strings[0][:model_strings[0].index('\nTree=')]
+    header = re.sub(r'\ntree_sizes=[^\n]*', '', header)
+    if 'is_linear=1' in ''.join(model_strings):
+        raise ValueError('linear trees cannot be averaged')
+    scale = 1.0 / len(model_strings)
+    folds = []
+    for model_string in model_strings:
+        trees = model_string[model_string.index('\nTree='):model_string.index('\nend of trees')]
+        folds.append([tree.strip() for tree in re.split(r'\n(?=Tree=\d+\n)', trees.strip())])
+
+    def scaled(line):
+        name, values = line.split('=', 1)
+        return '%s=%s' % (name, ' '.join(repr(float(v) * scale) for v in values.split()))
+
+    merged = []
+    for iteration in range(max(len(trees) for trees in folds)):
+        for trees in folds:
+            if iteration >= len(trees):
+                continue
+            lines = trees[iteration].split('\n')
+            lines[0] = 'Tree=%d' % len(merged)
+            lines = [scaled(line) if line.startswith(('leaf_value=', 'internal_value=')) else line for line in lines]
+            merged.append('\n'.join(lines))
+    model_string = '%s\n\n%s\n\n\nend of trees\n' % (header, '\n\n\n'.join(merged))
+    # a round trip through LightGBM writes tree sizes and feature importances again
+    return lightgbm.Booster(model_str=lightgbm.Booster(model_str=model_string).model_to_string())
+
+def cross_validate(X, y, params, config=None, log=print):
+    """
+    Stratified k-fold cross-validation of params on X, y. Folds train at the
+    same time in max_workers forked processes (all CPUs by default, split
+    evenly into LightGBM threads) that share one read-only copy of the
+    feature matrix. Every fold early-stops on its own held-out rows. Returns
+    {'oof_prediction', 'folds', 'oof', 'auc_mean', 'auc_std'} and, with
+    ensemble set, 'model': the folds averaged into one Booster.
+    """
+    config = dict(DEFAULT_CROSS_VALIDATION, **(config or {}))
+    X = np.ascontiguousarray(X, dtype=np.float64)
+    y = np.asarray(y)
+    cpus = len(os.sched_getaffinity(0)) if hasattr(os, 'sched_getaffinity') else os.cpu_count()
+    workers = min(config['max_workers'] or cpus, config['n_folds'])
+    num_threads = max(1, cpus // workers)
+    splits = StratifiedKFold(n_splits=config['n_folds'], shuffle=True, random_state=config['seed']).split(X, y)
+    log('Cross-validation: %d folds, %d workers x %d threads' % (config['n_folds'], workers, num_threads))
+
+    oof_prediction = np.full(len(y), np.nan)
+    folds, models = [], []
+    context = multiprocessing.get_context('fork')
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context, initializer=init_worker,
+                             initargs=(X, y, num_threads)) as pool:
+        futures = [(valid_index, pool.submit(train_fold, params, fold, train_index, valid_index,
+                                             config['num_boost_round'], config['early_stopping_rounds']))
+                   for fold, (train_index, valid_index) in enumerate(splits)]
+        for valid_index, future in futures:
+            result = future.result()
+            oof_prediction[valid_index] = result['prediction']
+            metrics = evaluate(y[valid_index], result['prediction'], n_bootstrap=0)
+            folds.append({'fold': result['fold'], 'rows': len(valid_index), 'best_iteration': result['best_iteration'],
+                          'auc': metrics['auc'], 'f1': metrics['at_threshold']['weighted_f1'],
+                          'optimal_threshold': metrics['optimal_threshold'], 'seconds': result['seconds']})
+            models.append(result['model'])
+            log('Fold %d: AUC %.5f at %d iterations' % (result['fold'], metrics['auc'], result['best_iteration']))
+
+    aucs = np.array([fold['auc'] for fold in folds])
+    result = {'oof_prediction': oof_prediction, 'folds': folds,
+              'oof': evaluate(y, oof_prediction, n_bootstrap=200),
+              'auc_mean': float(aucs.mean()), 'auc_std': float(aucs.std())}
+    if config['ensemble']:
+        result['model'] = average_models(models)
+    return result
@@ -0,0 +1,137 @@
+# Cache of constructed (binned) LightGBM Datasets for train.py
+import hashlib
+import json
+import os
+import shutil
+import time
+import lightgbm
+
+# Parameters (with their aliases) that change how a Dataset is binned. Only
+# these go into the fingerprint, so a new learning_rate still hits the cache.
+DATASET_PARAMS = {
+    'max_bin', 'max_bins', 'max_bin_by_feature', 'min_data_in_bin', 'bin_construct_sample_cnt',
+    'subsample_for_bin', 'data_random_seed', 'data_seed', 'seed', 'random_seed', 'random_state',
+    'use_missing', 'zero_as_missing', 'feature_pre_filter', 'enable_bundle', 'is_enable_bundle',
+    'bundle', 'max_conflict_rate', 'is_enable_sparse', 'enable_sparse', 'sparse', 'pre_partition',
+    'is_pre_partition', 'categorical_feature', 'cat_feature', 'categorical_column', 'cat_column',
+    'forcedbins_filename', 'linear_tree', 'linear_trees',
+    # feature_pre_filter drops features that cannot split with min_data_in_leaf rows
+    'min_data_in_leaf', 'min_data', 'min_data_per_leaf', 'min_child_samples'
+}
+META_NAME = 'meta.json'
+TRAIN_NAME = 'train.bin'
+VALID_NAME = 'valid.bin'
+
+def default_cache_dir():
+    # the shared folder of an Azure ML compute node outlives the runs scheduled on it
+    root = os.environ.get('AZ_BATCH_NODE_SHARED_DIR') or os.path.join(os.path.expanduser('~'), '.cache')
+    return os.path.join(root, 'lightgbm-datasets')
+
+def source_identity(source):
+    '''
+    What identifies a split without reading it: name, size and modification
+    time of the files under a path, or the id and version of a tabular
+    dataset (None when it has no id).
+    '''
+    if isinstance(source, str):
+        if os.path.isfile(source):
+            files = [(os.path.basename(source), source)]
+        else:
+            files = sorted((os.path.relpath(os.path.join(root, name), source), os.path.join(root, name))
+                           for root, _, names in os.walk(source) for name in names)
+        identity = []
+        for name, path in files:
+            stat = os.stat(path)
+            identity.append([name, stat.st_size, stat.st_mtime_ns])
+        return identity
+    dataset_id = getattr(source, 'id', None)
+    if dataset_id is None:
+        return None
+    return {'id': dataset_id, 'version': getattr(source, 'version', None)}
+
+def fingerprint(sources, selection, params):
+    '''
+    Key of a train/valid pair: identity of both input splits (see
+    source_identity), the columns read from them (selection), the binning
+    parameters and the LightGBM version. None when a split has no identity.
+    '''
+    inputs = [source_identity(source) for source in sources]
+    if any(identity is None for identity in inputs):
+        return None
+    binning = {name: params[name] for name in sorted(params) if name in DATASET_PARAMS}
+    key = {'lightgbm': lightgbm.__version__, 'params': binning, 'inputs': inputs, 'selection': selection}
+    return hashlib.sha256(json.dumps(key, sort_keys=True, default=str).encode()).hexdigest()[:32]
+
+def build(X_train, y_train, X_valid, y_valid, params):
+    train_data = lightgbm.Dataset(X_train, label=y_train, params=params)
+    # the validation set is binned with the bin mappers of the training set
+    valid_data = lightgbm.Dataset(X_valid, label=y_valid, reference=train_data)
+    train_data.construct()
+    valid_data.construct()
+    return train_data, valid_data
+
+def prune(cache_dir, max_entries):
+    # least recently used entries go first; a hit touches meta.json
+    entries = []
+    for name in os.listdir(cache_dir):
+        meta = os.path.join(cache_dir, name, META_NAME)
+        if os.path.exists(meta):
+            entries.append((os.path.getmtime(meta), name))
+    for _, name in sorted(entries, reverse=True)[max_entries:]:
+        shutil.rmtree(os.path.join(cache_dir, name), ignore_errors=True)
+
+def load_or_build(X_train, y_train, X_valid, y_valid, params, sources, selection=None, cache_dir=None, max_entries=8):
+    """
+    Constructed train and validation Datasets for params. X_train/y_train and
+    X_valid/y_valid must be the selection read whole from the two splits in
+    sources (dataset objects or parquet paths), which key the entry. On a
+    cache hit they are loaded from LightGBM binary files (no binning); on a
+    miss they are built from the frames and saved for the next run, unless a
+    split has no identity (key None). Returns (train_data, valid_data, stats)
+    with stats = {'hit', 'key', 'seconds', 'seconds_saved'}: seconds_saved is
+    the construct time recorded by the run that filled the entry minus the
+    load time of this one.
+    """
+    cache_dir = cache_dir or default_cache_dir()
+    started = time.perf_counter()
+    key = fingerprint(sources, selection, params)
+    if key is None:
+        train_data, valid_data = build(X_train, y_train, X_valid, y_valid, params)
+        return train_data, valid_data, {'hit': False, 'key': None, 'seconds': time.perf_counter() - started,
+                                        'seconds_saved': 0.0}
+    entry = os.path.join(cache_dir, key)
+    meta_path = os.path.join(entry, META_NAME)
+    if os.path.exists(meta_path):
+        with open(meta_path) as f:
+            meta = json.load(f)
+        train_data = lightgbm.Dataset(os.path.join(entry, TRAIN_NAME), params=params)
+        valid_data = lightgbm.Dataset(os.path.join(entry, VALID_NAME), reference=train_data)
+        train_data.construct()
+        valid_data.construct()
+        os.utime(meta_path)
+        seconds = time.perf_counter() - started
+        return train_data, valid_data, {'hit': True, 'key': key, 'seconds': seconds,
+                                        'seconds_saved': meta['seconds'] - seconds}
+
+    train_data, valid_data = build(X_train, y_train, X_valid, y_valid, params)
+    seconds = time.perf_counter() - started
+    try:
+        # written to a temporary folder and renamed, so concurrent runs never read half an entry
+        os.makedirs(cache_dir, exist_ok=True)
+        tmp = entry + '.%d.tmp' % os.getpid()
+        os.makedirs(tmp, exist_ok=True)
+        train_data.save_binary(os.path.join(tmp, TRAIN_NAME))
+        valid_data.save_binary(os.path.join(tmp, VALID_NAME))
+        with open(os.path.join(tmp, META_NAME), 'w') as f:
+            json.dump({'seconds': seconds, 'lightgbm': lightgbm.__version__,
+                       'train_rows': train_data.num_data(), 'valid_rows': valid_data.num_data()}, f)
+        try:
+            os.rename(tmp, entry)
+        except OSError:
+            # another run filled the same entry first
+            shutil.rmtree(tmp, ignore_errors=True)
+        prune(cache_dir, max_entries)
+    except OSError as e:
+        # a read-only or full disk costs the cache, not the run
+        print('Dataset cache not written: %s' % e)
+    return train_data, valid_data, {'hit': False, 'key': key, 'seconds': seconds, 'seconds_saved': 0.0}
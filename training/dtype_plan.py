@@ -0,0 +1,98 @@
+# Compact dtypes for the insurance columns: planned from names and statistics, applied when a split is loaded
+import json
+import numpy as np
+
+DTYPES_NAME = 'dtypes.json'
+INT_DTYPES = ('int8', 'int16', 'int32', 'int64')
+# integers up to 2^24 are exact in float32 (columns that are integral but hold NaN)
+FLOAT32_EXACT_INT = 2 ** 24
+FLOAT32_MAX = float(np.finfo(np.float32).max)
+
+def column_stats(values):
+    '''(rows, finite rows, min, max, integral) of one column, merged with merge_stats across chunks.'''
+    values = np.asarray(values, dtype=np.float64)
+    finite = values[np.isfinite(values)]
+    if not len(finite):
+        return (len(values), 0, np.inf, -np.inf, True)
+    return (len(values), len(finite), finite.min(), finite.max(), bool(np.array_equal(finite, np.round(finite))))
+
+def merge_stats(a, b):
+    return (a[0] + b[0], a[1] + b[1], min(a[2], b[2]), max(a[3], b[3]), a[4] and b[4])
+
+def stats_dtype(name, stats):
+    """
+    Narrowest safe dtype of one column. Integral columns without NaN get the
+    smallest int dtype holding their range: the _bin (0/1) and _cat (small
+    codes, -1 for missing) columns of the insurance data end up int8. Other
+    columns get float32 while their magnitude fits it (a float32 value keeps
+    about 7 significant digits, the insurance floats have at most 9 of which
+    the model cannot split on more than its 255 bins anyway). A _bin or _cat
+    column that is not integral does not match its name and stays float64.
+    """
+    rows, finite, lower, upper, integral = stats
+    if not finite:
+        return 'float32'
+    if integral and finite == rows:
+        for dtype in INT_DTYPES:
+            info = np.iinfo(dtype)
+            if info.min <= lower and upper <= info.max:
+                return dtype
+    if name.endswith(('_bin', '_cat')) and not integral:
+        return 'float64'
+    limit = FLOAT32_EXACT_INT if integral else FLOAT32_MAX
+    return 'float32' if max(abs(lower), abs(upper)) <= limit else 'float64'
+
+def column_dtype(name, values):
+    return stats_dtype(name, column_stats(values))
+
+def plan_dtypes(df, exclude=('id',)):
+    '''{column: dtype} of every numeric column of df except exclude.'''
+    return {name: column_dtype(name, df[name]) for name in df.columns
+            if name not in exclude and df[name].dtype.kind in 'biuf'}
+
+class DtypeStats:
+    '''Column statistics of a frame read chunk by chunk: plan() is plan_dtypes of all the chunks together.'''
+    def __init__(self, exclude=('id',)):
+        self.exclude = exclude
+        self.stats = {}
+
+    def update(self, df):
+        for name in df.columns:
+            if name in self.exclude or df[name].dtype.kind not in 'biuf':
+                continue
+            stats = column_stats(df[name])
+            self.stats[name] = merge_stats(self.stats[name], stats) if name in self.stats else stats
+
+    def plan(self):
+        return {name: stats_dtype(name, stats) for name, stats in self.stats.items()}
+
+def apply_dtypes(df, plan):
+    """
+    df with the planned dtypes. A column whose values no longer fit its
+    planned dtype (new data with a larger code or a NaN) is planned again
+    instead of being truncated.
+    """
+    dtypes = {}
+    for name, dtype in plan.items():
+        if name not in df.columns or df[name].dtype == dtype:
+            continue
+        if dtype in INT_DTYPES:
+            values = df[name].to_numpy(dtype=np.float64)
+            info = np.iinfo(dtype)
+            if np.isnan(values).any() or values.min(initial=0) < info.min or values.max(initial=0) > info.max:
+                widened = column_dtype(name, values)
+                print('Column %s does not fit %s, loaded as %s' % (name, dtype, widened))
+                dtype = widened
+        dtypes[name] = dtype
+    return df.astype(dtypes) if dtypes else df
+
+def input_dtype(dtypes):
+    '''Array dtype LightGBM builds from a frame of these dtypes: float64 only when a column needs it.'''
+    result = np.result_type(*[np.dtype(dtype) for dtype in dtypes])
+    return 'float64' if result == np.float64 else 'float32'
+
+def save_plan(path, plan, feature_columns):
+    '''dtypes.json next to the model: the plan and the dtype score.py builds its input array with.'''
+    with open(path, 'w') as f:
+        json.dump({'input_dtype': input_dtype([plan.get(name, 'float64') for name in feature_columns]),
+                   'columns': plan}, f, indent=2)
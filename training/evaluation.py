@@ -0,0 +1,130 @@
+# Evaluation of binary classifier scores for train.py: one sort, every threshold from cumulative sums
+import numpy as np
+
+# (resamples x rows) elements held at once by the bootstrap
+BOOTSTRAP_MAX_ELEMENTS = 1 << 21
+
+def divide(a, b):
+    # 0 where the denominator is 0, as classification_report(zero_division=0)
+    a, b = np.broadcast_arrays(np.asarray(a, dtype=np.float64), np.asarray(b, dtype=np.float64))
+    out = np.zeros(a.shape)
+    np.divide(a, b, out=out, where=b > 0)
+    return out
+
+def count_metrics(tp, fp, pos, neg):
+    """
+    Precision, recall and F1 from confusion counts (numbers or arrays of
+    any shape): of the positive class, and averaged over both classes
+    weighted by their support, as the 'weighted avg' row of sklearn's
+    classification_report.
+    """
+    fn, tn = pos - tp, neg - fp
+    precision = divide(tp, tp + fp)
+    recall = divide(tp, pos)
+    f1 = divide(2 * precision * recall, precision + recall)
+    precision_neg = divide(tn, tn + fn)
+    recall_neg = divide(tn, neg)
+    f1_neg = divide(2 * precision_neg * recall_neg, precision_neg + recall_neg)
+    total = pos + neg
+    return {
+        'precision': precision, 'recall': recall, 'f1': f1,
+        'weighted_precision': divide(neg * precision_neg + pos * precision, total),
+        'weighted_recall': divide(neg * recall_neg + pos * recall, total),
+        'weighted_f1': divide(neg * f1_neg + pos * f1, total)
+    }
+
+def sort_scores(y_true, y_score):
+    '''Scores in descending order, the labels in the same order and the last position of every distinct score.'''
+    y_score = np.asarray(y_score, dtype=np.float64).ravel()
+    order = np.argsort(-y_score, kind='stable')
+    score = y_score[order]
+    label = np.asarray(y_true).ravel()[order] == 1
+    distinct = np.flatnonzero(np.diff(score)) if len(score) > 1 else np.zeros(0, dtype=np.int64)
+    return score, label, np.append(distinct, len(score) - 1)
+
+def increments(cumulative):
+    # np.diff(prepend=0) without the concatenation
+    out = cumulative.copy()
+    out[..., 1:] -= cumulative[..., :-1]
+    return out
+
+def auc_from_counts(tps, fps):
+    '''Area under the ROC curve through (0, 0) and the (fps, tps) points of each threshold, along the last axis.'''
+    pos, neg = tps[..., -1], fps[..., -1]
+    dtps, dfps = increments(tps), increments(fps)
+    # trapezoids in counts, (dfps * (tps + tps - dtps) / 2) summed, scaled once
+    area = (dfps * tps).sum(axis=-1) - (dfps * dtps).sum(axis=-1) / 2.0
+    # undefined with a single class
+    return np.where((pos > 0) & (neg > 0), area / np.maximum(pos * neg, 1), np.nan)
+
+def roc_auc(y_true, y_score):
+    '''roc_auc_score of sklearn in one sort.'''
+    _, label, last = sort_scores(y_true, y_score)
+    tps = np.cumsum(label)[last]
+    return float(auc_from_counts(tps, last + 1 - tps))
+
+def positives_at(score, threshold):
+    # number of rows with score >= threshold in descending scores
+    return int(np.searchsorted(-score, -threshold, side='right'))
+
+def bootstrap(label, last, at, n_bootstrap, seed, max_elements=BOOTSTRAP_MAX_ELEMENTS):
+    """
+    AUC and metrics at the positions at (number of rows predicted positive)
+    for n_bootstrap resamples with replacement. A resample is a count per row,
+    drawn for a batch of resamples at once; the cumulative sums of the
+    counts in score order give every threshold of every resample.
+    """
+    rows = len(label)
+    rng = np.random.default_rng(seed)
+    batch = max(1, min(n_bootstrap, max_elements // max(rows, 1)))
+    samples = {'auc': []}
+    for start in range(0, n_bootstrap, batch):
+        size = min(batch, n_bootstrap - start)
+        draws = rng.integers(0, rows, (size, rows)) + (np.arange(size) * rows)[:, None]
+        weights = np.bincount(draws.ravel(), minlength=size * rows).reshape(size, rows)
+        tp_cum = np.cumsum(np.where(label, weights, 0), axis=1)
+        all_cum = np.cumsum(weights, axis=1)
+        if len(last) < rows:
+            # ties: one point per distinct score
+            tp_cum, all_cum = tp_cum[:, last], all_cum[:, last]
+        tps, fps = tp_cum, all_cum - tp_cum
+        samples['auc'].append(auc_from_counts(tps, fps))
+        pos, neg = tps[:, -1], fps[:, -1]
+        for name, k in at.items():
+            point = np.searchsorted(last, k - 1)
+            tp = tps[:, point] if k > 0 else np.zeros(size)
+            fp = fps[:, point] if k > 0 else np.zeros(size)
+            for metric, values in count_metrics(tp, fp, pos, neg).items():
+                samples.setdefault('%s.%s' % (name, metric), []).append(values)
+    return {name: np.concatenate(values) for name, values in samples.items()}
+
+def evaluate(y_true, y_score, threshold=0.5, n_bootstrap=200, confidence=0.95, seed=0):
+    """
+    Metrics of a binary classifier from its scores: AUC, precision, recall
+    and F1 at threshold (weighted_* as the weighted avg of
+    classification_report), the threshold that maximizes the F1 of the
+    positive class with its metrics, and percentile bootstrap confidence
+    intervals of all of them (n_bootstrap=0 skips them). The scores are
+    sorted once; nothing is predicted here.
+    """
+    score, label, last = sort_scores(y_true, y_score)
+    tps = np.cumsum(label)[last]
+    fps = last + 1 - tps
+    pos, neg = int(tps[-1]), int(fps[-1])
+    curve = count_metrics(tps, fps, pos, neg)
+    best = int(np.argmax(curve['f1']))
+    at = {'at_threshold': positives_at(score, threshold), 'at_optimal': int(last[best] + 1)}
+
+    result = {'rows': len(label), 'positives': pos, 'auc': float(auc_from_counts(tps, fps)),
+              'threshold': threshold, 'optimal_threshold': float(score[last[best]])}
+    for name, k in at.items():
+        tp = int(tps[np.searchsorted(last, k - 1)]) if k > 0 else 0
+        metrics = count_metrics(tp, k - tp, pos, neg)
+        result[name] = {metric: float(value) for metric, value in metrics.items()}
+    if n_bootstrap:
+        tail = (1.0 - confidence) / 2.0 * 100.0
+        samples = bootstrap(label, last, at, n_bootstrap, seed)
+        result['confidence'] = confidence
+        result['ci'] = {name: [float(v) for v in np.nanpercentile(values, [tail, 100.0 - tail])]
+                        for name, values in samples.items()}
+    return result
@@ -0,0 +1,147 @@
+# Streaming train/test split of train_test_split.py: rows are assigned by a stable hash of their id
+import glob
+import os
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from dtype_plan import DtypeStats, apply_dtypes
+from parquet_layout import SplitWriter
+
+DEFAULT_HASH_SPLIT = {
+    "test_size": 0.2,
+    # a fixed threshold already stratifies in expectation; per-class thresholds
+    # are quantiles of the current data and move as it grows (see class_thresholds)
+    "stratify": False,
+    "salt": 0,
+    "chunk_rows": 65536,
+    # resolution of the per-class test thresholds
+    "bins": 65536
+}
+
+def input_files(path):
+    '''The csv and parquet files of a file dataset (a file or a mounted folder).'''
+    if not os.path.isdir(path):
+        return [path]
+    files = glob.glob(os.path.join(path, '**', '*.csv'), recursive=True) + \
+        glob.glob(os.path.join(path, '**', '*.parquet'), recursive=True)
+    return sorted(files)
+
+def read_chunks(path, chunk_rows):
+    '''DataFrames of at most chunk_rows rows, file by file.'''
+    files = input_files(path)
+    if not files:
+        raise FileNotFoundError('no csv or parquet files in %s' % path)
+    for name in files:
+        if name.endswith('.parquet'):
+            for batch in pq.ParquetFile(name).iter_batches(batch_size=chunk_rows):
+                yield batch.to_pandas()
+        else:
+            for chunk in pd.read_csv(name, chunksize=chunk_rows):
+                yield chunk
+
+def splitmix64(x):
+    with np.errstate(over='ignore'):
+        z = x + np.uint64(0x9E3779B97F4A7C15)
+        z = (z ^ (z >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+        z = (z ^ (z >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+    return z ^ (z >> np.uint64(31))
+
+def hash_fraction(ids, salt=0):
+    """
+    A uniform number in [0, 1) per id that depends on nothing but the id and
+    the salt, so a row keeps its side across runs, row orders and dataset
+    versions. Integer ids are mixed with splitmix64; other ids are hashed
+    with pandas' fixed-key hash first.
+    """
+    ids = np.asarray(ids)
+    if ids.dtype.kind in 'iu':
+        keys = ids.astype(np.uint64)
+    else:
+        keys = pd.util.hash_array(ids.astype(object))
+    hashed = splitmix64(keys ^ splitmix64(np.uint64(salt)))
+    return (hashed >> np.uint64(11)).astype(np.float64) * 2.0 ** -53
+
+def class_thresholds(histograms, test_size):
+    """
+    Per class, the hash fraction below which a row goes to the test split:
+    the smallest histogram edge that puts round(test_size * rows) of the
+    class's rows below it. A class gets its share of the test split to
+    within one histogram bin, but the threshold is a quantile of the current
+    data: as the data grows it moves, and the rows hashed between the old and
+    the new threshold change sides.
+    """
+    thresholds = {}
+    for label, counts in histograms.items():
+        cumulative = np.cumsum(counts)
+        target = int(round(test_size * cumulative[-1]))
+        if target == 0:
+            thresholds[label] = 0.0
+            continue
+        thresholds[label] = (int(np.searchsorted(cumulative, target)) + 1) / len(counts)
+    return thresholds
+
+def hash_split(input_path, output_train, output_test, target_column, config=None, id_column='id', log=print,
+               layout=None):
+    """
+    Split the files of input_path into output_train/processed.parquet and
+    output_test/processed.parquet, holding one chunk of chunk_rows rows at a
+    time. The first pass collects the column statistics of the dtype plan
+    (and, with stratify, a histogram of the id hashes per target class);
+    the second assigns every row by its id hash and appends it to its split.
+    The splits are written in the parquet layout of layout (see
+    parquet_layout.py), in input order. Returns {'rows', 'train_rows',
+    'test_rows', 'classes': {label: {'rows', 'test_rows', 'threshold'}}}.
+    """
+    config = dict(DEFAULT_HASH_SPLIT, **(config or {}))
+    bins = config['bins']
+    stats, histograms, first = DtypeStats(exclude=(id_column,)), {}, None
+    for chunk in read_chunks(input_path, config['chunk_rows']):
+        stats.update(chunk)
+        first = chunk.iloc[:0] if first is None else first
+        if config['stratify']:
+            fraction = hash_fraction(chunk[id_column].to_numpy(), config['salt'])
+            labels = chunk[target_column].to_numpy()
+            for label in np.unique(labels):
+                counts = np.bincount((fraction[labels == label] * bins).astype(np.intp), minlength=bins)
+                histograms[label] = histograms[label] + counts if label in histograms else counts
+    if first is None:
+        raise ValueError('%s holds no rows' % input_path)
+    plan = stats.plan()
+    if config['stratify']:
+        thresholds = class_thresholds(histograms, config['test_size'])
+    # both splits share the schema of the planned dtypes, whatever a chunk was read as
+    schema = pa.Schema.from_pandas(apply_dtypes(first, plan), preserve_index=False)
+    writers = {}
+    for name, path in (('train', output_train), ('test', output_test)):
+        writers[name] = SplitWriter(path, schema, layout)
+    summary = {'rows': 0, 'train_rows': 0, 'test_rows': 0, 'classes': {}}
+    try:
+        for chunk in read_chunks(input_path, config['chunk_rows']):
+            chunk = apply_dtypes(chunk, plan)
+            fraction = hash_fraction(chunk[id_column].to_numpy(), config['salt'])
+            labels = chunk[target_column].to_numpy()
+            if config['stratify']:
+                limit = np.zeros(len(labels))
+                for label, threshold in thresholds.items():
+                    limit[labels == label] = threshold
+            else:
+                limit = config['test_size']
+            test = fraction < limit
+            for name, rows in (('train', ~test), ('test', test)):
+                if rows.any():
+                    writers[name].write_table(pa.Table.from_pandas(chunk[rows], schema=schema, preserve_index=False))
+            summary['rows'] += len(chunk)
+            summary['test_rows'] += int(test.sum())
+            for label in np.unique(labels):
+                counts = summary['classes'].setdefault(label.item(), {'rows': 0, 'test_rows': 0})
+                counts['rows'] += int((labels == label).sum())
+                counts['test_rows'] += int(test[labels == label].sum())
+    finally:
+        for writer in writers.values():
+            writer.close()
+    summary['train_rows'] = summary['rows'] - summary['test_rows']
+    for label, counts in summary['classes'].items():
+        counts['threshold'] = thresholds[label] if config['stratify'] else config['test_size']
+        log('Class %s: %d of %d rows in the test split' % (label, counts['test_rows'], counts['rows']))
+    return summary
@@ -0,0 +1,168 @@
+# Hyperparameter search for train.py: successive halving over a process pool
+import argparse
+import json
+import math
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import lightgbm
+
+# Search space entries of the pipeline config ("hyperparameter_search": {"search_space": {...}}):
+#   {"type": "uniform",    "low": 0.5,   "high": 1.0}
+#   {"type": "loguniform", "low": 0.005, "high": 0.1}
+#   {"type": "int",        "low": 15,    "high": 127}
+#   {"type": "choice",     "values": ["gbdt", "dart"]}
+DEFAULT_SEARCH = {
+    "num_trials": 27,
+    "min_rounds": 20,
+    "max_rounds": 500,
+    "reduction_factor": 3,
+    "max_workers": None,
+    "seed": 0,
+    # share of the train split held out to rank the trials, the test split is not seen
+    "validation_size": 0.2,
+    "search_space": {}
+}
+
+# training data of a pool worker, set once by init_worker
+worker_data = {}
+
+def sample_params(search_space, rng):
+    params = {}
+    for name, space in search_space.items():
+        if space['type'] == 'uniform':
+            params[name] = float(rng.uniform(space['low'], space['high']))
+        elif space['type'] == 'loguniform':
+            params[name] = float(math.exp(rng.uniform(math.log(space['low']), math.log(space['high']))))
+        elif space['type'] == 'int':
+            params[name] = int(rng.integers(space['low'], space['high'] + 1))
+        elif space['type'] == 'choice':
+            params[name] = space['values'][int(rng.integers(len(space['values'])))]
+        else:
+            raise ValueError('unknown search space type %s for %s' % (space['type'], name))
+    return params
+
+def rung_rounds(min_rounds, max_rounds, reduction_factor):
+    # boosting rounds of each rung: min_rounds * reduction_factor^i, the last one max_rounds
+    rounds = [min_rounds]
+    while rounds[-1] * reduction_factor < max_rounds:
+        rounds.append(rounds[-1] * reduction_factor)
+    if rounds[-1] < max_rounds:
+        rounds.append(max_rounds)
+    return rounds
+
+def init_worker(X_train, y_train, X_valid, y_valid, num_threads):
+    # Datasets are built once per worker process and reused by all of its trials;
+    # with the fork start method the arrays are inherited, not pickled
+    # feature_pre_filter off: trials may use a different min_data_in_leaf than the one binned with
+    worker_data['train'] = lightgbm.Dataset(X_train, label=y_train, params={'feature_pre_filter': False},
+                                            free_raw_data=False)
+    worker_data['valid'] = lightgbm.Dataset(X_valid, label=y_valid, reference=worker_data['train'], free_raw_data=False)
+    worker_data['num_threads'] = num_threads
+
+def run_trial(params, rounds):
+    # train one trial for rounds boosting rounds, return its validation AUC per iteration.
+    # Trials are retrained from scratch in every rung: continuing with init_model
+    # would set an init score on the shared Datasets that leaks into later trials.
+    params = dict(params, metric='auc', num_threads=worker_data['num_threads'], verbose=-1)
+    evals = {}
+    started = time.perf_counter()
+    lightgbm.train(
+        params,
+        worker_data['train'],
+        num_boost_round=rounds,
+        valid_sets=[worker_data['valid']],
+        valid_names=['valid'],
+        callbacks=[lightgbm.record_evaluation(evals)])
+    return {'auc': evals['valid']['auc'], 'seconds': time.perf_counter() - started}
+
+def validation_split(X_train, y_train, search=None):
+    '''(X_fit, X_valid, y_fit, y_valid): a stratified validation slice of the train split for the search.'''
+    from sklearn.model_selection import train_test_split
+    search = dict(DEFAULT_SEARCH, **(search or {}))
+    return train_test_split(X_train, y_train, test_size=search['validation_size'], random_state=search['seed'],
+                            stratify=y_train)
+
+def successive_halving(X_train, y_train, X_valid, y_valid, base_params, search=None, log=print):
+    """
+    Sample num_trials parameter sets from the search space (on top of
+    base_params) and train them in rungs of growing boosting rounds. After
+    each rung only the best 1/reduction_factor of the trials by validation
+    AUC go on to the next rung. The search space must not contain Dataset
+    parameters (max_bin, ...): the binned Datasets are shared by all trials
+    of a worker. Returns the best parameters and the table of every trial.
+    """
+    search = dict(DEFAULT_SEARCH, **(search or {}))
+    rng = np.random.default_rng(search['seed'])
+    rounds = rung_rounds(search['min_rounds'], search['max_rounds'], search['reduction_factor'])
+    cpus = len(os.sched_getaffinity(0)) if hasattr(os, 'sched_getaffinity') else os.cpu_count()
+    workers = min(search['max_workers'] or cpus, search['num_trials'])
+    # workers x LightGBM threads never exceeds the CPUs
+    num_threads = max(1, cpus // workers)
+
+    trials = [{'trial': i, 'params': dict(base_params, **sample_params(search['search_space'], rng)),
+               'rungs': [], 'status': 'running'}
+              for i in range(search['num_trials'])]
+    log('Hyperparameter search: %d trials, rungs %s, %d workers x %d threads' % (
+        len(trials), rounds, workers, num_threads))
+
+    context = multiprocessing.get_context('fork')
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context, initializer=init_worker,
+                             initargs=(X_train, y_train, X_valid, y_valid, num_threads)) as pool:
+        alive = trials
+        for rung, rung_round in enumerate(rounds):
+            futures = [pool.submit(run_trial, trial['params'], rung_round) for trial in alive]
+            for trial, future in zip(alive, futures):
+                result = future.result()
+                # a trial scores the AUC of its best iteration, as with early stopping
+                best = int(np.argmax(result['auc']))
+                trial['best_auc'] = float(result['auc'][best])
+                trial['best_iteration'] = best + 1
+                trial['rounds'] = rung_round
+                trial['rungs'].append({'rounds': rung_round, 'auc': trial['best_auc'], 'seconds': result['seconds']})
+            alive = sorted(alive, key=lambda trial: -trial['best_auc'])
+            keep = max(1, len(alive) // search['reduction_factor']) if rung < len(rounds) - 1 else len(alive)
+            for trial in alive[keep:]:
+                trial['status'] = 'pruned'
+            alive = alive[:keep]
+            log('Rung %d (%d rounds): best AUC %.5f, %d trials continue' % (
+                rung, rung_round, alive[0]['best_auc'], len(alive) if rung < len(rounds) - 1 else 0))
+    for trial in alive:
+        trial['status'] = 'completed'
+
+    best = max(trials, key=lambda trial: trial['best_auc'])
+    table = [{'trial': trial['trial'], 'status': trial['status'], 'best_auc': trial['best_auc'],
+              'best_iteration': trial['best_iteration'], 'rounds': trial['rounds'],
+              'params': {name: trial['params'][name] for name in search['search_space']},
+              'rungs': trial['rungs']}
+             for trial in trials]
+    return best['params'], table
+
+def main():
+    # run the search on a local csv, no Azure ML workspace needed
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--data', type=str, default='data/insurance.csv')
+    parser.add_argument('--config', type=str, default='config/dev/config.json')
+    parser.add_argument('--output', type=str, default=None, help='write best params and trial table to this json file')
+    args = parser.parse_args()
+
+    import pandas as pd
+    from sklearn.model_selection import train_test_split
+    with open(args.config, encoding='utf-8-sig') as f:
+        parameter = json.load(f)['pipeline']['configuration'][0]['parameter']
+    df = pd.read_csv(args.data)
+    feature_columns = parameter['feature_list_names'].split(", ")
+    target_column = parameter['target_column']
+    train, valid = train_test_split(df, test_size=0.2, random_state=0)
+    best_params, table = successive_halving(
+        train[feature_columns], train[target_column], valid[feature_columns], valid[target_column],
+        parameter['model_hyperparameters'], parameter.get('hyperparameter_search'))
+    print(json.dumps(best_params, indent=2))
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'best_params': best_params, 'trials': table}, f, indent=2)
+
+if __name__ == '__main__':
+    main()
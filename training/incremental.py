@@ -0,0 +1,89 @@
+# Incremental training for train.py: continue boosting the last registered model on the rows added since
+import os
+import time
+import lightgbm
+
+DEFAULT_INCREMENTAL = {
+    "min_new_rows": 1000,
+    "min_window_rows": 200,
+    "num_boost_round": 100,
+    "early_stopping_rounds": 20,
+    "max_chain": 10
+}
+NATIVE_MODEL_SUFFIX = '.txt'
+
+def as_int(value, default=None):
+    # registry properties come back as strings from Azure ML
+    try:
+        return int(float(value))
+    except (TypeError, ValueError):
+        return default
+
+def find_native_model(path, model_name):
+    file_name = model_name + NATIVE_MODEL_SUFFIX
+    for root, dirs, files in os.walk(path):
+        if file_name in files:
+            return os.path.join(root, file_name)
+    return None
+
+def plan(parent, feature_columns, train_ids, test_ids, config, categorical_features=()):
+    """
+    Decide between 'incremental' and 'full' training. parent is the latest
+    registry entry of the model (None when there is none). New rows are the
+    ids above the largest id the parent was trained on; those of the train
+    split continue the boosting and those of the test split are the held-out
+    window for early stopping. Returns {'mode', 'reason', 'previous_max_id',
+    'new_rows', 'window_rows', 'chain'} with boolean masks 'new' and 'window'.
+    """
+    config = dict(DEFAULT_INCREMENTAL, **config)
+    decision = {'mode': 'full', 'previous_max_id': None, 'new_rows': 0, 'window_rows': 0, 'chain': 0}
+    if parent is None:
+        return dict(decision, reason='no registered model')
+    properties = parent['properties']
+    previous_max_id = as_int(properties.get('data.max_id'))
+    chain = as_int(properties.get('lineage.chain'), 0)
+    if previous_max_id is None:
+        return dict(decision, reason='parent has no data.max_id')
+    if str(properties.get('data.features')) != str(feature_columns):
+        return dict(decision, reason='feature list changed')
+    # new trees would bin the columns differently from the parent's
+    if str(properties.get('data.categorical_features', [])) != str(list(categorical_features)):
+        return dict(decision, reason='categorical features changed')
+    if chain >= config['max_chain']:
+        return dict(decision, reason='%d incremental versions in a row' % chain)
+    new, window = train_ids > previous_max_id, test_ids > previous_max_id
+    decision.update(previous_max_id=previous_max_id, new_rows=int(new.sum()), window_rows=int(window.sum()))
+    if decision['new_rows'] < config['min_new_rows'] or decision['window_rows'] < config['min_window_rows']:
+        return dict(decision, reason='%d new rows, %d in the window' % (decision['new_rows'], decision['window_rows']))
+    return dict(decision, mode='incremental', reason='continue version %s' % parent['version'],
+                chain=chain + 1, new=new, window=window)
+
+def continue_training(parent_model, X_new, y_new, X_window, y_window, params, config):
+    '''Boost up to num_boost_round more trees on the new rows, early stopping on the window.'''
+    config = dict(DEFAULT_INCREMENTAL, **config)
+    started = time.perf_counter()
+    train_data = lightgbm.Dataset(X_new, label=y_new)
+    valid_data = lightgbm.Dataset(X_window, label=y_window, reference=train_data)
+    model = lightgbm.train(
+        params,
+        train_data,
+        num_boost_round=config['num_boost_round'],
+        valid_sets=[valid_data],
+        init_model=parent_model,
+        callbacks=[lightgbm.early_stopping(config['early_stopping_rounds'], verbose=False)])
+    # best_iteration counts the parent's trees too
+    return model, time.perf_counter() - started
+
+def lineage(parent, decision, base_iterations, num_iterations):
+    '''Model properties that tie a version to the one it continues.'''
+    return {
+        'lineage.mode': decision['mode'],
+        'lineage.reason': decision['reason'],
+        'lineage.parent_version': parent['version'] if parent is not None and decision['mode'] == 'incremental' else None,
+        'lineage.chain': decision['chain'],
+        'lineage.previous_max_id': decision['previous_max_id'],
+        'lineage.new_rows': decision['new_rows'],
+        'lineage.window_rows': decision['window_rows'],
+        'lineage.base_iterations': base_iterations,
+        'lineage.added_iterations': num_iterations - base_iterations
+    }
@@ -0,0 +1,82 @@
+# Model registry used by train.py: the Azure ML workspace, or a local folder standing in for it offline
+import json
+import os
+import shutil
+import time
+
+class LocalModelRegistry:
+    """
+    Registered models in a folder: <root>/<name>/<version>/ holds the model
+    folder as registered and <root>/<name>/<version>.json its properties and
+    tags. A version folder has the layout of AZUREML_MODEL_DIR, so score.py
+    can serve it directly and pick up new versions next to it.
+    """
+    def __init__(self, root):
+        self.root = root
+
+    def versions(self, name):
+        folder = os.path.join(self.root, name)
+        if not os.path.isdir(folder):
+            return []
+        return sorted((int(v) for v in os.listdir(folder)
+                       if v.isdigit() and os.path.exists(os.path.join(folder, v + '.json'))))
+
+    def get(self, name, version):
+        with open(os.path.join(self.root, name, '%d.json' % version)) as f:
+            entry = json.load(f)
+        entry['path'] = os.path.join(self.root, name, str(version))
+        return entry
+
+    def latest(self, name):
+        '''{'name', 'version', 'path', 'properties', 'tags'} of the newest version of name, None if there is none.'''
+        versions = self.versions(name)
+        return self.get(name, versions[-1]) if versions else None
+
+    def register(self, model_path, model_name, properties=None, tags=None):
+        folder = os.path.join(self.root, model_name)
+        os.makedirs(folder, exist_ok=True)
+        while True:
+            # folders still being written count as taken
+            taken = [int(v) for v in os.listdir(folder) if v.isdigit()]
+            version = max(taken, default=0) + 1
+            target = os.path.join(folder, str(version))
+            try:
+                # the version folder is claimed atomically; a concurrent run takes the next one
+                os.mkdir(target)
+                break
+            except FileExistsError:
+                continue
+        shutil.copytree(model_path, os.path.join(target, os.path.basename(os.path.normpath(model_path))))
+        entry = {'name': model_name, 'version': version, 'created': time.time(),
+                 'properties': properties or {}, 'tags': tags or {}}
+        with open(os.path.join(folder, '%d.json' % version), 'w') as f:
+            json.dump(entry, f, indent=2, default=str)
+        return version
+
+class AzureModelRegistry:
+    '''The same interface on the models registered in an Azure ML workspace.'''
+    def __init__(self, workspace, download_dir='registry'):
+        self.workspace = workspace
+        self.download_dir = download_dir
+
+    def latest(self, name):
+        from azureml.core import Model
+        from azureml.exceptions import WebserviceException
+        try:
+            model = Model(self.workspace, name=name)
+        except WebserviceException:
+            return None
+        target = os.path.join(self.download_dir, name, str(model.version))
+        path = model.download(target_dir=target, exist_ok=True)
+        return {'name': name, 'version': model.version, 'path': path,
+                'properties': dict(model.properties), 'tags': dict(model.tags)}
+
+    def register(self, model_path, model_name, properties=None, tags=None):
+        from azureml.core import Model
+        model = Model.register(
+            workspace=self.workspace,
+            model_path=model_path,
+            model_name=model_name,
+            tags=tags,
+            properties=properties)
+        return model.version
@@ -0,0 +1,87 @@
+# Parquet layout of the train/test splits handed from train_test_split.py to train.py.
+# With "projected_read" in the pipeline's parquet_layout block, train.py mounts the
+# splits and reads them with read_frame() instead of through tabular datasets.
+import os
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+DEFAULT_PARQUET_LAYOUT = {
+    # rows per row group: the unit a filter skips and a streamed read holds
+    "row_group_rows": 131072,
+    "compression": "zstd",
+    "compression_level": None,
+    "use_dictionary": True,
+    # rows are written in this column's order so its row group statistics do not overlap
+    "sort_by": "id",
+    # pyarrow filters on the split columns, e.g. [["id", ">=", 500000]]; row groups
+    # whose statistics rule them out are not read
+    "filters": None
+}
+OUTPUT_NAME = 'processed.parquet'
+
+def layout_config(config=None):
+    return dict(DEFAULT_PARQUET_LAYOUT, **(config or {}))
+
+def write_options(config):
+    '''Keyword arguments of pq.write_table / pq.ParquetWriter for a layout config.'''
+    return {'compression': config['compression'], 'compression_level': config['compression_level'],
+            'use_dictionary': config['use_dictionary'], 'write_statistics': True}
+
+def write_frame(df, path, config=None):
+    '''Write a split DataFrame to path/processed.parquet in row groups of row_group_rows rows.'''
+    config = layout_config(config)
+    sort_by = config['sort_by']
+    if sort_by and sort_by in df.columns:
+        df = df.sort_values(sort_by, kind='stable')
+    os.makedirs(path, exist_ok=True)
+    pq.write_table(pa.Table.from_pandas(df, preserve_index=False), os.path.join(path, OUTPUT_NAME),
+                   row_group_size=config['row_group_rows'], **write_options(config))
+
+class SplitWriter:
+    """
+    Appends tables to path/processed.parquet and writes them as row groups of
+    row_group_rows rows, however small the appended tables are; holds at most
+    one row group. Rows keep the order they are appended in (sort_by is not
+    applied).
+    """
+    def __init__(self, path, schema, config=None):
+        self.config = layout_config(config)
+        os.makedirs(path, exist_ok=True)
+        self.writer = pq.ParquetWriter(os.path.join(path, OUTPUT_NAME), schema, **write_options(self.config))
+        self.pending, self.pending_rows = [], 0
+
+    def write_table(self, table):
+        self.pending.append(table)
+        self.pending_rows += table.num_rows
+        if self.pending_rows >= self.config['row_group_rows']:
+            self.flush(final=False)
+
+    def flush(self, final=True):
+        table = pa.concat_tables(self.pending)
+        row_group_rows = self.config['row_group_rows']
+        full = table.num_rows if final else table.num_rows - table.num_rows % row_group_rows
+        if full:
+            self.writer.write_table(table.slice(0, full), row_group_size=row_group_rows)
+        self.pending = [table.slice(full)] if full < table.num_rows else []
+        self.pending_rows = table.num_rows - full
+
+    def close(self):
+        if self.pending_rows:
+            self.flush()
+        self.writer.close()
+
+def read_filters(filters):
+    '''The json filters of a layout config as pyarrow filters (lists of tuples).'''
+    if not filters:
+        return None
+    if isinstance(filters[0][0], (list, tuple)):
+        return [[tuple(f) for f in conjunction] for conjunction in filters]
+    return [tuple(f) for f in filters]
+
+def read_frame(path, columns, filters=None):
+    """
+    The given columns of the parquet files of a split (a file or a folder) as
+    a DataFrame, with the rows that pass filters. Only these columns are
+    read, and row groups whose min/max statistics fail a filter are skipped.
+    """
+    return pq.read_table(path, columns=list(columns), filters=read_filters(filters)).to_pandas()
@@ -0,0 +1,108 @@
+# Out-of-core training input for train.py: parquet row groups streamed into LightGBM
+import glob
+import os
+import numpy as np
+import pyarrow.parquet as pq
+import lightgbm
+from dtype_plan import input_dtype
+
+DEFAULT_CHUNK_ROWS = 65536
+
+def parquet_files(path):
+    if os.path.isdir(path):
+        return sorted(glob.glob(os.path.join(path, '**', '*.parquet'), recursive=True))
+    return [path]
+
+class ParquetSource:
+    '''The parquet files of a split (a file or a folder), read chunk_rows rows at a time.'''
+    def __init__(self, path, chunk_rows=DEFAULT_CHUNK_ROWS):
+        self.paths = parquet_files(path)
+        if not self.paths:
+            raise FileNotFoundError('no parquet files in %s' % path)
+        self.chunk_rows = chunk_rows
+        self.num_rows = sum(pq.ParquetFile(name).metadata.num_rows for name in self.paths)
+
+    def batches(self, columns):
+        # iter_batches decodes page by page, so a chunk is bounded even in one large row group
+        for name in self.paths:
+            for batch in pq.ParquetFile(name).iter_batches(batch_size=self.chunk_rows, columns=columns):
+                yield batch
+
+    def column(self, name):
+        '''One whole column (labels, ids): a vector per row, not the feature matrix.'''
+        return np.concatenate([batch.column(0).to_numpy(zero_copy_only=False) for batch in self.batches([name])])
+
+    def dtypes(self, columns):
+        schema = pq.ParquetFile(self.paths[0]).schema_arrow
+        return [np.dtype(schema.field(name).type.to_pandas_dtype()) for name in columns]
+
+    def chunks(self, columns, dtype=np.float64):
+        '''Float matrices of at most chunk_rows rows, in row order.'''
+        for batch in self.batches(columns):
+            yield np.column_stack([batch.column(i).to_numpy(zero_copy_only=False).astype(dtype, copy=False)
+                                   for i in range(len(columns))])
+
+    def sequence(self, columns):
+        return ParquetSequence(self, columns)
+
+class ParquetSequence(lightgbm.Sequence):
+    """
+    Feature columns of a ParquetSource as a lightgbm.Sequence. Dataset
+    construction reads rows in increasing order, first the sample for the
+    bin boundaries and then batch_size rows at a time, so a forward cursor
+    over the chunks serves both passes holding one chunk; an index behind
+    the cursor restarts it.
+    """
+    def __init__(self, source, columns):
+        self.source = source
+        self.columns = list(columns)
+        self.batch_size = source.chunk_rows
+        # the compact dtypes of the split step make float32 chunks for predict,
+        # as a frame of them would; LightGBM only samples float64 rows to bin
+        self.dtypes = source.dtypes(self.columns)
+        self.dtype = np.dtype(input_dtype(self.dtypes))
+        self.rewind()
+
+    def __len__(self):
+        return self.source.num_rows
+
+    def rewind(self):
+        self.cursor = self.source.chunks(self.columns)
+        self.chunk = np.zeros((0, len(self.columns)))
+        self.chunk_start = 0
+
+    def seek(self, row):
+        '''The chunk holding row, and row's offset in it.'''
+        if row < self.chunk_start:
+            self.rewind()
+        while row >= self.chunk_start + len(self.chunk):
+            self.chunk_start += len(self.chunk)
+            self.chunk = next(self.cursor)
+        return self.chunk, row - self.chunk_start
+
+    def __getitem__(self, idx):
+        if isinstance(idx, slice):
+            start, stop, _ = idx.indices(len(self))
+            parts = []
+            while start < stop:
+                chunk, offset = self.seek(start)
+                parts.append(chunk[offset:offset + stop - start])
+                start += len(parts[-1])
+            return np.concatenate(parts) if len(parts) != 1 else parts[0]
+        if idx < 0:
+            idx += len(self)
+        chunk, offset = self.seek(idx)
+        return chunk[offset]
+
+    def chunks(self):
+        return self.source.chunks(self.columns, self.dtype)
+
+def iter_chunks(X):
+    '''Float matrices of X, a ParquetSequence (one per row group) or an in-memory frame (one).'''
+    if isinstance(X, ParquetSequence):
+        return X.chunks()
+    return [np.asarray(X, dtype=input_dtype(getattr(X, 'dtypes', [np.float64])))]
+
+def predict(model, X, **kwargs):
+    '''model.predict over X one chunk at a time.'''
+    return np.concatenate([model.predict(chunk, **kwargs) for chunk in iter_chunks(X)])
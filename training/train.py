@@ -1,5 +1,5 @@
 # Import libraries
-from azureml.core import Run, Model
+from azureml.core import Run
 import argparse
 import pandas as pd
 import numpy as np
@@ -8,29 +8,79 @@ import os
 import json
 import re
 from sklearn.model_selection import train_test_split
-from sklearn.metrics import classification_report
 import lightgbm
+from evaluation import evaluate, roc_auc
+from model_registry import AzureModelRegistry, LocalModelRegistry
+from incremental import plan, continue_training, find_native_model, lineage
+from streaming import DEFAULT_CHUNK_ROWS, ParquetSource, iter_chunks, predict
+from dtype_plan import DTYPES_NAME, plan_dtypes, apply_dtypes, save_plan
+from categorical import categorical_columns, categorical_params
+from parquet_layout import read_frame
 
 # Get parameters
 parser = argparse.ArgumentParser()
 parser.add_argument('--output-model-name', dest='output_model_name', type=str, help='output model name')
 parser.add_argument('--feature-list-names', dest='feature_list_names', type=str, help='list of input features')
 parser.add_argument('--target', dest='target', type=str, help='target column name')
+parser.add_argument('--model-hyperparameters', dest='model_hyperparameters', type=str, default=None, help='json dict of LightGBM parameters')
+parser.add_argument('--hyperparameter-search', dest='hyperparameter_search', type=str, default=None, help='json hyperparameter search config (see hyperparameter_search.py)')
+parser.add_argument('--cross-validation', dest='cross_validation', type=str, default=None, help='json k-fold cross-validation config (see cross_validation.py)')
+parser.add_argument('--incremental', dest='incremental', type=str, default=None, help='json incremental training config (see incremental.py)')
+parser.add_argument('--registry-dir', dest='registry_dir', type=str, default=None, help='local model registry folder standing in for the workspace')
+parser.add_argument('--dataset-cache', dest='dataset_cache', type=str, default=None, help='json binned dataset cache config (see dataset_cache.py)')
+parser.add_argument('--categorical', dest='categorical', type=str, default=None, help='json native categorical features config (see categorical.py)')
+parser.add_argument('--input-train-path', dest='input_train_path', type=str, default=None, help='parquet file or folder of the train split, streamed (or loaded by column with projected_read) instead of loaded')
+parser.add_argument('--input-test-path', dest='input_test_path', type=str, default=None, help='parquet file or folder of the test split, streamed (or loaded by column with projected_read) instead of loaded')
+parser.add_argument('--parquet-layout', dest='parquet_layout', type=str, default=None, help='json parquet layout of the splits (see parquet_layout.py), projected_read loads the mounted splits by column')
+parser.add_argument('--chunk-rows', dest='chunk_rows', type=int, default=DEFAULT_CHUNK_ROWS, help='rows per chunk of the streamed splits')
 args = parser.parse_args()
 
 # 1. Load training and testing data
 run = Run.get_context()
-input_data_train = run.input_datasets['output_split_train']
-input_data_test  = run.input_datasets['output_split_test']
-input_df_train = input_data_train.to_pandas_dataframe().drop('id', axis=1)
-input_df_test  = input_data_test.to_pandas_dataframe().drop('id', axis=1)
 feature_columns = args.feature_list_names.split(", ")
 target_column = args.target
+parquet_layout_config = json.loads(args.parquet_layout) if args.parquet_layout else {}
+projected_read = args.input_train_path is not None and parquet_layout_config.get('projected_read', False)
+streaming = args.input_train_path is not None and not projected_read
+if streaming:
+    # out-of-core: features stay in parquet and are read chunk_rows at a time,
+    # only the label and id vectors are held in memory
+    train_source = ParquetSource(args.input_train_path, args.chunk_rows)
+    test_source = ParquetSource(args.input_test_path, args.chunk_rows)
+    X_train, y_train, train_ids = train_source.sequence(feature_columns), train_source.column(target_column), train_source.column('id')
+    X_test, y_test, test_ids = test_source.sequence(feature_columns), test_source.column(target_column), test_source.column('id')
+    run.log('Input rows: ', len(X_train) + len(X_test))
+else:
+    if projected_read:
+        # only the feature, target and id column chunks of the mounted splits are read,
+        # row groups the filters rule out are skipped
+        columns = feature_columns + [target_column, 'id']
+        filters = parquet_layout_config.get('filters')
+        input_df_train = read_frame(args.input_train_path, columns, filters)
+        input_df_test = read_frame(args.input_test_path, columns, filters)
+        run.log('Input rows: ', len(input_df_train) + len(input_df_test))
+        split_sources = (args.input_train_path, args.input_test_path)
+    else:
+        input_data_train = run.input_datasets['output_split_train']
+        input_data_test  = run.input_datasets['output_split_test']
+        split_sources = (input_data_train, input_data_test)
+        input_df_train = input_data_train.to_pandas_dataframe()
+        input_df_test  = input_data_test.to_pandas_dataframe()
+    train_ids = input_df_train['id']
+    input_df_train = input_df_train.drop('id', axis=1)
+    test_ids = input_df_test['id']
+    input_df_test = input_df_test.drop('id', axis=1)
+    # the tabular dataset may widen the split step's compact dtypes again
+    dtype_plan = plan_dtypes(input_df_train)
+    input_df_train = apply_dtypes(input_df_train, dtype_plan)
+    input_df_test = apply_dtypes(input_df_test, dtype_plan)
 
-X_train, y_train = input_df_train[feature_columns], input_df_train[target_column]
-X_test, y_test = input_df_test[feature_columns], input_df_test[target_column]
+    X_train, y_train = input_df_train[feature_columns], input_df_train[target_column]
+    X_test, y_test = input_df_test[feature_columns], input_df_test[target_column]
 
-run.log('Input columns: ', ', '.join(list(input_df_train.columns)))
+    run.log('Input columns: ', ', '.join(list(input_df_train.columns)))
+model_name = args.output_model_name if args.output_model_name is not None else 'model'
+registry = LocalModelRegistry(args.registry_dir) if args.registry_dir else AzureModelRegistry(run.experiment.workspace)
 
 global hyper_params
 hyper_params = {
@@ -44,63 +94,271 @@ hyper_params = {
     "min_hessian": 1,
     "verbose": 0
 }
+# model_hyperparameters of the pipeline config replace the defaults above
+if args.model_hyperparameters:
+    hyper_params = json.loads(args.model_hyperparameters)
+
+# Optional native categorical splits on the _cat columns; the model file carries them to score.py
+categorical_config = json.loads(args.categorical) if args.categorical else {}
+categorical_features = []
+if categorical_config.get('enabled'):
+    categorical_features = categorical_columns(feature_columns, categorical_config)
+    hyper_params = dict(hyper_params, **categorical_params(feature_columns, categorical_config))
+    print('Categorical features: ', ', '.join(categorical_features))
 
 # 2. Train model
-def train_eval(X_train, y_train, X_test, y_test):
-    train_data = lightgbm.Dataset(X_train, label=y_train)
-    valid_data = lightgbm.Dataset(X_test, label=y_test, free_raw_data=False)
+dataset_cache_config = json.loads(args.dataset_cache) if args.dataset_cache else {}
+
+def train_eval(X_train, y_train, X_test, y_test, num_boost_round=500, early_stopping_rounds=20):
+    if dataset_cache_config.get('enabled') and not streaming:
+        # binned Datasets of an unchanged split are loaded instead of rebuilt,
+        # keyed on the input datasets (or mounted files), not on their content
+        from dataset_cache import load_or_build
+        selection = {'features': feature_columns, 'target': target_column,
+                     'filters': parquet_layout_config.get('filters') if projected_read else None}
+        train_data, valid_data, cache_stats = load_or_build(
+            X_train, y_train, X_test, y_test, hyper_params, split_sources, selection,
+            cache_dir=dataset_cache_config.get('cache_dir'),
+            max_entries=dataset_cache_config.get('max_entries', 8))
+        if cache_stats['key'] is None:
+            print('Dataset cache skipped, the splits have no dataset id to key on')
+        else:
+            print('Dataset cache %s (%s) in %.2fs' % ('hit' if cache_stats['hit'] else 'miss',
+                                                     cache_stats['key'], cache_stats['seconds']))
+        run.log('dataset_cache.hits', int(cache_stats['hit']))
+        run.log('dataset_cache.misses', int(not cache_stats['hit']))
+        run.log('dataset_cache.seconds', cache_stats['seconds'])
+        run.log('dataset_cache.seconds_saved', cache_stats['seconds_saved'])
+    else:
+        train_data = lightgbm.Dataset(X_train, label=y_train)
+        valid_data = lightgbm.Dataset(X_test, label=y_test, reference=train_data, free_raw_data=False)
     model = lightgbm.train(
         hyper_params,
         train_data,
         valid_sets=valid_data,
-        num_boost_round=500,
-        early_stopping_rounds=20)
+        num_boost_round=num_boost_round,
+        early_stopping_rounds=early_stopping_rounds)
     return model
 
+# Incremental mode: continue boosting the last registered version on the rows added since it was trained
+incremental_config = json.loads(args.incremental) if args.incremental else {}
+parent = None
+incremental_plan = {'mode': 'full', 'reason': 'incremental training disabled', 'previous_max_id': None,
+                    'new_rows': 0, 'window_rows': 0, 'chain': 0}
+if incremental_config.get('enabled') and not streaming:
+    parent = registry.latest(model_name)
+    incremental_plan = plan(parent, feature_columns, train_ids.to_numpy(), test_ids.to_numpy(), incremental_config,
+                            categorical_features)
+    print('Training mode: %s (%s)' % (incremental_plan['mode'], incremental_plan['reason']))
+    run.log('incremental.mode', incremental_plan['mode'])
+    run.log('incremental.new_rows', incremental_plan['new_rows'])
+incremental = incremental_plan['mode'] == 'incremental'
+
+# Optional search: successive halving over a process pool, on a validation slice of the train split;
+# the test split is kept for the evaluation of the final model
+search_config = json.loads(args.hyperparameter_search) if args.hyperparameter_search else {}
+if streaming and (search_config.get('enabled') or incremental_config.get('enabled')):
+    print('Hyperparameter search and incremental training need the splits in memory, skipped with streamed input')
+search_trials = None
+search_rounds = None
+if search_config.get('enabled') and not incremental and not streaming:
+    from hyperparameter_search import successive_halving, validation_split
+    X_fit, X_valid, y_fit, y_valid = validation_split(X_train, y_train, search_config)
+    hyper_params, search_trials = successive_halving(X_fit, y_fit, X_valid, y_valid, hyper_params, search_config)
+    # the final model gets the best trial's rounds instead of early stopping on the test split
+    search_rounds = max(search_trials, key=lambda trial: trial['best_auc'])['best_iteration']
+    del X_fit, X_valid, y_fit, y_valid
+    print('Best hyperparameters: ', hyper_params)
+    print('Boosting rounds: ', search_rounds)
+    run.log('search.best_auc', max(trial['best_auc'] for trial in search_trials))
+    run.log_table('hyperparameter_search', {
+        'trial': [trial['trial'] for trial in search_trials],
+        'status': [trial['status'] for trial in search_trials],
+        'rounds': [trial['rounds'] for trial in search_trials],
+        'best_auc': [trial['best_auc'] for trial in search_trials],
+        'params': [json.dumps(trial['params']) for trial in search_trials]
+    })
+
+# Optional stratified k-fold cross-validation on the training split, folds in parallel processes
+cross_validation_config = json.loads(args.cross_validation) if args.cross_validation else {}
+if streaming and cross_validation_config.get('enabled'):
+    print('Cross-validation needs the splits in memory, skipped with streamed input')
+cv_result = None
+if cross_validation_config.get('enabled') and not incremental and not streaming:
+    from cross_validation import cross_validate
+    cv_result = cross_validate(X_train, y_train, hyper_params, cross_validation_config)
+    run.log('cv.auc_mean', cv_result['auc_mean'])
+    run.log('cv.auc_std', cv_result['auc_std'])
+    run.log('cv.oof_auc', cv_result['oof']['auc'])
+    run.log_table('cross_validation', {
+        'fold': [fold['fold'] for fold in cv_result['folds']],
+        'auc': [fold['auc'] for fold in cv_result['folds']],
+        'f1': [fold['f1'] for fold in cv_result['folds']],
+        'best_iteration': [fold['best_iteration'] for fold in cv_result['folds']]
+    })
+    # out-of-fold predictions stay with the run outputs, not the registered model
+    os.makedirs('outputs', exist_ok=True)
+    pd.DataFrame({'id': train_ids.values, target_column: y_train.values, 'oof_prediction': cv_result['oof_prediction']}) \
+        .to_csv(os.path.join('outputs', 'cross_validation_oof.csv'), index=False)
+
+# Input schema of the scoring service (tests/integration/input_schema.py)
+def feature_kind(name, integral):
+    # insurance columns carry their kind as a suffix, the rest is int or float by value.
+    # score.py bounds a bin to 0 or 1 and a cat to integer codes >= -1, whatever
+    # min/max training saw; only int and float ranges come from the data
+    if integral and name.endswith('_bin'):
+        return 'bin'
+    if integral and name.endswith('_cat'):
+        return 'cat'
+    return 'int' if integral else 'float'
+
+def build_schema(X, feature_columns):
+    # statistics are accumulated chunk by chunk, so X may be streamed
+    lower = np.full(len(feature_columns), np.inf)
+    upper = np.full(len(feature_columns), -np.inf)
+    has_nan = np.zeros(len(feature_columns), dtype=bool)
+    integral = np.ones(len(feature_columns), dtype=bool)
+    for chunk in iter_chunks(X):
+        finite = np.isfinite(chunk)
+        lower = np.minimum(lower, np.where(finite, chunk, np.inf).min(axis=0))
+        upper = np.maximum(upper, np.where(finite, chunk, -np.inf).max(axis=0))
+        has_nan |= np.isnan(chunk).any(axis=0)
+        integral &= (~finite | (chunk == np.round(chunk))).all(axis=0)
+    features = []
+    for i, name in enumerate(feature_columns):
+        seen = np.isfinite(lower[i])
+        features.append({
+            'name': name,
+            'kind': feature_kind(name, seen and integral[i]),
+            'min': float(lower[i]) if seen else None,
+            'max': float(upper[i]) if seen else None,
+            # NaN (JSON null) is only accepted where training saw it
+            'allow_nan': bool(has_nan[i])
+        })
+    return {'features': features}
+
 print("Saving model...")
-os.makedirs('outputs', exist_ok=True)
-model_name = args.output_model_name if args.output_model_name is not None else 'model'
-model_file = os.path.join('outputs', '%s.pkl'%(model_name))
-model = train_eval(X_train, y_train, X_test, y_test)
+# the model folder is registered as a whole, so every format ships together
+model_dir = os.path.join('outputs', model_name)
+os.makedirs(model_dir, exist_ok=True)
+model_file = os.path.join(model_dir, '%s.pkl'%(model_name))
+native_model_file = os.path.join(model_dir, '%s.txt'%(model_name))
+base_iterations = 0
+if incremental:
+    parent_model = lightgbm.Booster(model_file=find_native_model(parent['path'], model_name))
+    base_iterations = parent_model.current_iteration()
+    model, incremental_seconds = continue_training(
+        parent_model,
+        X_train[incremental_plan['new']], y_train[incremental_plan['new']],
+        X_test[incremental_plan['window']], y_test[incremental_plan['window']],
+        hyper_params, incremental_config)
+    run.log('incremental.seconds', incremental_seconds)
+elif cv_result is not None and 'model' in cv_result:
+    # the fold models averaged into one booster replace the single 80/20 model
+    model = cv_result['model']
+elif search_rounds is not None:
+    model = train_eval(X_train, y_train, X_test, y_test, num_boost_round=search_rounds, early_stopping_rounds=None)
+else:
+    model = train_eval(X_train, y_train, X_test, y_test)
 joblib.dump(value=model, filename=model_file)
-print(" [Successful] save model in ", model_file)
+# LightGBM's native text format loads without unpickling (see score.py)
+model.save_model(native_model_file)
+with open(os.path.join(model_dir, 'schema.json'), 'w') as f:
+    json.dump(build_schema(X_train, feature_columns), f, indent=2)
+# dtypes the model was trained on, so score.py builds its input array the same way
+save_plan(os.path.join(model_dir, DTYPES_NAME),
+          {name: str(dtype) for name, dtype in zip(feature_columns, X_train.dtypes)},
+          feature_columns)
+if search_trials is not None:
+    # full trial table ships with the registered model folder
+    with open(os.path.join(model_dir, 'hyperparameter_search.json'), 'w') as f:
+        json.dump({'best_params': hyper_params, 'search': search_config, 'trials': search_trials}, f, indent=2)
+if cv_result is not None:
+    with open(os.path.join(model_dir, 'cross_validation.json'), 'w') as f:
+        json.dump({'config': cross_validation_config, 'folds': cv_result['folds'], 'oof': cv_result['oof'],
+                   'auc_mean': cv_result['auc_mean'], 'auc_std': cv_result['auc_std']}, f, indent=2)
+
+# Test AUC at evenly spaced iteration cut-offs, so score.py can evaluate fewer
+# trees under a latency budget. Raw scores of consecutive tree ranges add up,
+# so every tree is evaluated once, one chunk of X_test at a time.
+def auc_by_iteration(model, X_test, y_test, points=10):
+    # best_iteration is -1 for a booster built from a model string (the cross-validation ensemble)
+    num_iterations = model.best_iteration if model.best_iteration > 0 else model.current_iteration()
+    cutoffs = sorted(set(max(1, round(num_iterations * (i + 1) / points)) for i in range(points)))
+    raw_scores = np.zeros((len(cutoffs), len(y_test)))
+    row = 0
+    for chunk in iter_chunks(X_test):
+        raw_score, start = np.zeros(len(chunk)), 0
+        for i, cutoff in enumerate(cutoffs):
+            raw_score += model.predict(chunk, raw_score=True, start_iteration=start, num_iteration=cutoff - start)
+            raw_scores[i, row:row + len(chunk)] = raw_score
+            start = cutoff
+        row += len(chunk)
+    table = [{'num_iteration': cutoff, 'auc': roc_auc(y_test, raw_score)} for cutoff, raw_score in zip(cutoffs, raw_scores)]
+    return {'metric': 'auc', 'num_iterations': num_iterations, 'iterations': table}
+
+iterations = auc_by_iteration(model, X_test, y_test)
+with open(os.path.join(model_dir, 'iterations.json'), 'w') as f:
+    json.dump(iterations, f, indent=2)
+print(" [Successful] save model in ", model_dir)
 
 # 3. Evaluate model
-def get_metrics(model, X_test, y_test):
-    y_pred = model.predict(X_test)
-    y_pred = [1 if p >= 0.5 else 0 for p in y_pred]
-    cls_rp = classification_report(y_test, y_pred, output_dict = True)
-    cls_rp = pd.DataFrame(cls_rp).transpose()
-    metrics = dict(cls_rp.loc['weighted avg'])
-    precision = metrics['precision']
-    recall = metrics['recall']
-    f1 = metrics['f1-score']
-    return precision, recall, f1
-
-test_precision, test_recall, test_f1 = get_metrics(model, X_test, y_test)
-train_precision, train_recall, train_f1 = get_metrics(model, X_train, y_train)
+# every split is predicted once; evaluate() sweeps all thresholds of the scores in one sort.
+# precision/recall/f1 stay the weighted avg at 0.5 of the former classification_report.
+test_evaluation = evaluate(y_test, predict(model, X_test), threshold=0.5, n_bootstrap=200)
+train_evaluation = evaluate(y_train, predict(model, X_train), threshold=0.5, n_bootstrap=0)
+with open(os.path.join(model_dir, 'evaluation.json'), 'w') as f:
+    json.dump({'test': test_evaluation, 'train': train_evaluation}, f, indent=2)
+
+def get_metrics(evaluation):
+    metrics = evaluation['at_threshold']
+    return metrics['weighted_precision'], metrics['weighted_recall'], metrics['weighted_f1']
+
+test_precision, test_recall, test_f1 = get_metrics(test_evaluation)
+train_precision, train_recall, train_f1 = get_metrics(train_evaluation)
+run.log('evaluation.test.auc', test_evaluation['auc'])
+run.log('evaluation.test.optimal_threshold', test_evaluation['optimal_threshold'])
+run.log('evaluation.test.optimal_f1', test_evaluation['at_optimal']['f1'])
 # 4. Save the trained model in the outputs folder
 # Register the model
 print('Registering model...')
-Model.register(
-    workspace=run.experiment.workspace,
-    model_path = model_file,
+properties = {
+    'data.train.shape': len(X_train),
+    'data.test.shape': len(X_test),
+    # incremental runs continue from the rows above this id
+    'data.max_id': int(max(train_ids.max(), test_ids.max())),
+    'data.features': feature_columns,
+    'data.categorical_features': categorical_features,
+    'data.target_column': target_column,
+    'model.algorithm':  type(model).__name__,
+    'model.model_params': hyper_params,
+    'model.num_iterations': iterations['num_iterations'],
+    'model.cv.folds': len(cv_result['folds']) if cv_result is not None else 0,
+    'model.cv.ensemble': cv_result is not None and 'model' in cv_result,
+    'model.search.trials': len(search_trials) if search_trials is not None else 0,
+    'model.search.best_auc': max(trial['best_auc'] for trial in search_trials) if search_trials is not None else None,
+    'evaluation.test.precision': test_precision,
+    'evaluation.test.recall': test_recall,
+    'evaluation.test.f1': test_f1,
+    'evaluation.test.auc': test_evaluation['auc'],
+    'evaluation.test.auc_ci': test_evaluation['ci']['auc'],
+    'evaluation.test.f1_ci': test_evaluation['ci']['at_threshold.weighted_f1'],
+    'evaluation.test.optimal_threshold': test_evaluation['optimal_threshold'],
+    'evaluation.train.auc': train_evaluation['auc'],
+    'evaluation.cv.auc_mean': cv_result['auc_mean'] if cv_result is not None else None,
+    'evaluation.cv.auc_std': cv_result['auc_std'] if cv_result is not None else None,
+    'evaluation.cv.oof_auc': cv_result['oof']['auc'] if cv_result is not None else None,
+    'evaluation.train.precision': train_precision,
+    'evaluation.train.recall': train_recall,
+    'evaluation.train.f1': train_f1,
+}
+properties.update(lineage(parent, incremental_plan, base_iterations, model.current_iteration()))
+model_version = registry.register(
+    model_path = model_dir,
     model_name = model_name,
     tags={'Training context':'Pipeline'},
-    properties={
-        'data.train.shape': X_train.shape[0],
-        'data.test.shape': X_test.shape[0],
-        'data.features': feature_columns,
-        'data.target_column': target_column,
-        'model.algorithm':  type(model).__name__,
-        'model.model_params': hyper_params,
-        'evaluation.test.precision': test_precision,
-        'evaluation.test.recall': test_recall,
-        'evaluation.test.f1': test_f1,
-        'evaluation.train.precision': train_precision,
-        'evaluation.train.recall': train_recall,
-        'evaluation.train.f1': train_f1,
-    }
+    properties=properties
 )
+print('Registered %s version %s' % (model_name, model_version))
 
 run.complete()
\ No newline at end of file
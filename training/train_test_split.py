@@ -1,43 +1,63 @@
 ﻿import argparse
-import os
+import json
 import azureml.core
 from azureml.core import Run
 from sklearn.model_selection import train_test_split
+from dtype_plan import plan_dtypes, apply_dtypes
+from parquet_layout import write_frame
 
 print("Split the data into train and test")
-# Load dataset from context
-run = Run.get_context()
-input_data_train = run.input_datasets['input_dataset']
-input_df_train = input_data_train.to_pandas_dataframe()
-
 parser = argparse.ArgumentParser("split")
 parser.add_argument("--output_split_train", type=str, help="output split train data")
 parser.add_argument("--output_split_test", type=str, help="output split test data")
+parser.add_argument("--hash-split", dest="hash_split", type=str, default=None, help="json hash split config (see hash_split.py)")
+parser.add_argument("--input-path", dest="input_path", type=str, default=None, help="file dataset (csv or parquet files) streamed by the hash split")
+parser.add_argument("--target", dest="target", type=str, default="target", help="target column name")
+parser.add_argument("--parquet-layout", dest="parquet_layout", type=str, default=None, help="json parquet layout of the splits (see parquet_layout.py)")
 
 args = parser.parse_args()
 
 print("Argument 1(output training data split path): %s" % args.output_split_train)
 print("Argument 2(output test data split path): %s" % args.output_split_test)
 
-def split_data(data_df):
-    """Split a dataframe into training and test datasets"""
-    train_df, test_df = \
-        train_test_split(data_df, test_size=0.2, 
-                         random_state=0)
-
-    return (train_df, test_df)
-
-train_df, test_df = split_data(input_df_train)
-
-def write_output(df, path):
-    '''
-    write datasets to temporary proccessed.parquet files for reading from next pipeline
-    '''
-    os.makedirs(path, exist_ok=True)
-    print("%s created" % path)
-    df.to_parquet(path + "/processed.parquet")
-
-if not (args.output_split_train is None and
-        args.output_split_test is None):
-    write_output(train_df, args.output_split_train)
-    write_output(test_df, args.output_split_test)
\ No newline at end of file
+run = Run.get_context()
+hash_split_config = json.loads(args.hash_split) if args.hash_split else {}
+parquet_layout_config = json.loads(args.parquet_layout) if args.parquet_layout else {}
+if hash_split_config.get('enabled'):
+    # streamed in chunks and assigned by a hash of the id: memory does not grow
+    # with the input and a row stays on its side when rows are added
+    from hash_split import hash_split
+    summary = hash_split(args.input_path, args.output_split_train, args.output_split_test, args.target,
+                         hash_split_config, layout=parquet_layout_config)
+    print("Hash split: %d train rows, %d test rows" % (summary['train_rows'], summary['test_rows']))
+    run.log('split.train_rows', summary['train_rows'])
+    run.log('split.test_rows', summary['test_rows'])
+else:
+    # Load dataset from context
+    input_data_train = run.input_datasets['input_dataset']
+    input_df_train = input_data_train.to_pandas_dataframe()
+    # int8 / float32 instead of the default int64 / float64, also in the written parquet
+    input_df_train = apply_dtypes(input_df_train, plan_dtypes(input_df_train))
+
+    def split_data(data_df):
+        """Split a dataframe into training and test datasets"""
+        train_df, test_df = \
+            train_test_split(data_df, test_size=0.2,
+                             random_state=0)
+
+        return (train_df, test_df)
+
+    train_df, test_df = split_data(input_df_train)
+
+    def write_output(df, path):
+        '''
+        write datasets to temporary proccessed.parquet files for reading from next pipeline,
+        sorted by id in compressed row groups with column statistics
+        '''
+        write_frame(df, path, parquet_layout_config)
+        print("%s created" % path)
+
+    if not (args.output_split_train is None and
+            args.output_split_test is None):
+        write_output(train_df, args.output_split_train)
+        write_output(test_df, args.output_split_test)